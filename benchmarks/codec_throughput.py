@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import random
+
+"""
+Encode and decode throughput and payload size of each message codec (see `pipeline.serialization`) for documents
+typical of the messages passed between stages: a numeric array, a batch of small records and a text heavy document.
+Sizes are of the text sent over SQS or SNS (base64 for binary codecs).  Codecs whose libraries aren't installed are
+skipped, and `stdlib-json` is the standard library's `json` module which messages were encoded with before codecs.
+
+    python benchmarks/codec_throughput.py
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from micro import timeit
+from pipeline import serialization
+
+
+class StdlibJSON(object):
+    content_type = "stdlib-json"
+
+    def encode_text(self, obj):
+        return json.dumps(obj)
+
+    def decode_text(self, text):
+        return json.loads(text)
+
+
+def documents():
+    rng = random.Random(0)
+    return {
+        "floats_10k": [rng.uniform(-1000, 1000) for _ in range(10000)],
+        "records_100": [
+            {
+                "id": f"{idx:08d}",
+                "timestamp": 1700000000 + idx,
+                "values": [rng.randint(0, 255) for _ in range(16)],
+                "valid": idx % 2 == 0,
+            }
+            for idx in range(100)
+        ],
+        "text_64kb": {"id": "x" * 36, "text": " ".join(["lorem ipsum dolor"] * 3800)},
+    }
+
+
+def codecs():
+    candidates = [StdlibJSON(), serialization.JSON]
+    for (format, compression) in [
+        ("json", "zlib"),
+        ("json", "zstd"),
+        ("msgpack", None),
+        ("msgpack", "zlib"),
+        ("msgpack", "zstd"),
+    ]:
+        try:
+            candidates.append(serialization.Codec(format, compression))
+        except ImportError as e:
+            print(f"Skipping {format}+{compression}: {e}")
+    return candidates
+
+
+def main():
+    summary = {}
+    candidates = codecs()
+    for (name, document) in documents().items():
+        raw = len(json.dumps(document))
+        for codec in candidates:
+            text = codec.encode_text(document)
+            encode = timeit(lambda: codec.encode_text(document))
+            decode = timeit(lambda: codec.decode_text(text))
+            summary[(name, codec.content_type)] = {
+                "bytes": len(text),
+                "ratio": len(text) / raw,
+                "encode_us": encode,
+                "decode_us": decode,
+                "encode_mb_per_sec": raw / encode,
+                "decode_mb_per_sec": raw / decode,
+            }
+    print(
+        f"{'document':<14}{'codec':<30}{'bytes':>10}{'ratio':>8}"
+        f"{'encode us':>12}{'decode us':>12}{'enc MB/s':>10}{'dec MB/s':>10}"
+    )
+    for (name, content_type), x in summary.items():
+        print(
+            f"{name:<14}{content_type:<30}{x['bytes']:>10}{x['ratio']:>8.3f}"
+            f"{x['encode_us']:>12.1f}{x['decode_us']:>12.1f}"
+            f"{x['encode_mb_per_sec']:>10.1f}{x['decode_mb_per_sec']:>10.1f}"
+        )
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+"""
+Cold start benchmark.  Each sample runs in a fresh interpreter and measures the wall time and number of allocations
+made by `import pipeline` and by constructing a small pipeline (the work done by every new lambda container before the
+handler runs).  Also checks that no boto3 client was created, no network call was made and asyncio (only needed by
+async handlers) wasn't imported along the way.
+
+    python benchmarks/cold_start.py [samples]
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+SAMPLE = """
+import sys
+import time
+import json
+import tracemalloc
+
+tracemalloc.start()
+start = time.perf_counter()
+
+import pipeline
+from pipeline import Pipeline, events, resources
+
+imported = time.perf_counter()
+import_allocs = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+
+
+class BenchTopic(resources.SNSTopic):
+    pass
+
+
+class BenchQueue(resources.SQSQueue):
+    pass
+
+
+class BenchBucket(resources.S3Bucket):
+    pass
+
+
+class BenchTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_key("id", "HASH")
+
+
+topic = BenchTopic()
+queue = BenchQueue()
+bucket = BenchBucket()
+table = BenchTable()
+
+
+class BenchPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[topic, queue, bucket, table])
+
+    @events.invoke
+    def invoke(self, event, context):
+        return event
+
+    @events.http(path="get/{id}", method="get", cors="true")
+    def http_get(self, event, context):
+        return event
+
+    @events.sns(resource=topic)
+    def sns(self, event, context):
+        return event
+
+    @events.sqs(resource=queue)
+    def sqs(self, event, context):
+        return event
+
+    @events.bucket_notification(
+        bucket=bucket, event_type="s3:ObjectCreated:Put", destination=queue
+    )
+    def notification(self, event, context):
+        return event
+
+
+handler = BenchPipeline()
+constructed = time.perf_counter()
+total_allocs = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+
+from pipeline.clients import registry
+
+print(
+    json.dumps(
+        {
+            "import_ms": (imported - start) * 1000,
+            "construct_ms": (constructed - imported) * 1000,
+            "total_ms": (constructed - start) * 1000,
+            "import_allocs": import_allocs,
+            "total_allocs": total_allocs,
+            "clients": registry.loaded(),
+            "boto3_imported": "boto3" in sys.modules,
+            "asyncio_imported": "asyncio" in sys.modules,
+        }
+    )
+)
+"""
+
+
+def run_sample():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT
+    env.pop("AWS_ACCOUNT_ID", None)
+    # Point boto3 at an unroutable endpoint so any accidental network call fails loudly instead of being timed
+    env["AWS_ENDPOINT_URL"] = "http://127.0.0.1:9"
+    out = subprocess.check_output([sys.executable, "-c", SAMPLE], env=env, cwd=ROOT)
+    return json.loads(out)
+
+
+def main(samples=10):
+    results = [run_sample() for _ in range(samples)]
+    for result in results:
+        if result["clients"] or result["boto3_imported"]:
+            raise RuntimeError(f"Cold start path touched boto3: {result}")
+        if result["asyncio_imported"]:
+            raise RuntimeError(f"Cold start path imported asyncio: {result}")
+    summary = {}
+    for metric in ["import_ms", "construct_ms", "total_ms", "import_allocs", "total_allocs"]:
+        values = [r[metric] for r in results]
+        summary[metric] = {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
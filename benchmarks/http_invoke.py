@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+HTTP invocation benchmark.  Serves a stub API on localhost and compares the previous `Function_HTTP.invoke` code path
+(parse outputs.yml, compile the route regex and open a new connection on every call) with the cached, pooled
+`HttpClient`, sequentially and with concurrent `request_many`.
+
+    python benchmarks/http_invoke.py [requests]
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pipeline.endpoints import HttpClient
+from pipeline.outputs import Outputs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one packet, avoiding delayed-ACK stalls on keep-alive connections
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def uncached_invoke(outputs, path, data):
+    """Request path used by Function_HTTP.invoke before the pooled client"""
+    import requests
+
+    endpoint = Outputs.load(outputs).endpoint()
+    full_path = os.path.join(endpoint, path)
+    regex = re.compile(r"{(.*?)\}")
+    match = regex.findall(full_path)[0]
+    full_path = full_path.replace("{" + match + "}", data)
+    return requests.get(full_path).content.decode("utf-8")
+
+
+def timed(func, count):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "requests_per_sec": count / elapsed}
+
+
+def main(count=500):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = os.path.join(directory, "outputs.yml")
+        with open(outputs, "w") as f:
+            f.write(
+                f"ServiceEndpoint: http://127.0.0.1:{server.server_address[1]}/dev\n"
+            )
+        client = HttpClient(outputs)
+        path = "get/{id}"
+
+        summary = {
+            "uncached": timed(
+                lambda: [uncached_invoke(outputs, path, str(x)) for x in range(count)],
+                count,
+            ),
+            "pooled": timed(
+                lambda: [client.request("get", path, str(x)) for x in range(count)],
+                count,
+            ),
+        }
+        for concurrency in [4, 16]:
+            summary[f"request_many_{concurrency}"] = timed(
+                lambda: list(
+                    client.request_many("get", path, range(count), concurrency)
+                ),
+                count,
+            )
+    server.shutdown()
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
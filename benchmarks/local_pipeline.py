@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+
+"""
+Local pipeline load test.  Runs a three stage pipeline (SQS -> S3 -> bucket notification through SNS -> DynamoDB) on
+the in-process `LocalRuntime` with a simulated per-record cost in the middle stage, and reports end to end throughput
+and each stage's statistics for increasing worker pool sizes.  The stage with the highest busy time is the bottleneck.
+
+    python benchmarks/local_pipeline.py [messages] [stage_latency_ms]
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pipeline import Pipeline, events, resources
+from pipeline.local import LocalRuntime
+
+
+class BenchQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class BenchTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class BenchBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class BenchTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_key("id", "HASH")
+
+
+queue = BenchQueue()
+topic = BenchTopic()
+bucket = BenchBucket()
+table = BenchTable()
+
+
+class BenchPipeline(Pipeline):
+    def __init__(self, latency):
+        super().__init__(resources=[queue, topic, bucket, table])
+        self.latency = latency
+
+    @events.sqs(resource=queue, batch_size=10)
+    def ingest(self, event, context):
+        bucket.upload_file(f"objects/{event['id']}.json", json.dumps(event))
+
+    @events.bucket_notification(
+        bucket=bucket,
+        event_type="s3:ObjectCreated:*",
+        destination=topic,
+        prefix="objects/",
+    )
+    def transform(self, event, context):
+        document = json.loads(bucket.read_file(event["key"]))
+        # Simulated I/O bound work (ex. calling another service)
+        time.sleep(self.latency)
+        table.put({"id": document["id"], "size": len(event["key"])})
+
+
+def main(messages=2000, stage_latency_ms=5):
+    summary = {}
+    for workers in [1, 4, 16, 64]:
+        with LocalRuntime(BenchPipeline(stage_latency_ms / 1000), workers) as runtime:
+            start = time.perf_counter()
+            queue.send_messages({"id": str(x)} for x in range(messages))
+            runtime.drain()
+            elapsed = time.perf_counter() - start
+            summary[f"workers_{workers}"] = {
+                "seconds": elapsed,
+                "messages_per_sec": messages / elapsed,
+                "stages": runtime.stats(),
+            }
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+from contextlib import redirect_stdout
+
+"""
+Overhead of the per-invocation instrumentation of `pipeline.metrics`.  Handlers of the microbenchmark pipeline are
+invoked without the instrumentation layer, with it but no hooks registered (the default), with a hook which discards
+invocations and with the EMF hook writing to /dev/null.  Times are per record, in microseconds.
+
+    python benchmarks/metrics_overhead.py
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from micro import BATCH, MicroPipeline, document, sqs_event, timeit
+from pipeline import metrics
+from pipeline.execution import execution
+
+
+def cases(pipeline):
+    """Names of the benchmarks mapped to (handler, event, records per event)"""
+    small = json.dumps(document(1024))
+    return {
+        "invoke": (MicroPipeline.invoke, document(1024), 1),
+        "sqs_1kb": (MicroPipeline.sqs, sqs_event([small] * BATCH), BATCH),
+        "sqs_concurrent_1kb": (
+            MicroPipeline.sqs_concurrent,
+            sqs_event([small] * BATCH),
+            BATCH,
+        ),
+    }
+
+
+def measure(pipeline, handler, event, records):
+    """Time per record of the handler with and without its instrumentation layer"""
+    results = {
+        "uninstrumented": timeit(
+            lambda: handler.__wrapped__(pipeline, event, None), records
+        ),
+        "disabled": timeit(lambda: handler(pipeline, event, None), records),
+    }
+    for (name, hook) in [("hook", lambda invocation: None), ("emf", metrics.emf)]:
+        metrics.add_hook(hook)
+        try:
+            results[name] = timeit(lambda: handler(pipeline, event, None), records)
+        finally:
+            metrics.remove_hook(hook)
+    return results
+
+
+def main():
+    execution.accountid = "123456789012"
+    pipeline = MicroPipeline()
+    summary = {}
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for (name, (handler, event, records)) in cases(pipeline).items():
+            summary[name] = measure(pipeline, handler, event, records)
+    for (name, results) in summary.items():
+        base = results["uninstrumented"]
+        print(
+            f"{name:<24}"
+            + "".join(
+                f"{k:>16}{v:>9.2f} us {v / base:>5.2f}x" for (k, v) in results.items()
+            )
+        )
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+
+"""
+Microbenchmark suite for the library's hot paths: unwrapping and dispatching synthetic SQS, SNS, S3 and API Gateway
+events of realistic sizes (reported per record), building function templates, constructing a pipeline, generating its
+template and re-deploying it.  Each benchmark reports the fastest of several timed samples, which is the least noisy
+estimate of its cost.
+
+Results may be saved as a baseline and later runs compared against it.  Benchmarks slower than the baseline by more
+than the tolerance (after measuring them a second time) are flagged as regressions and make the run exit with status 1
+(ex. to fail a CI job).  Baselines are only comparable on the machine and Python version they were recorded with, and
+on machines whose speed drifts between runs they should be recorded as the median of several runs with `--runs`.
+
+    python benchmarks/micro.py --save --runs 5      # record benchmarks/baseline.json
+    python benchmarks/micro.py                      # compare against it
+    python benchmarks/micro.py --filter sqs --tolerance 0.1
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pipeline import Pipeline, events, resources
+from pipeline.execution import execution
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Records per batch of SQS events, the default batch size of the SQS event source
+BATCH = 10
+
+
+class MicroQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class MicroTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class MicroBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+queue = MicroQueue()
+topic = MicroTopic()
+bucket = MicroBucket()
+
+
+class MicroPipeline(Pipeline):
+    """Pipeline with one trivial handler per trigger, so benchmarks measure the library's overhead"""
+
+    def __init__(self):
+        super().__init__(resources=[queue, topic, bucket])
+
+    @events.invoke
+    def invoke(self, event, context):
+        return event
+
+    @events.sqs(resource=queue)
+    def sqs(self, event, context):
+        return event
+
+    @events.sqs(resource=queue, concurrency=4)
+    def sqs_concurrent(self, event, context):
+        return event
+
+    @events.sqs(resource=queue, batch=True)
+    def sqs_batch(self, batch, context):
+        return None
+
+    @events.sns(resource=topic)
+    def sns(self, event, context):
+        return event
+
+    @events.bucket_notification(
+        bucket=bucket, event_type="s3:ObjectCreated:*", destination=queue
+    )
+    def s3_sqs(self, event, context):
+        return event
+
+    @events.bucket_notification(
+        bucket=bucket, event_type="s3:ObjectCreated:*", destination=topic
+    )
+    def s3_sns(self, event, context):
+        return event
+
+    @events.http(path="items/{id}", method="get", cors="true")
+    def http_get(self, event, context):
+        return event
+
+    @events.http(path="items", method="post", cors="true")
+    def http_post(self, event, context):
+        return event
+
+
+def document(size):
+    """JSON serializable document of roughly `size` bytes"""
+    return {"id": "x" * 36, "values": list(range(size // 6))}
+
+
+def sqs_event(bodies):
+    return {
+        "Records": [
+            {
+                "messageId": f"{idx:08d}-1111-2222-3333-444444444444",
+                "receiptHandle": "AQEB" + "r" * 180,
+                "body": body,
+                "attributes": {
+                    "ApproximateReceiveCount": "1",
+                    "SentTimestamp": "1700000000000",
+                    "SenderId": "AIDAEXAMPLE",
+                    "ApproximateFirstReceiveTimestamp": "1700000000001",
+                },
+                "messageAttributes": {},
+                "md5OfBody": "0" * 32,
+                "eventSource": "aws:sqs",
+                "eventSourceARN": "arn:aws:sqs:us-east-1:123456789012:MicroQueue",
+                "awsRegion": "us-east-1",
+            }
+            for (idx, body) in enumerate(bodies)
+        ]
+    }
+
+
+def sns_event(messages):
+    return {
+        "Records": [
+            {
+                "EventSource": "aws:sns",
+                "EventVersion": "1.0",
+                "EventSubscriptionArn": "arn:aws:sns:us-east-1:123456789012:MicroTopic:sub",
+                "Sns": {
+                    "Type": "Notification",
+                    "MessageId": f"{idx:08d}-1111-2222-3333-444444444444",
+                    "TopicArn": "arn:aws:sns:us-east-1:123456789012:MicroTopic",
+                    "Message": message,
+                    "Timestamp": "2024-01-01T00:00:00.000Z",
+                    "MessageAttributes": {},
+                },
+            }
+            for (idx, message) in enumerate(messages)
+        ]
+    }
+
+
+def s3_notification(keys):
+    return json.dumps(
+        {
+            "Records": [
+                {
+                    "eventVersion": "2.1",
+                    "eventSource": "aws:s3",
+                    "awsRegion": "us-east-1",
+                    "eventTime": "2024-01-01T00:00:00.000Z",
+                    "eventName": "ObjectCreated:Put",
+                    "s3": {
+                        "bucket": {
+                            "name": "microbucket",
+                            "arn": "arn:aws:s3:::microbucket",
+                        },
+                        "object": {"key": key, "size": 1024, "eTag": "0" * 32},
+                    },
+                }
+                for key in keys
+            ]
+        }
+    )
+
+
+def api_event(path_parameters=None, body=None):
+    """API Gateway proxy event with the headers of a typical browser request"""
+    headers = {
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate, br",
+        "Host": "abc123.execute-api.us-east-1.amazonaws.com",
+        "User-Agent": "Mozilla/5.0 " + "x" * 100,
+        "X-Amzn-Trace-Id": "Root=1-00000000-" + "0" * 24,
+        "X-Forwarded-For": "203.0.113.1",
+    }
+    return {
+        "resource": "/items/{id}",
+        "httpMethod": "POST" if body is not None else "GET",
+        "headers": headers,
+        "pathParameters": path_parameters,
+        "requestContext": {"requestId": "0" * 36, "stage": "dev"},
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def timeit(func, records=1, samples=5, target=0.05):
+    """
+    Fastest time per record (in microseconds) over `samples` samples each lasting about `target` seconds.  As with the
+    `timeit` module, the garbage collector is disabled while timing so collections triggered by the objects kept by
+    other benchmarks don't land on whichever benchmark runs next.
+    """
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _timeit(func, records, samples, target)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _timeit(func, records, samples, target):
+    func()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target / 10:
+            break
+        loops *= 10
+    loops = max(1, int(loops * target / elapsed))
+    best = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / loops / records * 1e6
+
+
+def benchmarks():
+    """Names of the benchmarks mapped to (function, records per call)"""
+    pipeline = MicroPipeline()
+    small = json.dumps(document(1024))
+    large = json.dumps(document(64 * 1024))
+    sqs_small = sqs_event([small] * BATCH)
+    sqs_large = sqs_event([large] * BATCH)
+    s3_sqs = sqs_event(
+        [s3_notification([f"objects/{idx}.json"]) for idx in range(BATCH)]
+    )
+    s3_sns = sns_event(
+        [s3_notification([f"objects/{idx}.json" for idx in range(BATCH)])]
+    )
+    sns = sns_event([large])
+    http_get = api_event(path_parameters={"id": "1234"})
+    http_post = api_event(body=small)
+    sqs_function = pipeline.functions["sqs"]
+
+    return {
+        "invoke": (lambda: pipeline.invoke(document(1024), None), 1),
+        "sqs_1kb": (lambda: pipeline.sqs(sqs_small, None), BATCH),
+        "sqs_64kb": (lambda: pipeline.sqs(sqs_large, None), BATCH),
+        "sqs_concurrent_1kb": (lambda: pipeline.sqs_concurrent(sqs_small, None), BATCH),
+        "sqs_batch_1kb": (lambda: pipeline.sqs_batch(sqs_small, None), BATCH),
+        "sns_64kb": (lambda: pipeline.sns(sns, None), 1),
+        "s3_via_sqs": (lambda: pipeline.s3_sqs(s3_sqs, None), BATCH),
+        "s3_via_sns": (lambda: pipeline.s3_sns(s3_sns, None), BATCH),
+        "http_get": (lambda: pipeline.http_get(http_get, None), 1),
+        "http_post_1kb": (lambda: pipeline.http_post(http_post, None), 1),
+        "function_template": (sqs_function.package_function, 1),
+        "pipeline_init": (MicroPipeline, 1),
+        "pipeline_template": (lambda: MicroPipeline().template(), 1),
+        "pipeline_deploy_unchanged": (lambda: MicroPipeline().deploy(), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Benchmarks slower than the baseline by more than `tolerance` (a fraction), mapped to their slowdown"""
+    regressions = {}
+    for (name, value) in results.items():
+        previous = baseline.get(name)
+        if previous and value > previous * (1 + tolerance):
+            regressions[name] = value / previous
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the microbenchmark suite")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="Save results as baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--filter", default="", help="Only run matching benchmarks")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument(
+        "--runs", type=int, default=1, help="Keep the median of several runs"
+    )
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+
+    execution.accountid = "123456789012"
+    cwd = os.getcwd()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # Deploying writes serverless.yml and manifest.json
+        os.chdir(directory)
+        try:
+            cases = {k: v for (k, v) in benchmarks().items() if args.filter in k}
+            runs = [
+                {
+                    name: timeit(func, records, args.samples)
+                    for (name, (func, records)) in cases.items()
+                }
+                for _ in range(args.runs)
+            ]
+            for name in cases:
+                results[name] = statistics.median(run[name] for run in runs)
+            # Measure apparent regressions again, so a noisy sample isn't reported as one
+            for name in compare(results, baseline, args.tolerance):
+                (func, records) = cases[name]
+                results[name] = min(results[name], timeit(func, records, args.samples))
+        finally:
+            os.chdir(cwd)
+    regressions = compare(results, baseline, args.tolerance)
+
+    for (name, value) in results.items():
+        line = f"{name:<28}{value:>12.2f} us"
+        if name in baseline:
+            line += f"{value / baseline[name]:>10.2f}x baseline"
+        if name in regressions:
+            line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": dict(baseline, **results),
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        print(
+            f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+
+"""
+Parallel scan benchmark.  Scans a local, in-memory stand-in for a DynamoDB table whose pages take a fixed latency to
+return (simulating the round trip to DynamoDB) and reports how throughput scales with the number of scan segments.
+
+    python benchmarks/parallel_scan.py [items] [page_latency_ms]
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pipeline import resources
+from pipeline.clients import registry
+
+
+class LocalTable(object):
+
+    """Table stand-in which splits items into segments by index and returns pages of `page_size` items"""
+
+    def __init__(self, items, page_size, latency):
+        self.items = items
+        self.page_size = page_size
+        self.latency = latency
+
+    def scan(self, Segment=0, TotalSegments=1, ExclusiveStartKey=0, **kwargs):
+        time.sleep(self.latency)
+        segment = self.items[Segment::TotalSegments]
+        page = segment[ExclusiveStartKey : ExclusiveStartKey + self.page_size]
+        result = {"Items": page}
+        if ExclusiveStartKey + self.page_size < len(segment):
+            result["LastEvaluatedKey"] = ExclusiveStartKey + self.page_size
+        return result
+
+
+class LocalDynamoDB(object):
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+class BenchTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_key("id", "HASH")
+
+
+def main(items=20000, page_latency_ms=20):
+    data = [{"id": str(x), "value": x} for x in range(items)]
+    registry.register_resource(
+        "dynamodb", LocalDynamoDB(LocalTable(data, 100, page_latency_ms / 1000))
+    )
+    table = BenchTable()
+
+    start = time.perf_counter()
+    count = sum(1 for _ in table.list(page_size=100))
+    baseline = time.perf_counter() - start
+
+    summary = {
+        "scan": {"items": count, "seconds": baseline, "items_per_sec": count / baseline}
+    }
+    for segments in [1, 2, 4, 8, 16, 32]:
+        start = time.perf_counter()
+        count = sum(1 for _ in table.parallel_scan(segments=segments))
+        elapsed = time.perf_counter() - start
+        summary[f"parallel_scan_{segments}"] = {
+            "items": count,
+            "seconds": elapsed,
+            "items_per_sec": count / elapsed,
+            "speedup": baseline / elapsed,
+        }
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
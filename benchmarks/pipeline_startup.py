@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import inspect
+import statistics
+
+"""
+Pipeline startup benchmark.  Defines a pipeline class with 500 decorated methods and measures the time taken to define
+the class, construct the pipeline and serve one handler, compared with the previous `inspect` based discovery of lambda
+functions which eagerly built a wrapper for every function.
+
+    python benchmarks/pipeline_startup.py [methods] [samples]
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pipeline import Pipeline, events, functions
+
+
+def build_class(methods):
+    def make(idx):
+        @events.invoke
+        def handler(self, event, context):
+            return idx
+
+        handler.__name__ = f"handler_{idx}"
+        return handler
+
+    attrs = {f"handler_{idx}": make(idx) for idx in range(methods)}
+    return type("StartupPipeline", (Pipeline,), attrs)
+
+
+def reflected_functions(pipeline):
+    """Function discovery used by Pipeline.__init__ before the class-level registry"""
+    base_methods = [
+        x[0] for x in inspect.getmembers(Pipeline, predicate=inspect.isfunction)
+    ]
+    methods = [
+        x[0]
+        for x in inspect.getmembers(pipeline, predicate=inspect.ismethod)
+        if x[0] not in base_methods
+    ]
+    wrappers = {}
+    for fname in [x for x in methods if "trigger" in dir(getattr(pipeline, x))]:
+        func = getattr(pipeline, fname)
+        wrappers[fname] = getattr(functions, f"Function_{func.trigger.upper()}")(
+            func, pipeline.name
+        )
+    return functions.FunctionGroup(wrappers)
+
+
+def sample(methods):
+    start = time.perf_counter()
+    cls = build_class(methods)
+    defined = time.perf_counter()
+    pipeline = cls()
+    constructed = time.perf_counter()
+    getattr(pipeline, "handler_0")({}, None)
+    handled = time.perf_counter()
+    reflected_functions(pipeline)
+    reflected = time.perf_counter()
+    return {
+        "define_ms": (defined - start) * 1000,
+        "construct_ms": (constructed - defined) * 1000,
+        "startup_ms": (handled - start) * 1000,
+        "reflection_construct_ms": (reflected - handled) * 1000,
+    }
+
+
+def main(methods=500, samples=10):
+    results = [sample(methods) for _ in range(samples)]
+    summary = {
+        metric: statistics.median([r[metric] for r in results]) for metric in results[0]
+    }
+    summary["methods"] = methods
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import tempfile
+
+import yaml
+
+"""
+Template generation benchmark.  Builds a pipeline with thousands of functions and resources and measures building the
+template, writing it with the C and pure Python YAML emitters, and re-deploying when nothing changed (which skips the
+write).  Timings for increasing sizes show whether generation stays linear.
+
+    python benchmarks/template_generation.py [functions]
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pipeline import Pipeline, events, resources
+from pipeline.execution import execution
+
+
+def build_pipeline(count):
+    queues = [type(f"Queue{idx}", (resources.SQSQueue,), {})() for idx in range(count)]
+
+    def make(idx):
+        @events.sqs(resource=queues[idx])
+        def handler(self, event, context):
+            return event
+
+        handler.__name__ = f"handler_{idx}"
+        return handler
+
+    attrs = {f"handler_{idx}": make(idx) for idx in range(count)}
+    attrs["__init__"] = lambda self: Pipeline.__init__(self, resources=queues)
+    return type("TemplatePipeline", (Pipeline,), attrs)()
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def sample(count):
+    pipeline = build_pipeline(count)
+    build_ms, template = timed(pipeline.template)
+    with open(os.devnull, "w") as devnull:
+        c_ms, _ = timed(
+            lambda: yaml.dump(
+                template,
+                devnull,
+                Dumper=getattr(yaml, "CDumper", yaml.Dumper),
+                default_flow_style=False,
+            )
+        )
+        python_ms, _ = timed(
+            lambda: yaml.dump(template, devnull, default_flow_style=False)
+        )
+    deploy_ms, _ = timed(pipeline.deploy)
+    redeploy_ms, changed = timed(pipeline.deploy)
+    assert changed == []
+    return {
+        "template_ms": build_ms,
+        "c_emitter_ms": c_ms,
+        "python_emitter_ms": python_ms,
+        "deploy_ms": deploy_ms,
+        "unchanged_redeploy_ms": redeploy_ms,
+    }
+
+
+def main(functions=2000):
+    execution.accountid = "123456789012"
+    summary = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for count in [functions // 4, functions // 2, functions]:
+                summary[count] = sample(count)
+        finally:
+            os.chdir(cwd)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -30,7 +30,7 @@ class QuickstartPipeline(Pipeline):
 
     @events.http(method="get", path="helloworld", cors="true")
     def list_messages(self, event, context):
-        messages = table.list()
+        messages = list(table.list())
         resp = {"statusCode": 200, "body": json.dumps(messages)}
         return messages
 
@@ -17,7 +17,7 @@ class MyFirstPipelineTestCases(unittest.TestCase):
         # Give the table some time to update
         time.sleep(5)
         # Confirm the new entry using a DynamoDB table scan
-        response = table.list()
+        response = list(table.list())
         self.assertEqual(len(response), 1)
         self.assertEqual(response[0]["message"], "test_entry")
         # Delete the new entry with the entry's id
@@ -41,7 +41,7 @@ class SimpleRestAPI(Pipeline):
 
     @events.http(path="todos", method="get", cors="true")
     def list(self, event, context):
-        result = table.list()
+        result = list(table.list())
 
         response = {"statusCode": 200, "body": json.dumps(result, cls=DecimalEncoder)}
         return response
@@ -1,11 +1,16 @@
-import inspect
-import yaml
+import os
+import copy
+import json
+import functools
 
+from .builder import TemplateBuilder
 from .utils import Role
-from .execution import execution
+from .execution import execution, ACCOUNT_ID_ENV
 from . import functions
 from . import resources as res
 
+MANIFEST = "manifest.json"
+
 
 class Pipeline(object):
 
@@ -18,6 +23,26 @@ class Pipeline(object):
         - Services may be imported into the pipeline
     """
 
+    @classmethod
+    def _collect_lambdas(cls):
+        """
+        Names of the methods decorated with an event trigger, collected once per class when it's first instantiated.
+        Classes are walked from the most basic to the most derived along the MRO, so methods of mixins and of every
+        base pipeline are found and a method resolves to the same attribute as on an instance.
+        """
+        lambdas = cls.__dict__.get("_lambdas")
+        if lambdas is None:
+            found = {}
+            for klass in reversed(cls.__mro__):
+                for (name, attr) in vars(klass).items():
+                    if hasattr(attr, "trigger"):
+                        found[name] = None
+                    elif name in found:
+                        # Overridden by an undecorated attribute
+                        del found[name]
+            lambdas = cls._lambdas = tuple(found)
+        return lambdas
+
     def __init__(self, resources=None, services=None):
         self.name = self.__class__.__name__
         self.execution = execution
@@ -31,30 +56,36 @@ class Pipeline(object):
 
     def lambdas(self):
         """Return names of pipeline's methods (lambda functions)"""
-        base_methods = [
-            x[0] for x in inspect.getmembers(Pipeline, predicate=inspect.isfunction)
-        ]
-        methods = [
-            x[0]
-            for x in inspect.getmembers(self, predicate=inspect.ismethod)
-            if x[0] not in base_methods
-        ]
-        lambdas = [x for x in methods if "trigger" in dir(getattr(self, x))]
-        return lambdas
+        return list(self._collect_lambdas())
 
     def load_functions(self):
-        """Load functions into a FunctionGroup"""
-        wrappers = {}
+        """Load functions into a FunctionGroup.  Each function's wrapper is only built when first accessed"""
+        loaders = {}
         for fname in self.lambdas():
-            func = getattr(self, fname)
-            func_wrapper = getattr(functions, f"Function_{func.trigger.upper()}")(
-                func, self.name
-            )
-            wrappers.update({fname: func_wrapper})
-        return functions.FunctionGroup(wrappers)
+            loaders[fname] = functools.partial(self._load_function, fname)
+        return functions.FunctionGroup(loaders=loaders)
+
+    def _load_function(self, fname):
+        func = getattr(self, fname)
+        return getattr(functions, f"Function_{func.trigger.upper()}")(func, self.name)
+
+    def manifest(self):
+        """Compact description of the pipeline's functions, triggers and resources"""
+        return {
+            "service": self.name,
+            "functions": {
+                fname: {
+                    "handler": "handler." + fname,
+                    "trigger": getattr(self.__class__, fname).trigger,
+                }
+                for fname in self.lambdas()
+            },
+            "resources": sorted(self.resources.all) if self.resources else [],
+        }
 
     def define_role(self):
         """Define the pipeline's IAM role based on available resources"""
+        self.role = Role(self.name)
         if self.resources:
             for (k, v) in self.resources.all.items():
                 if "policy" not in v["Type"].lower():
@@ -62,67 +93,67 @@ class Pipeline(object):
                         self.role.add_resource("arn:aws:s3:::*")
                     else:
                         self.role.add_resource(v.arn)
+                    if isinstance(v, res.DynamoDB) and (
+                        v.global_indexes or v.local_indexes
+                    ):
+                        # Queries of secondary indexes are authorized against the ARNs of the indexes
+                        self.role.add_resource(v.arn + "/index/*")
                     self.role.add_action(v.resource.lower() + ":*")
+                    claim_check = getattr(v, "claim_check", None)
+                    if claim_check is not None:
+                        # Payloads of claim checks are offloaded to a bucket which may not be one of the resources
+                        self.role.add_resource(claim_check.bucket.arn)
+                        self.role.add_resource(claim_check.bucket.arn + "/*")
+                        self.role.add_action("s3:*")
         return self.role.to_dict()
 
-    def deploy(self, package=False):
-        """Generate a serverless.yml file of the pipeline which may be deployed with Serverless Framework"""
-        # Bucket notifications require setting up some additional policies.  Do this outside scope of lambda execution
-        # so we aren't creating resource templates during runtime.
-        # A lot of this could be abstracted to the resource object itself
-        for (k, v) in self.functions.all.items():
-            if v.trigger == "bucket_notification":
-                bucket = v.func.args["bucket"]  # Bucket resource
-                destination = v.func.args["destination"]  # Destination resource
-                event = v.func.args["event"]
-                prefix = v.func.args["prefix"]
-                if "NotificationConfiguration" not in bucket["Properties"].keys():
-                    bucket["Properties"].update({"NotificationConfiguration": {}})
-                if destination.resource == "sns":
-                    # Bucket configuration
-                    topic_configuration = [{"Topic": destination.arn, "Event": event}]
-                    if prefix:
-                        topic_configuration[0].update(
-                            {
-                                "Filter": {
-                                    "S3Key": {
-                                        "Rules": [{"Name": "prefix", "Value": prefix}]
-                                    }
-                                }
-                            }
-                        )
-                    bucket["Properties"]["NotificationConfiguration"].update(
-                        {"TopicConfigurations": topic_configuration}
-                    )
-                    # SNS Policy
-                    policy = res.SNSPolicy()
-                    destination.attach_policy(policy)
-                elif destination.resource == "sqs":
-                    # Bucket configuration
-                    queue_configuration = [{"Queue": destination.arn, "Event": event}]
-                    if prefix:
-                        queue_configuration[0].update(
-                            {
-                                "Filter": {
-                                    "S3Key": {
-                                        "Rules": [{"Name": "prefix", "Value": prefix}]
-                                    }
-                                }
-                            }
-                        )
-                    bucket["Properties"]["NotificationConfiguration"].update(
-                        {"QueueConfigurations": queue_configuration}
-                    )
-                    # SQS Policy
-                    policy = res.SQSPolicy()
-                    destination.attach_policy(policy)
-                if "DependsOn" in bucket.keys():
-                    bucket["DependsOn"].append(policy.name)
-                else:
-                    bucket.update({"DependsOn": [policy.name]})
-                self.resources.update_resource(bucket.name, bucket)
-                self.resources.add_resource(policy)
+    def build_resources(self):
+        """
+        Build the resources section of the template.  Bucket notifications require setting up some additional policies,
+        which are added to copies of the bucket templates so that building is repeatable and never changes the
+        pipeline's resource objects.
+        """
+        resources = {}
+        for resource in self.resources.all.values():
+            resources.update(resource.build_resource())
+        copied = set()
+        for v in self.functions.all.values():
+            if v.trigger != "bucket_notification":
+                continue
+            bucket = v.func.args["bucket"]  # Bucket resource
+            destination = v.func.args["destination"]  # Destination resource
+            if bucket.name not in copied:
+                resources[bucket.name] = copy.deepcopy(resources[bucket.name])
+                copied.add(bucket.name)
+            template = resources[bucket.name]
+            notification = template["Properties"].setdefault(
+                "NotificationConfiguration", {}
+            )
+            if destination.resource == "sns":
+                configuration = {"Topic": destination.arn}
+                configurations = notification.setdefault("TopicConfigurations", [])
+                policy = res.SNSPolicy()
+            elif destination.resource == "sqs":
+                configuration = {"Queue": destination.arn}
+                configurations = notification.setdefault("QueueConfigurations", [])
+                policy = res.SQSPolicy()
+            configuration["Event"] = v.func.args["event"]
+            if v.func.args["prefix"]:
+                configuration["Filter"] = {
+                    "S3Key": {
+                        "Rules": [{"Name": "prefix", "Value": v.func.args["prefix"]}]
+                    }
+                }
+            configurations.append(configuration)
+            destination.attach_policy(policy)
+            depends_on = template.setdefault("DependsOn", [])
+            if policy.name not in depends_on:
+                depends_on.append(policy.name)
+            resources.update(policy.build_resource())
+        return {"Resources": resources}
 
+    def template(self, package=False):
+        """Build the pipeline's serverless template"""
         sls_dict = {
             "service": self.name,
             "provider": {
@@ -132,6 +163,8 @@ class Pipeline(object):
                 "stage": self.execution.stage,
                 "iamRoleStatementsName": self.role.name,
                 "iamRoleStatements": self.define_role(),
+                # Lets the deployed functions resolve the account id without an STS call on cold start
+                "environment": {ACCOUNT_ID_ENV: {"Ref": "AWS::AccountId"}},
             },
             "functions": self.functions.to_dict(),
             "plugins": ["serverless-python-requirements"],
@@ -139,17 +172,31 @@ class Pipeline(object):
 
         if package:
             sls_dict.update({"package": {"artifact": package}})
-        else:
-            sls_dict.update({"plugins": ["serverless-python-requirements"]})
 
         if self.resources:
-            sls_dict.update({"resources": self.resources.to_dict()})
+            sls_dict.update({"resources": self.build_resources()})
+        return sls_dict
+
+    def deploy(self, package=False):
+        """
+        Generate a serverless.yml file of the pipeline which may be deployed with Serverless Framework.  The file is only
+        rewritten when its contents change.  Returns the names of the template sections which changed (ex.
+        `functions.my_func`, `resources.MyQueue` or `provider`).
+        """
+        changed = TemplateBuilder().write(self.template(package))
 
-        with open("serverless.yml", "w") as outfile:
-            yaml.dump(sls_dict, outfile, default_flow_style=False)
+        with open(MANIFEST, "w") as outfile:
+            json.dump(self.manifest(), outfile, sort_keys=True, separators=(",", ":"))
 
         if self.services:
+            existing = set()
+            if os.path.exists("requirements.txt"):
+                with open("requirements.txt", "r") as reqfile:
+                    existing = {line.strip() for line in reqfile}
             with open("requirements.txt", "a+") as reqfile:
                 for service in self.services:
                     for req in service.requirements():
-                        reqfile.write(req + "\n")
+                        if req not in existing:
+                            reqfile.write(req + "\n")
+                            existing.add(req)
+        return changed
@@ -4,6 +4,8 @@ import click
 import subprocess
 from shutil import copyfile
 
+from . import fingerprints
+
 
 @click.command()
 @click.argument("name")
@@ -25,20 +27,47 @@ def create_pipeline(name):
 @click.command()
 @click.argument("name")
 @click.option("--dry-run", default=False, is_flag=True)
-def deploy_pipeline(name, dry_run):
-    """Deploy the pipeline in a specified directory (creates serverless.yml)"""
+@click.option(
+    "--full", default=False, is_flag=True, help="Always deploy the whole stack"
+)
+def deploy_pipeline(name, dry_run, full):
+    """
+    Deploy the pipeline in a specified directory (creates serverless.yml).  The whole stack is only deployed when the
+    infrastructure changed since the last deployment; otherwise just the code of the changed functions is updated.
+    """
     os.chdir(name)
-    sys.path.append(os.getcwd())
+    sys.path.insert(0, os.getcwd())
     import handler
 
     handler.deploy()
     if not dry_run:
-        subprocess.call(
-            "sls plugin install -n serverless-python-requirements", shell=True
-        )
-        subprocess.call("sls deploy -v", shell=True)
-        subprocess.call("sls info -v --force > outputs.txt", shell=True)
-        parse_output()
+        pipeline = getattr(handler, "pipeline", None)
+        current = fingerprints.fingerprint(pipeline) if pipeline else None
+        targets = None
+        if current and not full:
+            targets = fingerprints.changes(current, fingerprints.load())
+
+        if targets is None:
+            sls("plugin install -n serverless-python-requirements")
+            sls("deploy -v")
+            sls("info -v --force > outputs.txt")
+            parse_output()
+        elif not targets:
+            click.echo("No changes to deploy")
+        else:
+            for target in targets:
+                click.echo(f"Updating code of function {target}")
+                sls(f"deploy function -f {target}")
+        if current:
+            fingerprints.save(current)
+
+
+def sls(command):
+    """Run a Serverless Framework command (the executable may be overridden with the PIPELINE_SLS variable)"""
+    executable = os.environ.get("PIPELINE_SLS", "sls")
+    code = subprocess.call(f"{executable} {command}", shell=True)
+    if code != 0:
+        raise click.ClickException(f"'sls {command}' failed with exit code {code}")
 
 
 def parse_output():
@@ -0,0 +1,86 @@
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Helpers for AWS batch APIs (SQS SendMessageBatch, SNS PublishBatch etc.).  Entries are packed into batches which respect
+the service's entry count and payload size limits, batches are dispatched concurrently on a bounded thread pool and only
+the entries which failed are retried.
+"""
+
+
+def chunk(entries, max_count, max_bytes=None, size=None):
+    """Group entries into lists of at most `max_count` entries whose combined `size` is at most `max_bytes`"""
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        entry_bytes = size(entry) if size else 0
+        if batch and (
+            len(batch) == max_count
+            or (max_bytes and batch_bytes + entry_bytes > max_bytes)
+        ):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += entry_bytes
+    if batch:
+        yield batch
+
+
+def dispatch(
+    call,
+    entries,
+    max_count=10,
+    max_bytes=None,
+    size=None,
+    workers=4,
+    retries=3,
+    backoff=0.1,
+):
+    """
+    Send entries (dictionaries with a unique `Id`) through `call`, a function which accepts a list of entries and returns
+    a batch response with `Successful` and `Failed` lists.  Failed entries which are not the sender's fault are retried
+    up to `retries` times with jittered exponential backoff.  Returns a dictionary mapping each entry id to its result.
+    """
+    results = {}
+    pending = list(entries)
+    attempt = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending:
+            lookup = {entry["Id"]: entry for entry in pending}
+            batches = chunk(pending, max_count, max_bytes, size)
+            retry = []
+            for response in executor.map(lambda batch: _send(call, batch), batches):
+                for success in response.get("Successful", []):
+                    results[success["Id"]] = success
+                for failure in response.get("Failed", []):
+                    results[failure["Id"]] = failure
+                    if not failure.get("SenderFault") and attempt < retries:
+                        retry.append(lookup[failure["Id"]])
+            pending = retry
+            attempt += 1
+            if pending:
+                time.sleep(random.uniform(0, backoff * 2 ** attempt))
+    return results
+
+
+def _send(call, batch):
+    """Call the batch API, converting an error for the whole request into a failure for each of its entries"""
+    try:
+        return call(batch)
+    except Exception as e:
+        error = getattr(e, "response", {}).get("Error", {})
+        code = error.get("Code", e.__class__.__name__)
+        sender_fault = error.get("Type") == "Sender" and "Throttl" not in code
+        return {
+            "Failed": [
+                {
+                    "Id": entry["Id"],
+                    "SenderFault": sender_fault,
+                    "Code": code,
+                    "Message": str(e),
+                }
+                for entry in batch
+            ]
+        }
@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+
+import yaml
+
+"""
+Writes serverless.yml.  Each top level section and each individual function and resource is hashed, and the hashes of
+the last written template are kept next to it so an unchanged template is never rewritten (keeping its mtime stable for
+build tools) and callers can tell exactly which functions and resources changed.  The template is emitted with
+LibYAML's C emitter when PyYAML was built with it.
+"""
+
+Dumper = getattr(yaml, "CDumper", yaml.Dumper)
+
+
+def digest(section):
+    """Stable content hash of a JSON serializable template section"""
+    encoded = json.dumps(section, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class TemplateBuilder(object):
+
+    """Object which writes a serverless template and tracks the content hash of its sections"""
+
+    def __init__(self, path="serverless.yml", state=".serverless-hashes.json"):
+        self.path = path
+        self.state = state
+
+    def hashes(self, template):
+        """Hash every section, with functions and resources hashed individually (ex. `functions.my_func`)"""
+        hashes = {}
+        for (key, section) in template.items():
+            if key == "functions":
+                for (name, function) in section.items():
+                    hashes[f"functions.{name}"] = digest(function)
+            elif key == "resources":
+                for (name, resource) in section.get("Resources", {}).items():
+                    hashes[f"resources.{name}"] = digest(resource)
+            else:
+                hashes[key] = digest(section)
+        return hashes
+
+    def previous(self):
+        """Section hashes of the last written template"""
+        if not os.path.exists(self.state) or not os.path.exists(self.path):
+            return {}
+        with open(self.state, "r") as stream:
+            return json.load(stream)
+
+    def write(self, template):
+        """Write the template if any section changed, returning the names of the sections which changed"""
+        hashes = self.hashes(template)
+        previous = self.previous()
+        changed = sorted(
+            key
+            for key in set(hashes) | set(previous)
+            if hashes.get(key) != previous.get(key)
+        )
+        if changed:
+            with open(self.path, "w") as outfile:
+                yaml.dump(template, outfile, Dumper=Dumper, default_flow_style=False)
+            with open(self.state, "w") as outfile:
+                json.dump(hashes, outfile, sort_keys=True, indent=0)
+        return changed
@@ -0,0 +1,327 @@
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import inspect
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from . import metrics
+
+"""
+In-process caches which outlive a single invocation.  Module state survives between the invocations of a warm lambda
+container, so results kept here (ex. reference objects read from S3) are reused until they expire or are evicted, and
+are lost only when the container is recycled.  Caches evict their least recently used entries beyond `maxsize`
+entries or `max_bytes` bytes (as estimated by `sizeof`), and count hits and misses, which are also recorded with the
+current invocation by `metrics`.
+
+`DiskCache` keeps files (ex. S3 objects along with their ETags) in a local directory such as /tmp, which also survives
+warm invocations, under a byte budget.
+"""
+
+# Default budget of a `DiskCache`, half of the smallest ephemeral storage of a lambda function
+DISK_CACHE_BYTES = 256 * 1024 * 1024
+
+# Files of a `DiskCache` are named after the hash of their key and their version, other files are left alone
+_VERSION = re.compile(r"^[0-9A-Za-z-]+$")
+_FILE = re.compile(r"^([0-9a-f]{64})\.([0-9A-Za-z-]+)$")
+_TEMPORARY = ".tmp-"
+
+_MISSING = object()
+
+# Separates positional from keyword arguments in the keys of `memoize`
+_KWARGS = object()
+
+
+def sizeof(value):
+    """Approximate size of a value in bytes, following the items of containers"""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        # numpy arrays and similar buffers
+        return nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sizeof(k) + sizeof(v) for (k, v) in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sizeof(x) for x in value)
+    return size
+
+
+class Cache(object):
+
+    """
+    Thread-safe mapping with least recently used eviction.  Entries expire `ttl` seconds after being set (never if
+    `None`), and the least recently used entries are evicted to keep at most `maxsize` entries and `max_bytes` bytes.
+    A single entry larger than `max_bytes` isn't cached.  Hits and misses are recorded with the current invocation as
+    `<name>.CacheHits` and `<name>.CacheMisses` when the cache is named.
+    """
+
+    def __init__(self, ttl=None, maxsize=128, max_bytes=None, name=None, size=sizeof):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.name = name
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        # Key mapped to (value, size, expiry), in order of use
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            self._record(hit=False)
+            return default
+        self._record(hit=True)
+        return value
+
+    def set(self, key, value):
+        size = self.size(value) if self.max_bytes is not None else 0
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, expiry)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            (value, size, expiry) = entry
+            if expiry is not None and expiry <= time.monotonic():
+                self._pop(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.name:
+            metrics.count(f"{self.name}.{'CacheHits' if hit else 'CacheMisses'}")
+
+
+def memoize(func, cache):
+    """
+    Wrap a function (or coroutine function) so its results are kept in `cache`, keyed by its arguments (which must be
+    hashable).  Exceptions aren't cached.  Concurrent calls with the same arguments may each compute the result.
+    """
+
+    def key(args, kwargs):
+        return args + (_KWARGS,) + tuple(sorted(kwargs.items())) if kwargs else args
+
+    if inspect.iscoroutinefunction(inspect.unwrap(func)):
+
+        @wraps(func)
+        async def cached_coroutine(*args, **kwargs):
+            k = key(args, kwargs)
+            value = cache.get(k, _MISSING)
+            if value is _MISSING:
+                value = await func(*args, **kwargs)
+                cache.set(k, value)
+            return value
+
+        cached_coroutine.cache = cache
+        return cached_coroutine
+
+    @wraps(func)
+    def cached_func(*args, **kwargs):
+        k = key(args, kwargs)
+        value = cache.get(k, _MISSING)
+        if value is _MISSING:
+            value = func(*args, **kwargs)
+            cache.set(k, value)
+        return value
+
+    cached_func.cache = cache
+    return cached_func
+
+
+class DiskCache(object):
+
+    """
+    Files stored in `directory` (by default `pipeline-cache/<name>` in the temporary directory, /tmp on lambda) keyed
+    by a name and a version (ex. an S3 bucket and key, and the object's ETag).  The least recently used files are
+    deleted to keep at most `max_bytes` bytes.  The directory must belong to a single cache, so caches each keep to
+    their own budget and the budgets of all the caches of a process add up.  Files are written to a temporary file and renamed into place, so concurrent
+    readers (threads or processes) never see a partial file, and are returned open so they remain readable even if
+    evicted meanwhile.  Cache files already in the directory (ex. from a previous process) are picked up on creation,
+    and other files in it are never indexed or deleted.
+    """
+
+    def __init__(self, directory=None, max_bytes=DISK_CACHE_BYTES, name=None):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "pipeline-cache", *([name.lower()] if name else [])
+        )
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        # Hash of the key mapped to (version, size), in order of use
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    def version(self, key):
+        """Version of the cached file of `key`, or `None`"""
+        entry = self._entries.get(self._hash(key))
+        return entry[0] if entry else None
+
+    def open(self, key, version=None):
+        """Open the cached file of `key` (if it has `version`) for reading, or return `None`"""
+        digest = self._hash(key)
+        with self._lock:
+            entry = self._entries.get(digest)
+            stream = None
+            if entry is not None and version in (None, entry[0]):
+                try:
+                    stream = open(self._path(digest, entry[0]), "rb")
+                except FileNotFoundError:
+                    # Evicted by another process
+                    self._pop(digest)
+                else:
+                    self._entries.move_to_end(digest)
+        if stream is not None:
+            self._record(hit=True)
+        return stream
+
+    def write(self, key, version, stream):
+        """
+        Store the contents of a file-like `stream` as `version` of `key` (a cache miss), returning the stored file open
+        for reading.  Files larger than the budget, or whose version can't be part of a file name, aren't kept.
+        """
+        self._record(hit=False)
+        digest = self._hash(key)
+        version = version.strip('"')
+        (fd, temporary) = tempfile.mkstemp(dir=self.directory, prefix=_TEMPORARY)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(stream, f)
+            cached = open(temporary, "rb")
+        except BaseException:
+            os.remove(temporary)
+            raise
+        size = os.fstat(cached.fileno()).st_size
+        if not _VERSION.match(version) or size > self.max_bytes:
+            # Not cacheable, the open file remains readable once removed
+            os.remove(temporary)
+            return cached
+        with self._lock:
+            self._pop(digest)
+            os.replace(temporary, self._path(digest, version))
+            self._entries[digest] = (version, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+        return cached
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop(self._hash(key))
+
+    def clear(self):
+        with self._lock:
+            for digest in list(self._entries):
+                self._pop(digest)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _path(self, digest, version):
+        return os.path.join(self.directory, f"{digest}.{version}")
+
+    def _scan(self):
+        """Index the cache files already in the directory, least recently modified first"""
+        files = []
+        for entry in os.scandir(self.directory):
+            match = _FILE.match(entry.name)
+            if match is None or not entry.is_file():
+                continue
+            (digest, version) = match.groups()
+            stat = entry.stat()
+            files.append((stat.st_mtime, digest, version, stat.st_size))
+        for (_, digest, version, size) in sorted(files):
+            self._pop(digest)
+            self._entries[digest] = (version, size)
+            self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, digest):
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+            try:
+                os.remove(self._path(digest, entry[0]))
+            except FileNotFoundError:
+                pass
+
+    def _record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.name:
+            metrics.count(f"{self.name}.{'CacheHits' if hit else 'CacheMisses'}")
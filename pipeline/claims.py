@@ -0,0 +1,141 @@
+import json
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .batching import chunk
+from .clients import registry
+
+"""
+Claim checks for messages larger than SQS and SNS allow.  A producer with offloading enabled writes bodies above a
+threshold to a S3 bucket and sends a small pointer to the object instead, and the event decorators replace pointers by
+the objects they point to before decoding records.  Pointers use the format of the AWS extended client libraries (a
+`ExtendedPayloadSize` message attribute and a `PayloadS3Pointer` body), so either side of a queue or topic may be one
+of those libraries instead.
+
+The role of a pipeline is granted access to the buckets of the claim checks of its queues and topics, which is needed
+to fetch and delete payloads (and to offload them from its functions).
+"""
+
+POINTER = "software.amazon.payloadoffloading.PayloadS3Pointer"
+SIZE_ATTRIBUTE = "ExtendedPayloadSize"
+
+# Maximum number of objects deleted by a DeleteObjects request
+S3_MAX_DELETE = 1000
+
+# Threads fetching the payloads of one event
+FETCH_WORKERS = 16
+
+
+class ClaimCheck(object):
+
+    """Offloads message bodies larger than `threshold` bytes to objects under `prefix` in `bucket`"""
+
+    def __init__(self, bucket, threshold, prefix="claim-checks/"):
+        self.bucket = bucket
+        self.threshold = threshold
+        self.prefix = prefix
+
+    def check(self, entry, size, body="MessageBody"):
+        """Entry of a SQS or SNS send request with its body offloaded if `size(entry)` is above the threshold"""
+        if size(entry) <= self.threshold:
+            return entry
+        return self._offload(entry, body)
+
+    def check_many(self, entries, size, body="MessageBody", workers=4):
+        """Check entries, uploading the bodies above the threshold concurrently on a pool of `workers` threads"""
+        oversized = [
+            idx for (idx, entry) in enumerate(entries) if size(entry) > self.threshold
+        ]
+        if not oversized:
+            return entries
+        entries = list(entries)
+        with ThreadPoolExecutor(max_workers=min(workers, len(oversized))) as executor:
+            offloaded = executor.map(
+                lambda idx: self._offload(entries[idx], body), oversized
+            )
+            for (idx, entry) in zip(oversized, offloaded):
+                entries[idx] = entry
+        return entries
+
+    def _offload(self, entry, body):
+        data = entry[body].encode("utf-8")
+        key = f"{self.prefix}{uuid.uuid4()}"
+        self.bucket.upload_file(key, data)
+        pointer = [POINTER, {"s3BucketName": self.bucket.name.lower(), "s3Key": key}]
+        attributes = dict(entry.get("MessageAttributes", {}))
+        attributes[SIZE_ATTRIBUTE] = {
+            "DataType": "Number",
+            "StringValue": str(len(data)),
+        }
+        return dict(
+            entry, **{body: json.dumps(pointer), "MessageAttributes": attributes}
+        )
+
+
+def pointer(record):
+    """(bucket, key) of the payload of a SQS or SNS record holding a claim check, or `None`"""
+    if SIZE_ATTRIBUTE not in (record.get("messageAttributes") or {}):
+        return None
+    try:
+        (name, location) = json.loads(record["body"])
+    except (TypeError, ValueError):
+        return None
+    if name != POINTER:
+        return None
+    return (location["s3BucketName"], location["s3Key"])
+
+
+def retrieve(records, workers=FETCH_WORKERS):
+    """
+    Replace the bodies of records holding claim checks by their payloads, fetched concurrently.  Returns the records
+    (the same list if none hold a claim check) and the claims, a dictionary of message ids to (bucket, key).
+    """
+    claims = {}
+    for record in records:
+        location = pointer(record)
+        if location is not None:
+            claims[record["messageId"]] = location
+    if not claims:
+        return (records, claims)
+
+    def fetch(location):
+        (bucket, key) = location
+        response = registry.client("s3").get_object(Bucket=bucket, Key=key)
+        return response["Body"].read().decode("utf-8")
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(claims))) as executor:
+        payloads = dict(zip(claims, executor.map(fetch, claims.values())))
+    records = [
+        (
+            dict(record, body=payloads[record["messageId"]])
+            if record["messageId"] in payloads
+            else record
+        )
+        for record in records
+    ]
+    return (records, claims)
+
+
+def delete(claims, response=None):
+    """
+    Delete the payloads of claims whose messages were processed, those not listed in the `batchItemFailures` of the
+    handler's `response`.  Returns the response.
+    """
+    if not claims:
+        return response
+    failed = set()
+    if isinstance(response, dict):
+        failed = {x["itemIdentifier"] for x in response.get("batchItemFailures", [])}
+    keys = defaultdict(list)
+    for (message_id, (bucket, key)) in claims.items():
+        if message_id not in failed:
+            keys[bucket].append(key)
+    client = registry.client("s3")
+    for (bucket, names) in keys.items():
+        for batch in chunk(names, S3_MAX_DELETE):
+            client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": x} for x in batch], "Quiet": True},
+            )
+    return response
@@ -0,0 +1,96 @@
+import threading
+
+"""
+Lazily constructed boto3 clients and resources.  Nothing here touches boto3 (or the network) until a service is first
+requested, so importing the library inside a lambda container only pays for the services a handler actually uses.
+Clients are cached for the lifetime of the container and reused across warm invocations.
+"""
+
+
+class ClientRegistry(object):
+
+    """Object which creates and caches boto3 clients and resources on first use"""
+
+    def __init__(self, max_pool_connections=50):
+        # Sized for the batch, streaming and async APIs which keep many requests to one service in flight
+        self.max_pool_connections = max_pool_connections
+        self._session = None
+        self._clients = {}
+        self._resources = {}
+        self._registered = set()
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import boto3
+
+                    self._session = boto3.session.Session()
+        return self._session
+
+    def client(self, service, max_pool_connections=None):
+        """
+        Return the cached boto3 client for a service, creating it on first use.  Passing `max_pool_connections` returns
+        a separate client whose connection pool is sized for that many concurrent requests.
+        """
+        if max_pool_connections is None or service in self._registered:
+            key = service
+        else:
+            key = (service, max_pool_connections)
+        try:
+            return self._clients[key]
+        except KeyError:
+            session = self.session
+            with self._lock:
+                if key not in self._clients:
+                    self._clients[key] = session.client(
+                        service, config=self._config(max_pool_connections)
+                    )
+                return self._clients[key]
+
+    def resource(self, service):
+        """Return the cached boto3 service resource for a service, creating it on first use"""
+        try:
+            return self._resources[service]
+        except KeyError:
+            session = self.session
+            with self._lock:
+                if service not in self._resources:
+                    self._resources[service] = session.resource(
+                        service, config=self._config()
+                    )
+                return self._resources[service]
+
+    def _config(self, max_pool_connections=None):
+        from botocore.config import Config
+
+        return Config(
+            max_pool_connections=max_pool_connections or self.max_pool_connections
+        )
+
+    def register_client(self, service, client):
+        """Override the client used for a service (ex. a stubbed client or one pointed at a local endpoint)"""
+        self._clients[service] = client
+        self._registered.add(service)
+
+    def register_resource(self, service, resource):
+        """Override the service resource used for a service"""
+        self._resources[service] = resource
+
+    def loaded(self):
+        """Return names of services with a client or resource already constructed"""
+        services = [x if isinstance(x, str) else x[0] for x in self._clients]
+        return sorted(set(services) | set(self._resources))
+
+    def reset(self):
+        """Drop all cached clients, resources and the underlying session"""
+        with self._lock:
+            self._clients = {}
+            self._resources = {}
+            self._registered = set()
+            self._session = None
+
+
+registry = ClientRegistry()
@@ -0,0 +1,239 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .batching import dispatch
+from .clients import registry
+from .serialization import decode_message
+
+"""
+Multi-threaded SQS consumer used to drain queues outside of lambda (tests, replays, long running workers).  Messages
+are received 10 at a time with long polling, handled on a thread pool and deleted in batches by a background thread as
+soon as they are handled successfully, rather than once the next long poll returns.  Visibility timeouts of messages
+which are still being handled are extended in the background so slow messages are not redelivered to another consumer.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Ranges of the long polling wait and visibility timeout accepted by SQS, in whole seconds
+SQS_WAIT_TIME = (0, 20)
+SQS_VISIBILITY_TIMEOUT = (0, 43200)
+
+
+class Consumer(object):
+
+    """
+    Object which consumes messages from a SQS queue until stopped.  `wait_time` and `visibility_timeout` are whole
+    seconds, as SQS requires.
+    """
+
+    def __init__(
+        self,
+        url,
+        handler,
+        workers=4,
+        wait_time=20,
+        visibility_timeout=30,
+        raw=False,
+        max_messages=None,
+        timeout=None,
+        stop_when_empty=False,
+    ):
+        for (name, value, (low, high)) in [
+            ("wait_time", wait_time, SQS_WAIT_TIME),
+            ("visibility_timeout", visibility_timeout, SQS_VISIBILITY_TIMEOUT),
+        ]:
+            if not isinstance(value, int) or not low <= value <= high:
+                raise ValueError(
+                    f"{name} must be a whole number of seconds between {low} and {high}"
+                )
+        self.url = url
+        self.handler = handler
+        self.workers = workers
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        self.raw = raw
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.stop_when_empty = stop_when_empty
+        self._client = registry.client("sqs")
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._condition = threading.Condition()
+        # Receipt handles mapped to [message, visibility deadline], a message delivered twice has two handles
+        self._inflight = {}
+        self._completed = []
+        self._received = 0
+        self._failed = 0
+        self._latencies = []
+
+    def stop(self):
+        """Stop receiving messages.  Messages already received are still handled and deleted"""
+        self._stop.set()
+
+    def run(self):
+        """Consume messages until stopped, returning throughput and latency statistics"""
+        start = time.perf_counter()
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        deleter = threading.Thread(target=self._deleter, daemon=True)
+        deleter.start()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while not self._stopping(start):
+                capacity = self._wait_for_capacity()
+                if self._stop.is_set():
+                    break
+                messages = self._receive(capacity)
+                if not messages and self.stop_when_empty and not self._inflight:
+                    break
+                for message in messages:
+                    self._received += 1
+                    with self._condition:
+                        self._inflight[message["ReceiptHandle"]] = [
+                            message,
+                            time.time() + self.visibility_timeout,
+                        ]
+                    executor.submit(self._handle, message)
+        except KeyboardInterrupt:
+            logger.info("Interrupted, finishing in-flight messages")
+        finally:
+            self._stop.set()
+            executor.shutdown(wait=True)
+            self._done.set()
+            with self._condition:
+                self._condition.notify_all()
+            deleter.join()
+            heartbeat.join()
+        return self.stats(time.perf_counter() - start)
+
+    def stats(self, elapsed):
+        latencies = sorted(self._latencies)
+        processed = len(latencies)
+
+        def percentile(p):
+            return latencies[min(int(p * processed), processed - 1)] if latencies else 0
+
+        return {
+            "received": self._received,
+            "processed": processed,
+            "failed": self._failed,
+            "seconds": elapsed,
+            "messages_per_sec": processed / elapsed if elapsed else 0,
+            "latency": {
+                "mean": sum(latencies) / processed if latencies else 0,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1] if latencies else 0,
+            },
+        }
+
+    def _stopping(self, start):
+        if self._stop.is_set():
+            return True
+        if self.timeout is not None and time.perf_counter() - start > self.timeout:
+            return True
+        return self.max_messages is not None and self._received >= self.max_messages
+
+    def _wait_for_capacity(self):
+        """Block until fewer than `2 * workers` messages are in flight, returning how many may be received"""
+        limit = self.workers * 2
+        with self._condition:
+            while len(self._inflight) >= limit and not self._stop.is_set():
+                self._condition.wait(timeout=1)
+            capacity = limit - len(self._inflight)
+        if self.max_messages is not None:
+            capacity = min(capacity, self.max_messages - self._received)
+        return max(1, min(capacity, 10))
+
+    def _receive(self, count):
+        response = self._client.receive_message(
+            QueueUrl=self.url,
+            MaxNumberOfMessages=count,
+            WaitTimeSeconds=self.wait_time,
+            VisibilityTimeout=self.visibility_timeout,
+            MessageAttributeNames=["All"],
+        )
+        return response.get("Messages", [])
+
+    def _handle(self, message):
+        start = time.perf_counter()
+        try:
+            if self.raw:
+                data = message
+            else:
+                data = decode_message(message["Body"], message.get("MessageAttributes"))
+            self.handler(data)
+        except Exception:
+            logger.exception("Failed to handle message %s", message["MessageId"])
+            succeeded = False
+        else:
+            succeeded = True
+        with self._condition:
+            del self._inflight[message["ReceiptHandle"]]
+            if succeeded:
+                self._latencies.append(time.perf_counter() - start)
+                self._completed.append(message)
+            else:
+                # Left on the queue, it becomes visible again once its visibility timeout expires
+                self._failed += 1
+            self._condition.notify_all()
+
+    def _deleter(self):
+        """
+        Delete messages as they complete, since their visibility is no longer extended and they would otherwise be
+        redelivered.  Messages completed while a batch is being deleted make up the next batch.
+        """
+        while True:
+            with self._condition:
+                while not self._completed and not self._done.is_set():
+                    self._condition.wait(timeout=1)
+                completed = self._completed
+                self._completed = []
+            if not completed:
+                return
+            self._delete(completed)
+
+    def _delete(self, completed):
+        entries = [
+            {"Id": str(idx), "ReceiptHandle": message["ReceiptHandle"]}
+            for (idx, message) in enumerate(completed)
+        ]
+        dispatch(
+            lambda batch: self._client.delete_message_batch(
+                QueueUrl=self.url, Entries=batch
+            ),
+            entries,
+            workers=1,
+        )
+
+    def _heartbeat(self):
+        """Extend the visibility timeout of messages which are close to becoming visible again"""
+        interval = max(self.visibility_timeout / 3, 0.1)
+        while not self._done.wait(interval):
+            now = time.time()
+            with self._condition:
+                expiring = [
+                    item
+                    for item in self._inflight.values()
+                    if item[1] - now < self.visibility_timeout / 2
+                ]
+                for item in expiring:
+                    item[1] = now + self.visibility_timeout
+            entries = [
+                {
+                    "Id": str(idx),
+                    "ReceiptHandle": message["ReceiptHandle"],
+                    "VisibilityTimeout": self.visibility_timeout,
+                }
+                for (idx, (message, _)) in enumerate(expiring)
+            ]
+            if entries:
+                dispatch(
+                    lambda batch: self._client.change_message_visibility_batch(
+                        QueueUrl=self.url, Entries=batch
+                    ),
+                    entries,
+                    workers=1,
+                )
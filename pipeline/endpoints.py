@@ -0,0 +1,115 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .outputs import Outputs
+
+"""
+HTTP client used to invoke a deployed pipeline's API Gateway endpoints.  The service endpoint parsed from outputs.yml is
+cached until the file changes, route templates are compiled once per path and requests reuse keep-alive connections from
+a pooled `requests.Session`.
+"""
+
+PARAMETER = re.compile(r"{([^{}]+?)\+?}")
+
+
+class Route(object):
+
+    """Path template (ex. `items/{id}/versions/{version}`) compiled once into a format string"""
+
+    def __init__(self, path):
+        self.path = path
+        self.parameters = PARAMETER.findall(path)
+        # Escape literal braces, then replace each parameter with its positional field
+        template = path.replace("{", "{{").replace("}", "}}")
+        for idx, parameter in enumerate(self.parameters):
+            template = re.sub(r"{{[^{}]+?}}", "{%d}" % idx, template, count=1)
+        self.template = template
+
+    def format(self, data):
+        """
+        Substitute path parameters from a dictionary of parameter values.  A single parameter may also be given as a
+        plain value.
+        """
+        if not self.parameters:
+            return self.path
+        if isinstance(data, dict):
+            values = [data[x] for x in self.parameters]
+        elif len(self.parameters) == 1:
+            values = [data]
+        else:
+            raise ValueError(f"Path {self.path} requires parameters {self.parameters}")
+        return self.template.format(*[str(x) for x in values])
+
+
+class HttpClient(object):
+
+    """Object which sends requests to the endpoints of a deployed pipeline"""
+
+    _clients = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def for_pipeline(cls, name, outputs="outputs.yml"):
+        """Return the shared client of a pipeline"""
+        with cls._lock:
+            if name not in cls._clients:
+                cls._clients[name] = cls(outputs)
+            return cls._clients[name]
+
+    def __init__(self, outputs="outputs.yml", pool_size=10):
+        self.outputs = outputs
+        self.pool_size = pool_size
+        self._endpoint = None
+        self._mtime = None
+        self._routes = {}
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            # Deferred so that only http clients pay for importing requests
+            import requests
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=self.pool_size, pool_maxsize=self.pool_size
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def endpoint(self):
+        """Service endpoint from outputs.yml, parsed again only if the file has been modified"""
+        mtime = os.stat(self.outputs).st_mtime_ns
+        if mtime != self._mtime:
+            self._endpoint = Outputs.load(self.outputs).endpoint()
+            self._mtime = mtime
+        return self._endpoint
+
+    def url(self, path, data):
+        if path not in self._routes:
+            self._routes[path] = Route(path)
+        return self.endpoint().rstrip("/") + "/" + self._routes[path].format(data)
+
+    def request(self, method, path, data=None):
+        """Send a request to an endpoint.  GET requests fill the path parameters with `data`, POST requests send it"""
+        if method == "get":
+            return self.session.get(self.url(path, data))
+        elif method == "post":
+            return self.session.post(self.url(path, data), data)
+        raise ValueError(f"Unsupported method: {method}")
+
+    def request_many(self, method, path, payloads, concurrency=10):
+        """Send one request per payload with up to `concurrency` in flight, returning the responses in input order"""
+        if concurrency > self.pool_size:
+            self.pool_size = concurrency
+            self._session = None
+        # Create the session up front rather than racing to create it from the worker threads
+        self.session
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(
+                executor.map(lambda data: self.request(method, path, data), payloads)
+            )
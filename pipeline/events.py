@@ -1,127 +1,212 @@
 from functools import wraps
-import json
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import contextvars
+import inspect
+import logging
+
+from . import claims, metrics, serialization
+from .execution import execution
 
 """
 Decorators used to specify event type for lambda invocations. Uses functools.wraps to preserve the original function 
 metadata, allowing this metadata to be accessable to the Pipeline object while outside the function's scope.  Each
 decorator creates a `trigger` and `args` attribute on the decorated function which are used internally to orchestrate
-configuration and deployment.
+configuration and deployment.  Resources are stored on `args` rather than their ARNs so that no account lookup happens
+while the pipeline class is being defined.
+
+Handlers may also be `async def` coroutine functions.  These run on a per-container event loop, and batched triggers
+fan their records out with `asyncio.gather`.
+
+Every invocation is recorded by `metrics` when it has hooks registered: the handler's duration, the records of the
+event, and the time spent decoding each record and in the handler.
 """
 
+logger = logging.getLogger(__name__)
+
+# Default number of records of a batch handled at once by an async handler
+ASYNC_CONCURRENCY = 100
+
+# Limits of SQS event source settings
+SQS_BATCH_SIZE = (1, 10000)
+SQS_BATCHING_WINDOW = (0, 300)
+SQS_MAX_CONCURRENCY = (2, 1000)
+
 
 def invoke(f):
     @wraps(f)
     def wrapper(self, event, context):
-        return f(self, event, context)
+        execution.bind_context(context)
+        return _call(self, f, event, context)
 
     wrapper.trigger = "lambda"
     wrapper.args = {}
-    return wrapper
+    return _instrumented(wrapper)
 
 
 def http(path, method, cors, legacy=False):
     def wrapper(f):
         @wraps(f)
         def wrapped_f(self, event, context):
+            execution.bind_context(context)
             if legacy:
-                return f(self, event, context)
+                return _call(self, f, event, context)
             if method == "get":
                 data = event["pathParameters"]
             else:
-                data = json.loads(event["body"])
-            return f(self, data, context)
+                data = _http_body(event)
+            return _call(self, f, data, context)
 
         wrapped_f.trigger = "http"
         wrapped_f.args = {"path": path, "method": method, "cors": cors}
-        return wrapped_f
+        return _instrumented(wrapped_f)
 
     return wrapper
 
 
-def sns(resource, legacy=False):
+def sns(resource, legacy=False, concurrency=None, batch=False):
+    """
+    SNS trigger.  Every record of the event is handled (S3 notifications published to the topic are passed as is, use
+    `bucket_notification` to handle their objects).  Records are handled one at a time and the handler's outputs are
+    returned as a list, or concurrently with `concurrency` and all at once with `batch=True`, as in `sqs`.  SNS can't
+    redeliver part of an event, so a failure fails the whole event, which is retried: one at a time the first record
+    to raise propagates its exception and the remaining records aren't handled, while with `concurrency` every record
+    is handled and `BatchError` is raised afterwards (as for the failed indices returned by a `batch=True` handler).
+    Claim checks are fetched as in `sqs`, but their payloads are never deleted since every subscriber of the topic
+    (and every retry) needs them.  Expire them with a lifecycle rule on the bucket instead.
+    """
+    _validate_batch(batch, concurrency)
+
     def wrapper(f):
         @wraps(f)
         def wrapped_f(self, event, context):
+            execution.bind_context(context)
             if legacy:
-                return f(self, event, context)
-            record = event["Records"][0]
-            if record["EventSource"] == "aws:sns":
-                data = record["Sns"]["Message"]
-            elif record["EventSource"] == "aws:s3":
-                msg = json.loads(record["Sns"]["message"])
-                data = {
-                    "bucket": msg["s3"]["bucket"]["name"],
-                    "key": msg["s3"]["object"]["key"],
-                }
-            return f(self, data, context)
+                return _call(self, f, event, context)
+            records = [_sns_record(record) for record in event["Records"]]
+            (records, _) = claims.retrieve(records)
+            if batch:
+                return _dispatch_batch(
+                    self, f, records, _sns_body, context, report=False
+                )
+            return _dispatch(
+                self, f, records, _sns_body, context, concurrency, report=False
+            )
 
         wrapped_f.trigger = "sns"
         wrapped_f.args = {
-            "arn": resource.arn,
+            "resource": resource,
             "topic_name": resource.name,
             "func_name": f.__name__,
         }
-        return wrapped_f
+        return _instrumented(wrapped_f)
 
     return wrapper
 
 
-def sqs(resource, legacy=False):
+def sqs(
+    resource,
+    legacy=False,
+    concurrency=None,
+    batch_size=None,
+    batching_window=None,
+    max_concurrency=None,
+    batch=False,
+    delete_payloads=False,
+):
+    """
+    SQS trigger.  By default records are processed one at a time and the handler's outputs are returned as a list
+    (`async def` handlers are gathered on the event loop, at most `ASYNC_CONCURRENCY` at a time).  Passing
+    `concurrency` processes the records of a batch concurrently (on a pool of that many threads, or that many
+    coroutines for async handlers) and reports records which raise as `batchItemFailures` so only those messages are
+    redelivered.
+
+    The event source may be tuned with `batch_size` (records per invocation), `batching_window` (seconds to wait to
+    fill a batch) and `max_concurrency` (maximum concurrent invocations by the event source).
+
+    With `batch=True` the handler is called once with the whole decoded batch (see `Batch`) for vectorized
+    processing, and returns the indices of the records which failed (or `None`), which are reported as
+    `batchItemFailures`.  An index out of the range of the batch fails every record of it.
+
+    Records holding claim checks (see `claims` and `SQSQueue.enable_offload`) are replaced by their payloads, fetched
+    concurrently from S3, and with `delete_payloads=True` the payloads of the records processed successfully are
+    deleted afterwards.
+    """
+    _validate_sqs(batch_size, batching_window, max_concurrency)
+    _validate_batch(batch, concurrency)
+
     def wrapper(f):
         @wraps(f)
         def wrapped_f(self, event, context):
-            outputs = []
+            execution.bind_context(context)
             if legacy:
-                for record in event["Records"]:
-                    output = f(self, record, context)
-                    outputs.append(output)
-                return outputs
-            for record in event["Records"]:
-                data = json.loads(record["body"])
-                output = f(self, data, context)
-                outputs.append(output)
-            return outputs
+                return _dispatch(
+                    self, f, event["Records"], _identity, context, concurrency
+                )
+            (records, checks) = claims.retrieve(event["Records"])
+            if batch:
+                response = _dispatch_batch(self, f, records, _sqs_body, context)
+            else:
+                response = _dispatch(self, f, records, _sqs_body, context, concurrency)
+            return claims.delete(checks, response) if delete_payloads else response
 
         wrapped_f.trigger = "sqs"
         wrapped_f.args = {
-            "arn": resource.arn,
-            "url": resource.url,
+            "resource": resource,
             "queue_name": resource.name,
+            "report_failures": bool(concurrency) or batch,
+            "batch_size": batch_size,
+            "batching_window": batching_window,
+            "max_concurrency": max_concurrency,
         }
-        return wrapped_f
+        return _instrumented(wrapped_f)
 
     return wrapper
 
 
-def bucket_notification(bucket, event_type, destination, prefix=None, legacy=False):
+def bucket_notification(
+    bucket,
+    event_type,
+    destination,
+    prefix=None,
+    legacy=False,
+    concurrency=None,
+    batch_size=None,
+    batching_window=None,
+    max_concurrency=None,
+    batch=False,
+):
+    """
+    S3 bucket notification delivered through a SNS topic or SQS queue (`destination`).  The handler is called with
+    the bucket and key of every object of every notification in the event.  `concurrency` and `batch` behave as in
+    `sns` or `sqs` depending on the destination, and for SQS destinations so do `batch_size`, `batching_window` and
+    `max_concurrency`.
+    """
+    _validate_sqs(batch_size, batching_window, max_concurrency)
+    _validate_batch(batch, concurrency)
+
     def wrapper(f):
         @wraps(f)
         def wrapped_f(self, event, context):
-            if destination.resource == "sns":
-                if legacy:
-                    return f(self, event, context)
-                msg = json.loads(event["Records"][0]["Sns"]["Message"])["Records"][0]
-                data = {
-                    "bucket": msg["s3"]["bucket"]["name"],
-                    "key": msg["s3"]["object"]["key"],
-                }
-                return f(self, data, context)
-            elif destination.resource == "sqs":
-                outputs = []
-                if legacy:
-                    for record in event["Records"]:
-                        output = f(self, record, context)
-                        outputs.append(output)
-                    return outputs
-                for record in event["Records"]:
-                    body = json.loads(record["body"])
-                    data = {
-                        "bucket": body["Records"][0]["s3"]["bucket"]["name"],
-                        "key": body["Records"][0]["s3"]["object"]["key"],
-                    }
-                    output = f(self, data, context)
-                    outputs.append(output)
-                return outputs
+            execution.bind_context(context)
+            if legacy:
+                if destination.resource == "sns":
+                    return _call(self, f, event, context)
+                records = event["Records"]
+                decode = _identity
+            else:
+                if destination.resource == "sns":
+                    records = [_sns_record(record) for record in event["Records"]]
+                else:
+                    records = event["Records"]
+                records = _s3_records(records)
+                decode = _s3_object
+            report = destination.resource == "sqs"
+            if batch:
+                return _dispatch_batch(self, f, records, decode, context, report=report)
+            return _dispatch(
+                self, f, records, decode, context, concurrency, report=report
+            )
 
         wrapped_f.trigger = "bucket_notification"
         wrapped_f.args = {
@@ -129,7 +214,312 @@ def bucket_notification(bucket, event_type, destination, prefix=None, legacy=Fal
             "event": event_type,
             "destination": destination,
             "prefix": prefix,
+            "report_failures": (bool(concurrency) or batch)
+            and destination.resource == "sqs",
+            "batch_size": batch_size,
+            "batching_window": batching_window,
+            "max_concurrency": max_concurrency,
         }
-        return wrapped_f
+        return _instrumented(wrapped_f)
 
     return wrapper
+
+
+def _instrumented(handler):
+    """Record invocations of a handler with `metrics`, calling it directly when there are no metrics hooks"""
+
+    @wraps(handler)
+    def wrapped(self, event, context):
+        invocation = metrics.start(self.name, handler.__name__, context)
+        if invocation is None:
+            return handler(self, event, context)
+        try:
+            return handler(self, event, context)
+        except Exception:
+            invocation.error = True
+            raise
+        finally:
+            metrics.finish(invocation)
+
+    return wrapped
+
+
+def _validate_sqs(batch_size=None, batching_window=None, max_concurrency=None):
+    """Check SQS event source settings against the limits of Lambda, raising `ValueError` if any are out of range"""
+    for (name, value, (low, high)) in [
+        ("batch_size", batch_size, SQS_BATCH_SIZE),
+        ("batching_window", batching_window, SQS_BATCHING_WINDOW),
+        ("max_concurrency", max_concurrency, SQS_MAX_CONCURRENCY),
+    ]:
+        if value is not None and not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+    if batch_size is not None and batch_size > 10 and not batching_window:
+        raise ValueError("batch_size greater than 10 requires a batching_window")
+
+
+def _validate_batch(batch, concurrency):
+    if batch and concurrency:
+        raise ValueError("batch and concurrency are mutually exclusive")
+
+
+class Batch(list):
+
+    """
+    Decoded records of an event delivered at once to a `batch=True` handler.  The batch is a list of the decoded
+    bodies, with the message ids and message attributes of the records as parallel lists.  `column` returns one field
+    of every body (ex. `batch.column("key")` for bucket notifications), which may be handed to a vectorized function.
+    Records which could not be decoded are left out of the batch and reported as failures.
+    """
+
+    def __init__(self, bodies, records):
+        super().__init__(bodies)
+        self.records = records
+
+    @property
+    def ids(self):
+        return [record["messageId"] for record in self.records]
+
+    @property
+    def attributes(self):
+        return [record.get("messageAttributes", {}) for record in self.records]
+
+    def column(self, name):
+        return [body[name] for body in self]
+
+
+def _dispatch_batch(self, f, records, decode, context, report=True):
+    """
+    Decode a batch and call the handler once with it.  Records which fail to decode, and those whose indices are
+    returned by the handler, are failures (see `_failures`).  An exception raised by the handler fails the batch, and
+    so does an index out of the range of the batch, as the handler's failures can't be told apart.
+    """
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.records += len(records)
+        decode = invocation.timed("Decode", decode)
+    bodies = []
+    decoded = []
+    failed = []
+    for record in records:
+        try:
+            bodies.append(decode(record))
+        except Exception:
+            logger.exception("Failed to decode message %s", record["messageId"])
+            failed.append(record["messageId"])
+        else:
+            decoded.append(record)
+    if decoded:
+        indices = _call(self, f, Batch(bodies, decoded), context)
+        # Compared with None since the truth value of an array of indices is ambiguous
+        if indices is not None:
+            indices = sorted(set(int(x) for x in indices))
+            if indices and not 0 <= indices[0] <= indices[-1] < len(decoded):
+                logger.error(
+                    "Indices %s out of range for a batch of %d records, failing the batch",
+                    [x for x in indices if not 0 <= x < len(decoded)],
+                    len(decoded),
+                )
+                indices = range(len(decoded))
+            for index in indices:
+                failed.append(decoded[index]["messageId"])
+    return _failures(failed, report)
+
+
+class BatchError(Exception):
+
+    """Raised when records of an event which can't be partially redelivered (SNS) fail, so the event is retried"""
+
+    def __init__(self, ids):
+        super().__init__(f"Failed to process messages {ids}")
+        self.ids = ids
+
+
+def _failures(ids, report):
+    """
+    Partial batch response reporting the failed messages when `report` (SQS event sources with
+    `ReportBatchItemFailures`), otherwise raise `BatchError` if any failed
+    """
+    ids = list(dict.fromkeys(ids))
+    if report:
+        return {"batchItemFailures": [{"itemIdentifier": x} for x in ids]}
+    if ids:
+        raise BatchError(ids)
+
+
+def _sns_record(record):
+    """SNS record in the shape of a SQS record, so both are dispatched alike"""
+    sns = record["Sns"]
+    return {
+        "messageId": sns.get("MessageId"),
+        "body": sns["Message"],
+        "messageAttributes": sns.get("MessageAttributes", {}),
+    }
+
+
+def _sns_body(record):
+    # Messages published without a codec are passed as is
+    codec = serialization.from_attributes(record["messageAttributes"], default=None)
+    return record["body"] if codec is None else codec.decode_text(record["body"])
+
+
+def _s3_records(records):
+    """
+    One record per object of records holding S3 event notifications, each keeping its message's id.  Notifications
+    without objects (ex. `s3:TestEvent`) are dropped, and bodies which aren't valid JSON are kept to fail decoding.
+    """
+    expanded = []
+    for record in records:
+        try:
+            notification = serialization.loads(record["body"])
+        except ValueError:
+            expanded.append(record)
+            continue
+        for s3 in notification.get("Records", []):
+            expanded.append(dict(record, body=s3))
+    return expanded
+
+
+def _s3_object(record):
+    body = record["body"]
+    return {"bucket": body["s3"]["bucket"]["name"], "key": body["s3"]["object"]["key"]}
+
+
+def _identity(record):
+    return record
+
+
+def _sqs_body(record):
+    return serialization.decode_message(record["body"], record.get("messageAttributes"))
+
+
+def _http_body(event):
+    """Request body decoded with the codec of its `Content-Type` header, or as JSON"""
+    headers = event.get("headers") or {}
+    content_type = headers.get("Content-Type") or headers.get("content-type")
+    try:
+        codec = serialization.get(content_type and content_type.split(";")[0].strip())
+    except ValueError:
+        codec = serialization.JSON
+    if event.get("isBase64Encoded"):
+        return codec.decode(base64.b64decode(event["body"]))
+    return codec.decode_text(event["body"])
+
+
+def _loop():
+    """Event loop used to run async handlers, created once per container and reused across warm invocations"""
+    # Deferred so that only async handlers pay for importing asyncio
+    import asyncio
+
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_event_loop)
+    return _event_loop
+
+
+_event_loop = None
+
+
+def _call(self, f, data, context):
+    """Call a handler, running it to completion on the container's event loop if it is a coroutine function"""
+    invocation = metrics.current()
+    if invocation is not None:
+        f = invocation.timed("Handler", f)
+    output = f(self, data, context)
+    if inspect.iscoroutine(output):
+        return _loop().run_until_complete(output)
+    return output
+
+
+def _executor(workers):
+    """Thread pool of `workers` threads, created once per container and reused across warm invocations"""
+    if workers not in _executors:
+        _executors[workers] = ThreadPoolExecutor(max_workers=workers)
+    return _executors[workers]
+
+
+_executors = {}
+
+
+def _coroutine(f):
+    """Whether a handler is a coroutine function, checked once per handler rather than on every event"""
+    if f not in _coroutines:
+        _coroutines[f] = inspect.iscoroutinefunction(inspect.unwrap(f))
+    return _coroutines[f]
+
+
+_coroutines = {}
+
+
+def _dispatch(self, f, records, decode, context, concurrency=None, report=True):
+    """
+    Decode and handle each record of a batch.  Without `concurrency` the handler's outputs are returned as a list and
+    the first error fails the whole batch.  With `concurrency` records are handled concurrently and the partial batch
+    response expected by lambda when `ReportBatchItemFailures` is enabled is returned instead, or without `report` the
+    outputs once every record succeeded.
+    """
+    coroutine = _coroutine(f)
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.records += len(records)
+        decode = invocation.timed("Decode", decode)
+        f = invocation.timed("Handler", f)
+    if coroutine:
+        limit = concurrency or ASYNC_CONCURRENCY
+        results = _loop().run_until_complete(
+            _gather(self, f, records, decode, context, limit, bool(concurrency))
+        )
+    elif concurrency:
+
+        def handle(record):
+            return f(self, decode(record), context)
+
+        executor = _executor(concurrency)
+        if invocation is not None:
+            # Run in copies of the context so resource calls on the pool's threads are recorded with the invocation
+            futures = [
+                executor.submit(contextvars.copy_context().run, handle, record)
+                for record in records
+            ]
+        else:
+            futures = [executor.submit(handle, record) for record in records]
+        results = [future.exception() or future.result() for future in futures]
+    else:
+        return [f(self, decode(record), context) for record in records]
+
+    if not concurrency:
+        return results
+    failed = []
+    for (record, result) in zip(records, results):
+        if isinstance(result, Exception):
+            logger.error(
+                "Failed to process message %s",
+                record["messageId"],
+                exc_info=(type(result), result, result.__traceback__),
+            )
+            failed.append(record["messageId"])
+    return _failures(failed, report) if report or failed else results
+
+
+async def _gather(self, f, records, decode, context, limit, return_exceptions):
+    """
+    Handle records with an async handler, keeping at most `limit` in flight.  Without `return_exceptions` the first
+    error cancels the records still pending, so none of them carry on into the next invocation on the shared loop.
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def handle(record):
+        async with semaphore:
+            return await f(self, decode(record), context)
+
+    tasks = [asyncio.ensure_future(handle(record)) for record in records]
+    if return_exceptions:
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
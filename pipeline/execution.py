@@ -1,7 +1,8 @@
-import yaml
-import boto3
+import os
 
-client = boto3.client("sts")
+from .clients import registry
+
+ACCOUNT_ID_ENV = "AWS_ACCOUNT_ID"
 
 
 class Execution(object):
@@ -12,7 +13,7 @@ class Execution(object):
         self.__runtime = "python3.6"
         self.__region = "us-east-1"
         self.__stage = "dev"
-        self.__accountid = client.get_caller_identity()["Account"]
+        self.__accountid = None
 
     @property
     def runtime(self):
@@ -40,7 +41,29 @@ class Execution(object):
 
     @property
     def accountid(self):
+        """
+        AWS account id, resolved on first access.  Checks (in order) the cached value, the `AWS_ACCOUNT_ID` environment
+        variable (set on every deployed function) and finally falls back to a single STS call.
+        """
+        if self.__accountid is None:
+            accountid = os.environ.get(ACCOUNT_ID_ENV)
+            if not accountid:
+                accountid = registry.client("sts").get_caller_identity()["Account"]
+            self.__accountid = accountid
         return self.__accountid
 
+    @accountid.setter
+    def accountid(self, value):
+        self.__accountid = value
+
+    def bind_context(self, context):
+        """Cache the account id from the lambda context's function ARN (arn:aws:lambda:region:account:function:name)"""
+        if self.__accountid is None:
+            arn = getattr(context, "invoked_function_arn", None)
+            if arn:
+                parts = arn.split(":")
+                if len(parts) > 4 and parts[4]:
+                    self.__accountid = parts[4]
+
 
 execution = Execution()
@@ -0,0 +1,91 @@
+import os
+import json
+import inspect
+import hashlib
+
+from .builder import TemplateBuilder, digest
+
+"""
+Fingerprints of a pipeline used to deploy only what changed.  The infrastructure fingerprint covers the serverless
+template (provider, resources and each function's configuration and trigger).  Each function's code fingerprint covers
+the source of its method, and the shared fingerprint covers every other file packaged with the functions (helper
+modules, requirements and the rest of handler.py), which all functions depend on.
+"""
+
+STATE = ".pipeline-deploy.json"
+
+# Files and directories which are generated by deployment rather than packaged code
+IGNORED = {
+    "__pycache__",
+    "node_modules",
+    ".serverless",
+    ".requirements",
+    "serverless.yml",
+    "manifest.json",
+    "outputs.yml",
+    "outputs.txt",
+    STATE,
+    ".serverless-hashes.json",
+}
+
+
+def function_sources(pipeline):
+    """Source code of each of the pipeline's lambda functions"""
+    sources = {}
+    for name in pipeline.lambdas():
+        func = inspect.unwrap(getattr(pipeline.__class__, name))
+        sources[name] = inspect.getsource(func)
+    return sources
+
+
+def fingerprint(pipeline, directory="."):
+    """Infrastructure, shared code and per-function code fingerprints of a pipeline in `directory`"""
+    sources = function_sources(pipeline)
+    shared = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(x for x in dirs if x not in IGNORED and not x.startswith("."))
+        for fname in sorted(files):
+            if fname in IGNORED or fname.endswith(".pyc"):
+                continue
+            path = os.path.join(root, fname)
+            with open(path, "rb") as stream:
+                contents = stream.read()
+            if os.path.relpath(path, directory) == "handler.py":
+                # Each function's own code is fingerprinted separately
+                for source in sources.values():
+                    contents = contents.replace(source.encode("utf-8"), b"")
+            shared.update(os.path.relpath(path, directory).encode("utf-8"))
+            shared.update(hashlib.sha256(contents).digest())
+    return {
+        "infrastructure": TemplateBuilder().hashes(pipeline.template()),
+        "shared": shared.hexdigest(),
+        "functions": {name: digest(source) for (name, source) in sources.items()},
+    }
+
+
+def changes(current, previous):
+    """
+    Compare fingerprints with those of the last deployment.  Returns `None` when the infrastructure changed (requiring a
+    full stack deployment), otherwise the names of the functions whose code needs updating.
+    """
+    if not previous or current["infrastructure"] != previous["infrastructure"]:
+        return None
+    if current["shared"] != previous["shared"]:
+        return sorted(current["functions"])
+    return sorted(
+        name
+        for (name, value) in current["functions"].items()
+        if previous["functions"].get(name) != value
+    )
+
+
+def load(path=STATE):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as stream:
+        return json.load(stream)
+
+
+def save(state, path=STATE):
+    with open(path, "w") as stream:
+        json.dump(state, stream, sort_keys=True, indent=0)
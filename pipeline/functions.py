@@ -1,22 +1,24 @@
 import os
-import json
-import re
+import time
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from functools import wraps
 
-import requests
-import boto3
-
+from . import serialization
+from .caching import Cache, memoize
+from .clients import registry
 from .execution import execution
-from .outputs import Outputs
+from .endpoints import HttpClient
+
+ARCHITECTURES = ("x86_64", "arm64")
+EPHEMERAL_STORAGE = (512, 10240)
 
 
 class InvocationError(BaseException):
     pass
 
 
-lambda_client = boto3.client("lambda")
-
-
 class Function(object):
     """Object representing an AWS Lambda function and its trigger"""
 
@@ -39,9 +41,33 @@ class Function(object):
             func_info.update({"timeout": self.func.timeout})
         if hasattr(self.func, "memory"):
             func_info.update({"memorySize": self.func.memory})
+        if getattr(self.func, "reserved_concurrency", None) is not None:
+            func_info.update({"reservedConcurrency": self.func.reserved_concurrency})
+        if getattr(self.func, "provisioned_concurrency", None) is not None:
+            func_info.update(
+                {"provisionedConcurrency": self.func.provisioned_concurrency}
+            )
+        if hasattr(self.func, "architecture"):
+            func_info.update({"architecture": self.func.architecture})
+        if hasattr(self.func, "ephemeral_storage"):
+            func_info.update({"ephemeralStorageSize": self.func.ephemeral_storage})
         return func_info
 
 
+def sqs_event(arn, args):
+    """SQS event source of a function, with the batching and scaling settings of its decorator"""
+    event = {"arn": arn}
+    if args.get("batch_size") is not None:
+        event["batchSize"] = args["batch_size"]
+    if args.get("batching_window") is not None:
+        event["maximumBatchingWindow"] = args["batching_window"]
+    if args.get("max_concurrency") is not None:
+        event["maximumConcurrency"] = args["max_concurrency"]
+    if args.get("report_failures"):
+        event["functionResponseType"] = "ReportBatchItemFailures"
+    return {"sqs": event}
+
+
 class Function_LAMBDA(Function):
     def __init__(self, func, pipeline_name):
         super().__init__(func, pipeline_name)
@@ -50,12 +76,74 @@ class Function_LAMBDA(Function):
         return None
 
     def invoke(self, data, invocation="RequestResponse"):
+        return self._invoke(registry.client("lambda"), data, invocation)
+
+    def invoke_many(
+        self,
+        payloads,
+        concurrency=10,
+        invocation="RequestResponse",
+        ordered=True,
+        retries=8,
+    ):
+        """
+        Invoke the function once per payload with up to `concurrency` invocations in flight, retrying throttled
+        invocations with jittered exponential backoff, and return once every invocation completed (so `Event`
+        invocations are all queued on return).  Returns the responses in input order, or `(index, response)` tuples in
+        completion order with `ordered=False`.  Payloads may be a lazy iterable; only a window of them is read ahead.
+        """
+        client = registry.client("lambda", max_pool_connections=concurrency)
+        window = concurrency * 2
+        responses = []
+
+        def submit(executor, index, data):
+            future = executor.submit(
+                self._invoke, client, data, invocation, retries=retries
+            )
+            future.index = index
+            return future
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            payloads = enumerate(payloads)
+            if ordered:
+                pending = deque()
+                for (index, data) in payloads:
+                    pending.append(submit(executor, index, data))
+                    if len(pending) >= window:
+                        responses.append(pending.popleft().result())
+                while pending:
+                    responses.append(pending.popleft().result())
+            else:
+                pending = set()
+                for (index, data) in payloads:
+                    pending.add(submit(executor, index, data))
+                    if len(pending) >= window:
+                        (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            responses.append((future.index, future.result()))
+                for future in as_completed(pending):
+                    responses.append((future.index, future.result()))
+        return responses
+
+    def _invoke(self, client, data, invocation, retries=0):
         long_name = f"{self.pipeline_name}-{execution.stage}-{self.name}"
-        response = lambda_client.invoke(
-            FunctionName=long_name, InvocationType=invocation, Payload=json.dumps(data)
-        )
+        attempt = 0
+        while True:
+            try:
+                response = client.invoke(
+                    FunctionName=long_name,
+                    InvocationType=invocation,
+                    Payload=serialization.dumps(data),
+                )
+                break
+            except Exception as e:
+                code = getattr(e, "response", {}).get("Error", {}).get("Code")
+                if code != "TooManyRequestsException" or attempt >= retries:
+                    raise
+                attempt += 1
+                time.sleep(random.uniform(0, min(0.1 * 2 ** attempt, 20)))
         if invocation == "RequestResponse":
-            response = json.loads(response["Payload"].read())
+            response = serialization.loads(response["Payload"].read())
         return response
 
 
@@ -68,7 +156,7 @@ class Function_SNS(Function):
             "events": [
                 {
                     "sns": {
-                        "arn": self.func.args["arn"],
+                        "arn": self.func.args["resource"].arn,
                         "topicName": self.func.args["topic_name"],
                     }
                 }
@@ -100,17 +188,23 @@ class Function_HTTP(Function):
         }
 
     def invoke(self, data):
-        outputs = Outputs.load("outputs.yml")
-        full_path = os.path.join(outputs.endpoint(), self.func.args["path"])
-        # there is am uch better way of doing this
-        if "{" and "}" in full_path:
-            regex = re.compile("{(.*?)\}")
-            match = regex.findall(full_path)[0]
-            full_path = full_path.replace("{" + match + "}", data)
-        if self.func.args["method"] == "get":
-            r = requests.get(full_path)
-        elif self.func.args["method"] == "post":
-            r = requests.post(full_path, data)
+        client = HttpClient.for_pipeline(self.pipeline_name)
+        r = client.request(self.func.args["method"], self.func.args["path"], data)
+        return self._response(r)
+
+    def invoke_many(self, payloads, concurrency=10):
+        """
+        Invoke the endpoint once per payload with up to `concurrency` requests in flight (ex. for load testing),
+        returning the responses in input order once all requests completed
+        """
+        client = HttpClient.for_pipeline(self.pipeline_name)
+        responses = client.request_many(
+            self.func.args["method"], self.func.args["path"], payloads, concurrency
+        )
+        return [self._response(r) for r in responses]
+
+    @staticmethod
+    def _response(r):
         if r.status_code != 404:
             response = r.content.decode("utf-8")
             return response
@@ -123,7 +217,7 @@ class Function_SQS(Function):
         super().__init__(func, pipeline_name)
 
     def template(self):
-        return {"events": [{"sqs": {"arn": self.func.args["arn"]}}]}
+        return {"events": [sqs_event(self.func.args["resource"].arn, self.func.args)]}
 
     def invoke(self, data):
         from handler import pipeline
@@ -151,7 +245,8 @@ class Function_BUCKET_NOTIFICATION(Function):
                 ]
             }
         elif event_type == "sqs":
-            return {"events": [{"sqs": {"arn": self.func.args["destination"].arn}}]}
+            arn = self.func.args["destination"].arn
+            return {"events": [sqs_event(arn, self.func.args)]}
 
     def invoke(self, data, **kwargs):
         from handler import pipeline
@@ -161,12 +256,8 @@ class Function_BUCKET_NOTIFICATION(Function):
             key = kwargs["key"]
         else:
             key = os.path.split(data)[-1]
-        if data.endswith(".tif") or data.endswith(".jpg"):
-            resource.upload_image(key, data)
-        else:
-            with open(data, "r") as f:
-                contents = f.read()
-                resource.upload_file(key, contents)
+        # Streams the file from disk (as a multipart upload when large) so any size or type of file can be uploaded
+        resource.upload_image(key, data)
         response = {"bucket": resource.name, "key": key}
         return response
 
@@ -176,42 +267,111 @@ class FunctionGroup(object):
     """Object representing a group of functions.  Used internally to package lambda functions"""
 
     def __getitem__(self, item):
-        return self.all[item]
+        if item not in self._functions:
+            self._functions[item] = self._loaders.pop(item)()
+        return self._functions[item]
+
+    def __init__(self, functions=None, loaders=None):
+        self._functions = dict(functions or {})
+        self._loaders = dict(loaders or {})
 
-    def __init__(self, functions):
-        self.all = functions
+    @property
+    def all(self):
+        """All functions, loading any which haven't been accessed yet"""
+        for name in list(self._loaders):
+            self[name]
+        return self._functions
 
     def to_dict(self):
         return {k: v.package_function() for (k, v) in self.all.items()}
 
 
-def timeout(time):
-
-    """Decorator to specify the lambda function's timeout"""
+def _configure(**settings):
+    """
+    Decorator which sets attributes read by `Function.package_function`.  The method itself is returned unchanged so
+    configuration adds no overhead to invocations, and the attributes are carried through any event decorator.
+    """
 
     def wrapper(f):
-        @wraps(f)
-        def wrapped_f(self, event, context):
-            return f(self, event, context)
-
-        wrapped_f.timeout = time
-        return wrapped_f
+        for (k, v) in settings.items():
+            setattr(f, k, v)
+        return f
 
     return wrapper
 
 
+def timeout(time):
+
+    """Decorator to specify the lambda function's timeout"""
+
+    return _configure(timeout=time)
+
+
 def memory(mem_mb):
 
     """
     Decorator to specify the lambda function's max memory size
     """
 
-    def wrapper(f):
-        @wraps(f)
-        def wrapped_f(self, event, context):
-            return f(self, event, context)
+    return _configure(memory=mem_mb)
+
+
+def concurrency(reserved=None, provisioned=None):
+
+    """
+    Decorator to specify the lambda function's reserved concurrency (the maximum number of concurrent executions, which
+    are also guaranteed to be available to it) and provisioned concurrency (executions kept initialized to avoid cold
+    starts).
+    """
+
+    if reserved is not None and reserved < 0:
+        raise ValueError("Reserved concurrency must not be negative")
+    if provisioned is not None:
+        if provisioned < 1:
+            raise ValueError("Provisioned concurrency must be at least 1")
+        if reserved is not None and provisioned > reserved:
+            raise ValueError(
+                "Provisioned concurrency must not exceed reserved concurrency"
+            )
+    return _configure(
+        reserved_concurrency=reserved, provisioned_concurrency=provisioned
+    )
+
+
+def architecture(arch):
+
+    """Decorator to specify the lambda function's instruction set architecture (`x86_64` or `arm64`)"""
+
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Architecture must be one of {ARCHITECTURES}")
+    return _configure(architecture=arch)
+
 
-        wrapped_f.memory = mem_mb
-        return wrapped_f
+def ephemeral_storage(size_mb):
+
+    """Decorator to specify the size of the lambda function's /tmp directory in MB"""
+
+    if not EPHEMERAL_STORAGE[0] <= size_mb <= EPHEMERAL_STORAGE[1]:
+        raise ValueError(
+            f"Ephemeral storage must be between {EPHEMERAL_STORAGE[0]} and {EPHEMERAL_STORAGE[1]} MB"
+        )
+    return _configure(ephemeral_storage=size_mb)
+
+
+def cached(ttl=None, maxsize=128, max_bytes=None):
+
+    """
+    Decorator to keep a function's results in memory across warm invocations of the lambda function, keyed by its
+    (hashable) arguments.  Results expire after `ttl` seconds and the least recently used are evicted beyond `maxsize`
+    results or `max_bytes` bytes.  The `caching.Cache` is available as the `cache` attribute of the decorated function
+    (ex. to `invalidate` a result), and its hits and misses are recorded by `metrics`.
+    """
+
+    if maxsize < 1:
+        raise ValueError("maxsize must be at least 1")
+
+    def wrapper(f):
+        cache = Cache(ttl, maxsize, max_bytes, name=f.__qualname__)
+        return memoize(f, cache)
 
     return wrapper
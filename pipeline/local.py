@@ -0,0 +1,865 @@
+import io
+import json
+import time
+import uuid
+import fnmatch
+import hashlib
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from .clients import registry
+from .execution import execution
+from . import resources as res
+
+"""
+In-process runtime which runs a pipeline without deploying it, for offline functional, throughput and latency tests.
+In-memory SNS, SQS, S3, DynamoDB, Lambda and STS clients are registered with `clients.registry` so resources and
+functions work unchanged, and the pipeline's triggers are wired to them:
+
+    - SQS triggered functions poll their queue and are invoked with batches of up to `batch_size` records (waiting up
+      to `batching_window` seconds to fill a batch), with at most `max_concurrency` (or the reserved concurrency)
+      batches in flight.  Failed records are redelivered up to `max_receives` times, then moved to the queue's
+      `dead_letters`
+    - Publishing to a topic invokes each subscribed function with the message, retrying failed invocations twice
+    - Writing an object to a bucket sends its bucket notifications to their topic or queue
+    - Lambda invocations call the handler, on the worker pool for `Event` invocations
+
+Invocations run on a shared pool of `workers` threads.  Per-function statistics (invocations, records, errors and
+latency percentiles) show which stage of a pipeline is the bottleneck.  Only the parts of each service's API used by
+this library are implemented, and messages stay in flight until deleted (there are no visibility timeouts).
+
+    with LocalRuntime(MyPipeline()) as runtime:
+        queue.send_messages(range(10000))
+        runtime.drain()
+        print(runtime.stats())
+"""
+
+logger = logging.getLogger(__name__)
+
+LOCAL_ACCOUNT_ID = "000000000000"
+
+# Records per invocation of SQS triggered functions which don't set a batch size
+DEFAULT_BATCH_SIZE = 10
+
+# Retries of failed asynchronous (SNS and `Event`) invocations, as lambda does
+ASYNC_RETRIES = 2
+
+
+def _error(code, message, operation):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def _name(identifier):
+    """Resource name from a queue URL or topic ARN"""
+    return identifier.rsplit("/", 1)[-1].rsplit(":", 1)[-1]
+
+
+def _etag(data):
+    return '"' + hashlib.md5(data).hexdigest() + '"'
+
+
+class LocalContext(object):
+
+    """Stand-in for the lambda context object"""
+
+    def __init__(self, function_name, timeout=6):
+        self.function_name = function_name
+        self.invoked_function_arn = f"arn:aws:lambda:{execution.region}:{execution.accountid}:function:{function_name}"
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class _Stats(object):
+    def __init__(self):
+        self.invocations = 0
+        self.records = 0
+        self.errors = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record(self, records, latency, error):
+        with self._lock:
+            self.invocations += 1
+            self.records += records
+            self.errors += int(error)
+            self.latencies.append(latency)
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        def percentile(p):
+            return latencies[min(int(p * count), count - 1)] if latencies else 0
+
+        busy = sum(latencies)
+        return {
+            "invocations": self.invocations,
+            "records": self.records,
+            "errors": self.errors,
+            "busy_seconds": busy,
+            "records_per_sec": self.records / elapsed if elapsed else 0,
+            "latency": {
+                "mean": busy / count if latencies else 0,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": latencies[-1] if latencies else 0,
+            },
+        }
+
+
+class LocalQueue(object):
+
+    """In-memory SQS queue"""
+
+    def __init__(self, name):
+        self.name = name
+        self.dead_letters = []
+        self._messages = deque()
+        self._inflight = {}
+        self._condition = threading.Condition()
+
+    def send(self, body, attributes=None):
+        message = {
+            "MessageId": str(uuid.uuid4()),
+            "Body": body,
+            "MessageAttributes": attributes or {},
+            "ReceiveCount": 0,
+            "SentTimestamp": int(time.time() * 1000),
+        }
+        with self._condition:
+            self._messages.append(message)
+            self._condition.notify_all()
+        return message["MessageId"]
+
+    def receive(self, count, wait=0, window=0):
+        """
+        Receive up to `count` messages, waiting up to `wait` seconds for the first one and then up to `window` seconds
+        for the batch to fill
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._messages, timeout=wait)
+            if window and self._messages:
+                self._condition.wait_for(
+                    lambda: len(self._messages) >= count, timeout=window
+                )
+            received = []
+            while self._messages and len(received) < count:
+                message = self._messages.popleft()
+                message["ReceiveCount"] += 1
+                message["ReceiptHandle"] = str(uuid.uuid4())
+                self._inflight[message["ReceiptHandle"]] = message
+                received.append(message)
+            return received
+
+    def delete(self, handle):
+        with self._condition:
+            self._inflight.pop(handle, None)
+            self._condition.notify_all()
+
+    def release(self, handle, max_receives):
+        """Make an in flight message visible again, or move it to `dead_letters` once received `max_receives` times"""
+        with self._condition:
+            message = self._inflight.pop(handle, None)
+            if message is None:
+                return
+            if message["ReceiveCount"] >= max_receives:
+                self.dead_letters.append(message)
+            else:
+                self._messages.append(message)
+            self._condition.notify_all()
+
+    def idle(self):
+        return not self._messages and not self._inflight
+
+    def wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
+class LocalSQS(object):
+
+    """In-memory SQS client"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def _queue(self, url, operation):
+        try:
+            return self.runtime.queues[_name(url)]
+        except KeyError:
+            raise _error("AWS.SimpleQueueService.NonExistentQueue", url, operation)
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes=None, **kwargs):
+        queue = self._queue(QueueUrl, "SendMessage")
+        return {"MessageId": queue.send(MessageBody, MessageAttributes)}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        queue = self._queue(QueueUrl, "SendMessageBatch")
+        successful = []
+        for entry in Entries:
+            message_id = queue.send(
+                entry["MessageBody"], entry.get("MessageAttributes")
+            )
+            successful.append({"Id": entry["Id"], "MessageId": message_id})
+        return {"Successful": successful, "Failed": []}
+
+    def receive_message(
+        self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs
+    ):
+        queue = self._queue(QueueUrl, "ReceiveMessage")
+        messages = queue.receive(MaxNumberOfMessages, wait=WaitTimeSeconds)
+        return {
+            "Messages": [
+                {
+                    "MessageId": message["MessageId"],
+                    "ReceiptHandle": message["ReceiptHandle"],
+                    "Body": message["Body"],
+                    "MessageAttributes": message["MessageAttributes"],
+                }
+                for message in messages
+            ]
+        }
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._queue(QueueUrl, "DeleteMessage").delete(ReceiptHandle)
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        queue = self._queue(QueueUrl, "DeleteMessageBatch")
+        for entry in Entries:
+            queue.delete(entry["ReceiptHandle"])
+        return {"Successful": [{"Id": x["Id"]} for x in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self._queue(QueueUrl, "ChangeMessageVisibilityBatch")
+        return {"Successful": [{"Id": x["Id"]} for x in Entries], "Failed": []}
+
+
+class LocalSNS(object):
+
+    """In-memory SNS client which delivers messages to the functions subscribed to a topic"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def publish(self, TopicArn, Message, MessageAttributes=None, **kwargs):
+        return {
+            "MessageId": self.runtime.publish(
+                _name(TopicArn), Message, MessageAttributes
+            )
+        }
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        successful = []
+        for entry in PublishBatchRequestEntries:
+            message_id = self.runtime.publish(
+                _name(TopicArn), entry["Message"], entry.get("MessageAttributes")
+            )
+            successful.append({"Id": entry["Id"], "MessageId": message_id})
+        return {"Successful": successful, "Failed": []}
+
+
+class _Body(io.BytesIO):
+
+    """Streaming body of a GetObject response"""
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+
+class LocalS3(object):
+
+    """In-memory S3 client.  Objects written to a bucket trigger its bucket notifications"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self._uploads = {}
+
+    def _bucket(self, bucket, operation):
+        try:
+            return self.runtime.buckets[bucket]
+        except KeyError:
+            raise _error("NoSuchBucket", bucket, operation)
+
+    def _object(self, bucket, key, operation):
+        try:
+            return self._bucket(bucket, operation)[key]
+        except KeyError:
+            raise _error("NoSuchKey", key, operation)
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        self._bucket(Bucket, "PutObject")
+        return {"ETag": self.runtime.put_object(Bucket, Key, bytes(Body))}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        (data, etag) = self._object(Bucket, Key, "HeadObject")
+        return {"ContentLength": len(data), "ETag": etag}
+
+    def get_object(
+        self, Bucket, Key, Range=None, IfMatch=None, IfNoneMatch=None, **kwargs
+    ):
+        (data, etag) = self._object(Bucket, Key, "GetObject")
+        if IfMatch is not None and IfMatch != etag:
+            raise _error("PreconditionFailed", Key, "GetObject")
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise _error("304", "Not Modified", "GetObject")
+        if Range:
+            (start, end) = Range[len("bytes=") :].split("-")
+            data = data[int(start) : int(end) + 1 if end else None]
+        return {"Body": _Body(data), "ContentLength": len(data), "ETag": etag}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._bucket(Bucket, "DeleteObject").pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        objects = self._bucket(Bucket, "DeleteObjects")
+        for entry in Delete["Objects"]:
+            objects.pop(entry["Key"], None)
+        return {"Deleted": [{"Key": x["Key"]} for x in Delete["Objects"]]}
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        with open(Filename, "rb") as stream:
+            self.put_object(Bucket=Bucket, Key=Key, Body=stream)
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        (data, etag) = self._object(Bucket, Key, "GetObject")
+        with open(Filename, "wb") as stream:
+            stream.write(data)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._bucket(Bucket, "CreateMultipartUpload")
+        upload_id = str(uuid.uuid4())
+        self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": _etag(bytes(Body))}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self._uploads.pop(UploadId)
+        numbers = [x["PartNumber"] for x in MultipartUpload["Parts"]]
+        data = b"".join(parts[number] for number in numbers)
+        return {"ETag": self.runtime.put_object(Bucket, Key, data)}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._uploads.pop(UploadId, None)
+        return {}
+
+
+class LocalS3Resource(object):
+
+    """In-memory S3 service resource, backed by a `LocalS3` client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def Object(self, bucket, key):
+        return _S3Object(self.client, bucket, key)
+
+    def Bucket(self, name):
+        return _S3Bucket(self.client, name)
+
+
+class _S3Object(object):
+    def __init__(self, client, bucket, key):
+        self.client = client
+        self.bucket_name = bucket
+        self.key = key
+
+    def put(self, Body=b"", **kwargs):
+        return self.client.put_object(Bucket=self.bucket_name, Key=self.key, Body=Body)
+
+    def get(self, **kwargs):
+        return self.client.get_object(Bucket=self.bucket_name, Key=self.key, **kwargs)
+
+
+class _S3Bucket(object):
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upload_file(self, Filename, Key, **kwargs):
+        self.client.upload_file(Filename, self.name, Key)
+
+    def download_file(self, Key, Filename, **kwargs):
+        self.client.download_file(self.name, Key, Filename)
+
+
+class LocalTable(object):
+
+    """In-memory DynamoDB table supporting key lookups, scans and queries (with boto3 conditions)"""
+
+    def __init__(self, name, keys, indexes=None):
+        self.name = name
+        self.keys = keys
+        self.indexes = indexes or {}
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _id(self, key):
+        try:
+            return tuple(key[k] for k in self.keys)
+        except KeyError as e:
+            raise _error("ValidationException", f"Missing key {e}", "GetItem")
+
+    def put_item(self, Item, **kwargs):
+        with self._lock:
+            self._items[self._id(Item)] = dict(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        item = self._items.get(self._id(Key))
+        return {"Item": _project(item, kwargs)} if item is not None else {}
+
+    def delete_item(self, Key, **kwargs):
+        with self._lock:
+            self._items.pop(self._id(Key), None)
+        return {}
+
+    def scan(self, Segment=None, TotalSegments=None, **kwargs):
+        with self._lock:
+            items = list(self._items.values())
+        if TotalSegments:
+            items = [x for x in items if hash(self._id(x)) % TotalSegments == Segment]
+        return self._page(items, kwargs)
+
+    def query(
+        self, KeyConditionExpression, IndexName=None, ScanIndexForward=True, **kwargs
+    ):
+        keys = self.indexes[IndexName] if IndexName else self.keys
+        with self._lock:
+            items = [
+                x
+                for x in self._items.values()
+                if all(k in x for k in keys) and _matches(KeyConditionExpression, x)
+            ]
+        if len(keys) > 1:
+            items.sort(key=lambda x: x[keys[1]], reverse=not ScanIndexForward)
+        return self._page(items, kwargs)
+
+    def _page(self, items, kwargs):
+        """Page of items after `ExclusiveStartKey` holding up to `Limit` items, filtered and projected"""
+        start = kwargs.get("ExclusiveStartKey")
+        if start is not None:
+            ids = [self._id(x) for x in items]
+            items = items[ids.index(self._id(start)) + 1 :]
+        limit = kwargs.get("Limit")
+        page = items[:limit] if limit else items
+        response = {}
+        if limit and len(items) > limit:
+            response["LastEvaluatedKey"] = {k: page[-1][k] for k in self.keys}
+        if kwargs.get("FilterExpression") is not None:
+            page = [x for x in page if _matches(kwargs["FilterExpression"], x)]
+        response["Items"] = [_project(x, kwargs) for x in page]
+        response["Count"] = len(page)
+        return response
+
+
+class LocalDynamoDB(object):
+
+    """In-memory DynamoDB service resource"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def Table(self, name):
+        try:
+            return self.runtime.tables[name]
+        except KeyError:
+            raise _error("ResourceNotFoundException", name, "DescribeTable")
+
+    def batch_write_item(self, RequestItems):
+        for (name, requests) in RequestItems.items():
+            table = self.Table(name)
+            for request in requests:
+                if "PutRequest" in request:
+                    table.put_item(Item=request["PutRequest"]["Item"])
+                else:
+                    table.delete_item(Key=request["DeleteRequest"]["Key"])
+        return {"UnprocessedItems": {}}
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for (name, request) in RequestItems.items():
+            table = self.Table(name)
+            options = {k: v for (k, v) in request.items() if k != "Keys"}
+            responses[name] = []
+            for key in request["Keys"]:
+                response = table.get_item(Key=key, **options)
+                if "Item" in response:
+                    responses[name].append(response["Item"])
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+def _project(item, kwargs):
+    if item is None or not kwargs.get("ProjectionExpression"):
+        return dict(item) if item is not None else None
+    names = kwargs.get("ExpressionAttributeNames", {})
+    attributes = [
+        names.get(x.strip(), x.strip())
+        for x in kwargs["ProjectionExpression"].split(",")
+    ]
+    return {k: item[k] for k in attributes if k in item}
+
+
+def _matches(condition, item):
+    """Evaluate a boto3 condition (`Key`/`Attr` based) against an item"""
+    from boto3.dynamodb.conditions import AttributeBase
+
+    expression = condition.get_expression()
+    operator = expression["operator"]
+    values = expression["values"]
+    if operator == "AND":
+        return all(_matches(x, item) for x in values)
+    if operator == "OR":
+        return any(_matches(x, item) for x in values)
+    if operator == "NOT":
+        return not _matches(values[0], item)
+    if operator == "attribute_exists":
+        return values[0].name in item
+    if operator == "attribute_not_exists":
+        return values[0].name not in item
+    if values[0].name not in item:
+        return False
+    operands = [item[x.name] if isinstance(x, AttributeBase) else x for x in values]
+    (value, others) = (operands[0], operands[1:])
+    if operator == "=":
+        return value == others[0]
+    if operator == "<>":
+        return value != others[0]
+    if operator == "<":
+        return value < others[0]
+    if operator == "<=":
+        return value <= others[0]
+    if operator == ">":
+        return value > others[0]
+    if operator == ">=":
+        return value >= others[0]
+    if operator == "BETWEEN":
+        return others[0] <= value <= others[1]
+    if operator == "IN":
+        return value in others[0]
+    if operator == "begins_with":
+        return value.startswith(others[0])
+    if operator == "contains":
+        return others[0] in value
+    raise NotImplementedError(f"Unsupported condition operator: {operator}")
+
+
+class LocalLambda(object):
+
+    """In-memory lambda client which invokes the pipeline's handlers"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def invoke(self, FunctionName, InvocationType="RequestResponse", Payload=b"{}"):
+        name = FunctionName.rsplit("-", 1)[-1]
+        if name not in self.runtime.handlers:
+            raise _error("ResourceNotFoundException", FunctionName, "Invoke")
+        event = json.loads(Payload or "{}")
+        if InvocationType == "Event":
+            self.runtime.submit(name, event, retries=ASYNC_RETRIES)
+            return {"StatusCode": 202, "Payload": _Body(b"")}
+        try:
+            result = self.runtime.invoke(name, event)
+        except Exception as e:
+            error = {"errorMessage": str(e), "errorType": e.__class__.__name__}
+            return {
+                "StatusCode": 200,
+                "FunctionError": "Unhandled",
+                "Payload": _Body(json.dumps(error).encode("utf-8")),
+            }
+        return {"StatusCode": 200, "Payload": _Body(json.dumps(result).encode("utf-8"))}
+
+
+class LocalSTS(object):
+    def get_caller_identity(self):
+        return {"Account": LOCAL_ACCOUNT_ID}
+
+
+class LocalRuntime(object):
+
+    """Object which runs a pipeline's functions against in-memory services"""
+
+    def __init__(self, pipeline, workers=8, max_receives=3):
+        self.pipeline = pipeline
+        self.workers = workers
+        self.max_receives = max_receives
+        self.queues = {}
+        self.buckets = {}
+        self.tables = {}
+        self.handlers = {}
+        self.errors = []
+        self._subscriptions = defaultdict(list)
+        self._notifications = defaultdict(list)
+        self._sources = []
+        self._pollers = []
+        self._stats = defaultdict(_Stats)
+        self._executor = None
+        self._stop = threading.Event()
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._started = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Register the in-memory clients, create the pipeline's resources and start polling its queues"""
+        s3 = LocalS3(self)
+        registry.register_client("sqs", LocalSQS(self))
+        registry.register_client("sns", LocalSNS(self))
+        registry.register_client("s3", s3)
+        registry.register_client("lambda", LocalLambda(self))
+        registry.register_client("sts", LocalSTS())
+        registry.register_resource("s3", LocalS3Resource(s3))
+        registry.register_resource("dynamodb", LocalDynamoDB(self))
+
+        resources = self.pipeline.resources.all if self.pipeline.resources else {}
+        for resource in resources.values():
+            if isinstance(resource, res.SQSQueue):
+                self.queues[resource.name] = LocalQueue(resource.name)
+            elif isinstance(resource, res.S3Bucket):
+                self.buckets[resource.name.lower()] = {}
+            elif isinstance(resource, res.DynamoDB):
+                self.tables[resource.name] = self._table(resource)
+
+        for (name, function) in self.pipeline.functions.all.items():
+            self.handlers[name] = getattr(self.pipeline, name)
+            args = function.func.args
+            if function.trigger == "sns":
+                self._subscriptions[args["topic_name"]].append(name)
+            elif function.trigger == "sqs":
+                self._sources.append((name, args["queue_name"]))
+            elif function.trigger == "bucket_notification":
+                destination = args["destination"]
+                notification = (args["event"], args["prefix"] or "", destination)
+                notifications = self._notifications[args["bucket"].name.lower()]
+                if notification not in notifications:
+                    notifications.append(notification)
+                if destination.resource == "sns":
+                    self._subscriptions[destination.name].append(name)
+                else:
+                    self._sources.append((name, destination.name))
+
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        for (name, queue) in self._sources:
+            poller = threading.Thread(
+                target=self._poll, args=(name, self.queues[queue]), daemon=True
+            )
+            poller.start()
+            self._pollers.append(poller)
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self):
+        """Stop polling, wait for in flight invocations and unregister the in-memory clients"""
+        self._stop.set()
+        for queue in self.queues.values():
+            queue.wake()
+        for poller in self._pollers:
+            poller.join()
+        self._pollers = []
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        registry.reset()
+
+    def drain(self, timeout=None):
+        """Block until every queue polled by a function is empty and no invocations are in flight"""
+        queues = [self.queues[queue] for (name, queue) in self._sources]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._condition:
+                if not self._pending and all(x.idle() for x in queues):
+                    return
+                self._condition.wait(timeout=0.01)
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("Pipeline did not drain in time")
+
+    def stats(self):
+        """Invocation, record, error and latency statistics of each function invoked so far"""
+        elapsed = time.perf_counter() - self._started if self._started else 0
+        return {name: stats.summary(elapsed) for (name, stats) in self._stats.items()}
+
+    def invoke(self, name, event, records=1):
+        """Invoke a function's handler with an event, returning its output"""
+        function = self.pipeline.functions[name]
+        context = LocalContext(
+            f"{self.pipeline.name}-{execution.stage}-{name}",
+            getattr(function.func, "timeout", 6),
+        )
+        start = time.perf_counter()
+        error = True
+        try:
+            result = self.handlers[name](event, context)
+            error = False
+            return result
+        finally:
+            self._stats[name].record(records, time.perf_counter() - start, error)
+
+    def submit(self, name, event, records=1, retries=0, callback=None):
+        """
+        Invoke a function on the worker pool.  `callback` is called with the output, or the exception once `retries`
+        are exhausted.
+        """
+        with self._condition:
+            self._pending += 1
+        self._executor.submit(self._run, name, event, records, retries, callback)
+
+    def publish(self, topic, message, attributes=None):
+        """Deliver a message to each of the functions subscribed to a topic, returning its message id"""
+        message_id = str(uuid.uuid4())
+        record = {
+            "EventSource": "aws:sns",
+            "EventVersion": "1.0",
+            "Sns": {
+                "Type": "Notification",
+                "MessageId": message_id,
+                "TopicArn": f"arn:aws:sns:{execution.region}:{execution.accountid}:{topic}",
+                "Message": message,
+                "MessageAttributes": {
+                    k: {"Type": v["DataType"], "Value": v.get("StringValue")}
+                    for (k, v) in (attributes or {}).items()
+                },
+            },
+        }
+        for name in self._subscriptions[topic]:
+            self.submit(name, {"Records": [record]}, retries=ASYNC_RETRIES)
+        return message_id
+
+    def put_object(self, bucket, key, data):
+        """Store an object and send the bucket's notifications, returning its ETag"""
+        etag = _etag(data)
+        self.buckets[bucket][key] = (data, etag)
+        for (event, prefix, destination) in self._notifications[bucket]:
+            if not fnmatch.fnmatchcase("s3:ObjectCreated:Put", event):
+                continue
+            if not key.startswith(prefix):
+                continue
+            notification = {
+                "eventSource": "aws:s3",
+                "eventName": "ObjectCreated:Put",
+                "s3": {
+                    "bucket": {"name": bucket, "arn": f"arn:aws:s3:::{bucket}"},
+                    "object": {"key": key, "size": len(data), "eTag": etag[1:-1]},
+                },
+            }
+            body = json.dumps({"Records": [notification]})
+            if destination.resource == "sns":
+                self.publish(destination.name, body)
+            else:
+                self.queues[destination.name].send(body)
+        return etag
+
+    def _run(self, name, event, records, retries, callback):
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    result = self.invoke(name, event, records)
+                except Exception as e:
+                    if attempt < retries:
+                        continue
+                    logger.error("Function %s failed", name, exc_info=True)
+                    self.errors.append((name, e))
+                    result = e
+                break
+            if callback:
+                callback(result)
+        except Exception:
+            logger.exception("Failed to complete invocation of %s", name)
+        finally:
+            with self._condition:
+                self._pending -= 1
+                self._condition.notify_all()
+
+    def _poll(self, name, queue):
+        """Receive batches from a queue and invoke a function with them, like a SQS event source mapping"""
+        function = self.pipeline.functions[name]
+        args = function.func.args
+        batch_size = args.get("batch_size") or DEFAULT_BATCH_SIZE
+        window = args.get("batching_window") or 0
+        concurrency = (
+            args.get("max_concurrency")
+            or getattr(function.func, "reserved_concurrency", None)
+            or self.workers
+        )
+        slots = threading.BoundedSemaphore(concurrency)
+        while not self._stop.is_set():
+            if not slots.acquire(timeout=0.1):
+                continue
+            messages = queue.receive(batch_size, wait=0.1, window=window)
+            if not messages:
+                slots.release()
+                continue
+            event = {"Records": [self._sqs_record(queue, x) for x in messages]}
+
+            def complete(result, messages=messages):
+                self._complete(queue, messages, result)
+                slots.release()
+
+            self.submit(name, event, len(messages), callback=complete)
+
+    def _complete(self, queue, messages, result):
+        """Delete the handled messages of a batch and release the failed ones to be received again"""
+        if isinstance(result, Exception):
+            failed = {x["MessageId"] for x in messages}
+        elif isinstance(result, dict) and "batchItemFailures" in result:
+            failed = {x["itemIdentifier"] for x in result["batchItemFailures"]}
+        else:
+            failed = set()
+        for message in messages:
+            if message["MessageId"] in failed:
+                queue.release(message["ReceiptHandle"], self.max_receives)
+            else:
+                queue.delete(message["ReceiptHandle"])
+
+    @staticmethod
+    def _sqs_record(queue, message):
+        return {
+            "messageId": message["MessageId"],
+            "receiptHandle": message["ReceiptHandle"],
+            "body": message["Body"],
+            "attributes": {
+                "ApproximateReceiveCount": str(message["ReceiveCount"]),
+                "SentTimestamp": str(message["SentTimestamp"]),
+            },
+            "messageAttributes": {
+                k: {"dataType": v["DataType"], "stringValue": v.get("StringValue")}
+                for (k, v) in message["MessageAttributes"].items()
+            },
+            "eventSource": "aws:sqs",
+            "eventSourceARN": f"arn:aws:sqs:{execution.region}:{execution.accountid}:{queue.name}",
+            "awsRegion": execution.region,
+        }
+
+    @staticmethod
+    def _table(resource):
+        keys = [x["AttributeName"] for x in resource["Properties"]["KeySchema"]]
+        indexes = {
+            index["IndexName"]: [x["AttributeName"] for x in index["KeySchema"]]
+            for index in resource.global_indexes + resource.local_indexes
+        }
+        return LocalTable(resource.name, keys, indexes)
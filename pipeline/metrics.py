@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import inspect
+import logging
+import threading
+import contextvars
+from collections import defaultdict
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+"""
+Per-invocation instrumentation of the hot path.  Each handler invocation records its duration, whether it was a cold
+start (with the time since the library was loaded), the number of records, the time spent decoding records and in the
+handler, the time of every resource call (ex. `S3Bucket.read_file`), counts such as cache hits and the peak memory of
+the process.
+
+Nothing is recorded unless a hook is registered with `add_hook`, in which case each hook is called with the completed
+`Invocation`.  Setting the `PIPELINE_METRICS` environment variable registers the `emf` hook, which prints each
+invocation as a CloudWatch Embedded Metric Format line on stdout, turned into metrics by CloudWatch Logs without any
+extra API calls.  When no hook is registered the instrumentation costs a check per invocation and per resource call.
+"""
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENV = "PIPELINE_METRICS"
+NAMESPACE = os.environ.get("PIPELINE_METRICS_NAMESPACE", "Pipeline")
+
+# Maximum number of values of one metric in an EMF line
+EMF_MAX_VALUES = 100
+
+_hooks = []
+_current = contextvars.ContextVar("invocation", default=None)
+_loaded = time.perf_counter()
+_cold = True
+
+
+class Invocation(object):
+
+    """Timings and counts recorded during one handler invocation"""
+
+    def __init__(self, pipeline, function, context=None):
+        global _cold
+        self.pipeline = pipeline
+        self.function = function
+        self.request_id = getattr(context, "aws_request_id", None)
+        self.cold_start = _cold
+        self.init_duration = time.perf_counter() - _loaded if _cold else None
+        _cold = False
+        self.records = 0
+        self.error = False
+        self.duration = None
+        self.max_memory = None
+        # Name (ex. "Handler" or "S3Bucket.read_file") mapped to the duration of each call in seconds
+        self.timings = defaultdict(list)
+        # Name (ex. "load_reference.CacheHits") mapped to a count of events
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._token = None
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.timings[name].append(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def timed(self, name, func):
+        """Wrap a function (or coroutine function) so the duration of each call is recorded under `name`"""
+        if inspect.iscoroutinefunction(inspect.unwrap(func)):
+
+            @wraps(func)
+            async def timed_coroutine(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+
+            return timed_coroutine
+
+        @wraps(func)
+        def timed_func(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+
+        return timed_func
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+        self.records = self.records or 1
+        if resource is not None:
+            # Kilobytes on Linux, bytes on macOS
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.max_memory = (
+                usage / 1024 if sys.platform != "darwin" else usage / 2 ** 20
+            )
+
+    def to_emf(self, namespace=None):
+        """Embedded Metric Format document of the invocation, with `Pipeline` and `Function` dimensions"""
+        document = {
+            "Pipeline": self.pipeline,
+            "Function": self.function,
+            "Duration": self.duration * 1000,
+            "Records": self.records,
+            "Errors": int(self.error),
+            "ColdStart": int(self.cold_start),
+        }
+        units = {
+            "Duration": "Milliseconds",
+            "Records": "Count",
+            "Errors": "Count",
+            "ColdStart": "Count",
+        }
+        if self.init_duration is not None:
+            document["InitDuration"] = self.init_duration * 1000
+            units["InitDuration"] = "Milliseconds"
+        if self.max_memory is not None:
+            document["MaxMemory"] = self.max_memory
+            units["MaxMemory"] = "Megabytes"
+        for (name, values) in self.timings.items():
+            document[name] = [x * 1000 for x in values[:EMF_MAX_VALUES]]
+            units[name] = "Milliseconds"
+        for (name, value) in self.counts.items():
+            document[name] = value
+            units[name] = "Count"
+        if self.request_id:
+            document["RequestId"] = self.request_id
+        document["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": namespace or NAMESPACE,
+                    "Dimensions": [["Pipeline", "Function"]],
+                    "Metrics": [{"Name": k, "Unit": v} for (k, v) in units.items()],
+                }
+            ],
+        }
+        return document
+
+
+def add_hook(hook):
+    """Call `hook` with every completed `Invocation`"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def emf(invocation):
+    """Hook which prints the invocation as an Embedded Metric Format line on stdout"""
+    sys.stdout.write(json.dumps(invocation.to_emf()) + "\n")
+
+
+def current():
+    """Invocation being recorded in the current context, or `None`"""
+    return _current.get()
+
+
+def start(pipeline, function, context=None):
+    """Start recording an invocation, returning `None` if no hooks are registered"""
+    if not _hooks:
+        return None
+    invocation = Invocation(pipeline, function, context)
+    invocation._token = _current.set(invocation)
+    return invocation
+
+
+def finish(invocation):
+    """Stop recording an invocation and pass it to the hooks"""
+    _current.reset(invocation._token)
+    invocation.finish()
+    for hook in list(_hooks):
+        try:
+            hook(invocation)
+        except Exception:
+            logger.exception("Metrics hook %s failed", hook)
+
+
+def timed(func):
+    """Decorator recording the duration of each call of a resource method made during an invocation"""
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        invocation = _current.get()
+        if invocation is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            invocation.add(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def count(name, n=1):
+    """Add `n` to the count `name` of the current invocation, if one is being recorded"""
+    invocation = _current.get()
+    if invocation is not None:
+        invocation.count(name, n)
+
+
+if os.environ.get(METRICS_ENV):
+    add_hook(emf)
@@ -5,7 +5,7 @@ class Outputs(dict):
     @classmethod
     def load(cls, fname):
         with open(fname, "r") as stream:
-            contents = yaml.load(stream)
+            contents = yaml.safe_load(stream)
             return cls(contents)
 
     def __init__(self, contents):
@@ -1,14 +1,108 @@
-import boto3
-import json
+import io
+import functools
 import time
-
+import random
+import shutil
+import itertools
+import queue
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics, serialization
+from .batching import chunk, dispatch
+from .caching import DISK_CACHE_BYTES, DiskCache
+from .claims import ClaimCheck
+from .clients import registry
+from .consumer import Consumer
 from .execution import execution
+from .streams import MB, S3Reader, S3TextWriter, S3Writer
+
+SQS_MAX_BATCH = 10
+SQS_MAX_BYTES = 262144
+SNS_MAX_BATCH = 10
+SNS_MAX_BYTES = 262144
+DYNAMODB_MAX_WRITE = 25
+DYNAMODB_MAX_READ = 100
+# Threads used to run the blocking boto3 calls behind the `*_async` methods
+ASYNC_IO_THREADS = 64
+
+
+_MISSING = object()
+
+
+class UnprocessedItemsError(Exception):
+
+    """Raised when a DynamoDB batch request still has unprocessed items after exhausting its retries"""
 
-s3_res = boto3.resource("s3")
-sqs_client = boto3.client("sqs")
-sqs_resource = boto3.resource("sqs")
-sns_client = boto3.client("sns")
-dynamodb = boto3.resource("dynamodb")
+    def __init__(self, table, unprocessed):
+        super().__init__(f"Unprocessed items remain for table {table}")
+        self.unprocessed = unprocessed
+
+
+def message_size(entry, body="MessageBody"):
+    """Approximate size in bytes of a batch entry's body and message attributes, as counted by SQS and SNS"""
+    size = len(entry[body].encode("utf-8"))
+    for (name, attribute) in entry.get("MessageAttributes", {}).items():
+        size += len(name) + len(attribute["DataType"])
+        value = attribute.get("StringValue", attribute.get("BinaryValue", ""))
+        size += len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+    return size
+
+
+def _sns_message_size(entry):
+    return message_size(entry, body="Message")
+
+
+def _check_sizes(entries, size, max_bytes, resource):
+    """Raise `ValueError` if a batch entry is larger than `max_bytes`, so nothing is sent when one can't be"""
+    for entry in entries:
+        entry_size = size(entry)
+        if entry_size > max_bytes:
+            raise ValueError(
+                f"Message {entry['Id']} is {entry_size} bytes, more than the {max_bytes} bytes allowed "
+                f"(see {resource}.enable_offload)"
+            )
+
+
+def message_attributes(attributes):
+    """Convert a dictionary of attribute names and values to the SQS/SNS `MessageAttributes` structure"""
+    formatted = {}
+    for (name, value) in attributes.items():
+        if isinstance(value, bytes):
+            formatted[name] = {"DataType": "Binary", "BinaryValue": value}
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            formatted[name] = {"DataType": "Number", "StringValue": str(value)}
+        else:
+            formatted[name] = {"DataType": "String", "StringValue": str(value)}
+    return formatted
+
+
+def _not_modified(error):
+    """Whether an error raised by boto3 is the 304 response to a conditional GET"""
+    response = getattr(error, "response", {})
+    return (
+        response.get("Error", {}).get("Code") in ("304", "NotModified")
+        or response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304
+    )
+
+
+async def _threaded(func, *args, **kwargs):
+    """Await a blocking boto3 call run on a shared thread pool, leaving the event loop free for other requests"""
+    import asyncio
+
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=ASYNC_IO_THREADS)
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the context so the call is recorded with the current invocation (see `metrics`)
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _io_executor, functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+_io_executor = None
 
 
 class ServerlessResource(dict):
@@ -34,6 +128,9 @@ class SNSTopic(ServerlessResource):
         super().__init__()
         self["Type"] = "AWS::SNS::Topic"
         self["Properties"] = {"TopicName": self.name}
+        self.claim_check = None
+        # Messages are published as given (strings) unless a codec is set
+        self.codec = None
 
     @property
     def arn(self):
@@ -46,10 +143,89 @@ class SNSTopic(ServerlessResource):
         policy.update({"DependsOn": [self.name]})
         return policy
 
+    def enable_offload(self, bucket, threshold=SNS_MAX_BYTES, prefix="claim-checks/"):
+        """
+        Offload messages larger than `threshold` bytes to objects under `prefix` in `bucket` (a `S3Bucket`), publishing
+        claim checks pointing to them instead (see `claims`).  `events.sns` triggers fetch the payloads transparently.
+        The pipeline's role is granted access to the bucket even if it isn't one of the pipeline's resources.
+        """
+        self.claim_check = ClaimCheck(bucket, threshold, prefix)
+        return self
+
+    def set_codec(self, codec):
+        """
+        Encode messages with a `serialization.Codec` (or the content type of one, ex. `application/msgpack+zlib`), which
+        `events.sns` triggers decode.  Without a codec messages must be strings and are passed to handlers as is.
+        """
+        self.codec = serialization.get(codec)
+        return self
+
+    @metrics.timed
     def send_message(self, message):
-        resp = sns_client.publish(TopicArn=self.arn, Message=message)
+        entry = {"Message": message}
+        if self.codec is not None:
+            entry = self._encode(entry)
+        if self.claim_check is not None:
+            entry = self.claim_check.check(entry, _sns_message_size, body="Message")
+        resp = registry.client("sns").publish(TopicArn=self.arn, **entry)
         return resp
 
+    async def send_message_async(self, message):
+        return await _threaded(self.send_message, message)
+
+    @metrics.timed
+    def publish_many(self, messages, attributes=None, workers=4, retries=3):
+        """
+        Publish many messages with PublishBatch.  Messages are packed into batches of up to 10 entries and 256 KB which
+        are published concurrently on a pool of `workers` threads, retrying only the entries which failed.  `attributes`
+        is either a dictionary of message attributes applied to every message or an iterable with one dictionary (or
+        `None`) per message.  Returns a list of per-message results in input order.  Raises `ValueError` before
+        publishing anything if a message is larger than SNS allows (offloading large messages to S3 with
+        `enable_offload` avoids this).
+        """
+        per_message = not (isinstance(attributes, dict) or attributes is None)
+        attributes = iter(attributes) if per_message else itertools.repeat(attributes)
+        entries = []
+        for (idx, message) in enumerate(messages):
+            attrs = next(attributes, _MISSING)
+            if attrs is _MISSING:
+                raise ValueError(f"Fewer attributes than messages ({idx})")
+            entry = {"Id": str(idx), "Message": message}
+            if attrs:
+                entry["MessageAttributes"] = message_attributes(attrs)
+            if self.codec is not None:
+                entry = self._encode(entry)
+            entries.append(entry)
+        if per_message and next(attributes, _MISSING) is not _MISSING:
+            raise ValueError(f"More attributes than messages ({len(entries)})")
+        if self.claim_check is not None:
+            entries = self.claim_check.check_many(
+                entries, _sns_message_size, body="Message", workers=workers
+            )
+        _check_sizes(entries, _sns_message_size, SNS_MAX_BYTES, "SNSTopic")
+        client = registry.client("sns")
+        results = dispatch(
+            lambda batch: client.publish_batch(
+                TopicArn=self.arn, PublishBatchRequestEntries=batch
+            ),
+            entries,
+            max_count=SNS_MAX_BATCH,
+            max_bytes=SNS_MAX_BYTES,
+            size=_sns_message_size,
+            workers=workers,
+            retries=retries,
+        )
+        return [results[entry["Id"]] for entry in entries]
+
+    def _encode(self, entry):
+        entry["Message"] = self.codec.encode_text(entry["Message"])
+        # Always named, even for plain JSON, as triggers pass messages without a content type as strings
+        attributes = {serialization.CONTENT_TYPE_ATTRIBUTE: self.codec.content_type}
+        entry["MessageAttributes"] = dict(
+            entry.get("MessageAttributes", {}), **message_attributes(attributes)
+        )
+        return entry
+
 
 class SNSPolicy(ServerlessResource):
 
@@ -85,6 +261,8 @@ class SQSQueue(ServerlessResource):
 
         self.arn_pattern = "arn:aws:sqs:${region}:${accountid}:${name}"
         self.__url = None
+        self.claim_check = None
+        self.codec = serialization.JSON
 
     @property
     def arn(self):
@@ -94,21 +272,85 @@ class SQSQueue(ServerlessResource):
     def url(self):
         return f"https://sqs-{execution.region}.amazonaws.com/{execution.accountid}/{self.name}"
 
+    def enable_offload(self, bucket, threshold=SQS_MAX_BYTES, prefix="claim-checks/"):
+        """
+        Offload messages larger than `threshold` bytes to objects under `prefix` in `bucket` (a `S3Bucket`), sending
+        claim checks pointing to them instead (see `claims`).  `events.sqs` triggers fetch the payloads transparently.
+        The pipeline's role is granted access to the bucket even if it isn't one of the pipeline's resources.
+        """
+        self.claim_check = ClaimCheck(bucket, threshold, prefix)
+        return self
+
+    def set_codec(self, codec):
+        """
+        Encode messages with a `serialization.Codec` (or the content type of one, ex. `application/msgpack+zlib`)
+        rather than JSON.  `events.sqs` triggers decode them with the codec named by their `pipeline.ContentType`
+        attribute.
+        """
+        self.codec = serialization.get(codec)
+        return self
+
+    @metrics.timed
     def send_message(self, message, id=None):
+        entry = {"MessageBody": self.codec.encode_text(message)}
+        attributes = dict(self.codec.attributes())
         if id:
-            resp = sqs_client.send_message(
-                QueueUrl=self.url,
-                MessageBody=json.dumps(message),
-                MessageAttributes={"id": {"DataType": "String", "StringValue": id}},
-            )
-        else:
-            resp = sqs_client.send_message(
-                QueueUrl=self.url, MessageBody=json.dumps(message)
-            )
+            attributes["id"] = id
+        if attributes:
+            entry["MessageAttributes"] = message_attributes(attributes)
+        if self.claim_check is not None:
+            entry = self.claim_check.check(entry, message_size)
+        resp = registry.client("sqs").send_message(QueueUrl=self.url, **entry)
         return resp
 
+    async def send_message_async(self, message, id=None):
+        return await _threaded(self.send_message, message, id=id)
+
+    @metrics.timed
+    def send_messages(self, messages, ids=None, workers=4, retries=3):
+        """
+        Send many messages with SendMessageBatch.  Messages are packed into batches of up to 10 entries and 256 KB which
+        are sent concurrently on a pool of `workers` threads, retrying only the entries which failed.  Returns a list of
+        per-message results in input order, each containing either a `MessageId` or an error `Code`.  `ids` must have
+        one id (or `None`) per message.  Raises `ValueError` before sending anything if a message is larger than SQS
+        allows (offloading large messages to S3 with `enable_offload` avoids this).
+        """
+        ids = iter(ids) if ids is not None else None
+        entries = []
+        encoding = message_attributes(self.codec.attributes())
+        for (idx, message) in enumerate(messages):
+            entry = {"Id": str(idx), "MessageBody": self.codec.encode_text(message)}
+            id = next(ids, _MISSING) if ids is not None else None
+            if id is _MISSING:
+                raise ValueError(f"Fewer ids than messages ({idx})")
+            if id:
+                entry["MessageAttributes"] = dict(
+                    encoding, id={"DataType": "String", "StringValue": id}
+                )
+            elif encoding:
+                entry["MessageAttributes"] = encoding
+            entries.append(entry)
+        if ids is not None and next(ids, _MISSING) is not _MISSING:
+            raise ValueError(f"More ids than messages ({len(entries)})")
+        if self.claim_check is not None:
+            entries = self.claim_check.check_many(
+                entries, message_size, workers=workers
+            )
+        _check_sizes(entries, message_size, SQS_MAX_BYTES, "SQSQueue")
+        client = registry.client("sqs")
+        results = dispatch(
+            lambda batch: client.send_message_batch(QueueUrl=self.url, Entries=batch),
+            entries,
+            max_count=SQS_MAX_BATCH,
+            max_bytes=SQS_MAX_BYTES,
+            size=message_size,
+            workers=workers,
+            retries=retries,
+        )
+        return [results[entry["Id"]] for entry in entries]
+
     def listen(self, timeout=10, wait_time=2):
-        queue = sqs_resource.get_queue_by_name(QueueName=self.name)
+        queue = registry.resource("sqs").get_queue_by_name(QueueName=self.name)
         end_time = time.time() + timeout
         while time.time() < end_time:
             messages = queue.receive_messages(
@@ -117,6 +359,16 @@ class SQSQueue(ServerlessResource):
             for message in messages:
                 yield message
 
+    def consume(self, handler, workers=4, **kwargs):
+        """
+        Consume messages on a pool of `workers` threads, calling `handler` with each JSON decoded message body (or the
+        raw message with `raw=True`).  Handled messages are deleted in batches and slow messages have their visibility
+        timeout extended.  Runs until `timeout` seconds pass, `max_messages` are received, the queue is empty (with
+        `stop_when_empty=True`) or it is interrupted, and returns throughput and latency statistics.  See
+        `consumer.Consumer` for the other options.
+        """
+        return Consumer(self.url, handler, workers=workers, **kwargs).run()
+
     def attach_policy(self, policy):
         policy["Properties"]["PolicyDocument"]["Id"] = self.name + "-policy"
         policy["Properties"]["PolicyDocument"]["Statement"][0]["Resource"] = self.arn
@@ -156,25 +408,119 @@ class S3Bucket(ServerlessResource):
         super().__init__()
         self["Type"] = "AWS::S3::Bucket"
         self["Properties"] = {"BucketName": self.name.lower()}
+        self.disk_cache = None
 
     @property
     def arn(self):
         return f"arn:aws:s3:::{self.name}".lower()
 
+    @metrics.timed
     def upload_file(self, key, data):
-        object = s3_res.Object(self.name.lower(), key)
+        object = registry.resource("s3").Object(self.name.lower(), key)
         object.put(Body=data)
 
+    @metrics.timed
     def upload_image(self, key, file):
-        s3_res.Bucket(self.name.lower()).upload_file(file, key)
-
+        registry.resource("s3").Bucket(self.name.lower()).upload_file(file, key)
+
+    def enable_cache(self, directory=None, max_bytes=DISK_CACHE_BYTES):
+        """
+        Keep the objects read by `read_file`, `read_bytes` and `download_image` in a local directory (see
+        `caching.DiskCache`) across warm invocations.  Cached objects are validated with a conditional GET on their
+        ETag, so unchanged objects aren't downloaded again.  Each bucket has its own directory (by default
+        `pipeline-cache/<bucket>` in the temporary directory) and its own `max_bytes` budget, so the budgets of every
+        cached bucket add up and together should leave room in the function's ephemeral storage for its other files.
+        """
+        self.disk_cache = DiskCache(directory, max_bytes, name=self.name)
+        return self
+
+    @metrics.timed
     def read_file(self, key):
-        object = s3_res.Object(self.name.lower(), key)
+        if self.disk_cache is not None:
+            with self._cached(key) as f:
+                return f.read().decode("utf-8")
+        object = registry.resource("s3").Object(self.name.lower(), key)
         file_content = object.get()["Body"].read().decode("utf-8")
         return file_content
 
+    async def read_file_async(self, key):
+        return await _threaded(self.read_file, key)
+
+    @metrics.timed
     def download_image(self, key, file):
-        s3_res.Bucket(self.name.lower()).download_file(key, file)
+        if self.disk_cache is not None:
+            with self._cached(key) as f, open(file, "wb") as out:
+                shutil.copyfileobj(f, out)
+            return
+        registry.resource("s3").Bucket(self.name.lower()).download_file(key, file)
+
+    def open(self, key, mode="rb", **kwargs):
+        """
+        Open an object as a file-like stream.  Reading ("rb"/"r") returns a seekable stream backed by ranged GETs with
+        read-ahead and a block cache (see `streams.S3Reader` for `block_size`, `cache_blocks` and `read_ahead`).
+        Writing ("wb"/"w") returns a stream which uploads the object as a multipart upload (`part_size`).
+        """
+        if mode in ("r", "rb"):
+            stream = S3Reader(self.name.lower(), key, **kwargs)
+            if mode == "r":
+                return io.TextIOWrapper(io.BufferedReader(stream), encoding="utf-8")
+            return stream
+        elif mode in ("w", "wb"):
+            stream = S3Writer(self.name.lower(), key, **kwargs)
+            if mode == "w":
+                return S3TextWriter(stream)
+            return stream
+        raise ValueError(f"Unsupported mode: {mode}")
+
+    @metrics.timed
+    def read_bytes(self, key, start=None, end=None):
+        """Read an object (or the inclusive byte range `start`-`end` of it) as bytes"""
+        if self.disk_cache is not None:
+            with self._cached(key) as f:
+                f.seek(start or 0)
+                return f.read() if end is None else f.read(end + 1 - (start or 0))
+        kwargs = {"Bucket": self.name.lower(), "Key": key}
+        if start is not None or end is not None:
+            kwargs["Range"] = f"bytes={start or 0}-{'' if end is None else end}"
+        return registry.client("s3").get_object(**kwargs)["Body"].read()
+
+    async def read_bytes_async(self, key, start=None, end=None):
+        return await _threaded(self.read_bytes, key, start, end)
+
+    def iter_chunks(self, key, chunk_size=MB):
+        """Stream an object as chunks of at most `chunk_size` bytes from a single GET request"""
+        response = registry.client("s3").get_object(Bucket=self.name.lower(), Key=key)
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def _cached(self, key):
+        """Open the cached copy of an object, downloading it unless the cached ETag is still current"""
+        cache_key = f"{self.name.lower()}/{key}"
+        etag = self.disk_cache.version(cache_key)
+        kwargs = {"Bucket": self.name.lower(), "Key": key}
+        try:
+            if etag is None:
+                response = registry.client("s3").get_object(**kwargs)
+            else:
+                response = registry.client("s3").get_object(
+                    IfNoneMatch=f'"{etag}"', **kwargs
+                )
+        except Exception as e:
+            if etag is None or not _not_modified(e):
+                raise
+            stream = self.disk_cache.open(cache_key, etag)
+            if stream is not None:
+                return stream
+            # Evicted since its version was looked up
+            response = registry.client("s3").get_object(**kwargs)
+        body = response["Body"]
+        try:
+            return self.disk_cache.write(cache_key, response["ETag"], body)
+        finally:
+            body.close()
 
 
 class DynamoDB(ServerlessResource):
@@ -187,6 +533,8 @@ class DynamoDB(ServerlessResource):
             "KeySchema": [],
             "ProvisionedThroughput": {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
         }
+        self.global_indexes = []
+        self.local_indexes = []
 
     def add_attribute(self, name, type):
         self["Properties"]["AttributeDefinitions"].append(
@@ -196,6 +544,61 @@ class DynamoDB(ServerlessResource):
     def add_key(self, name, type):
         self["Properties"]["KeySchema"].append({"AttributeName": name, "KeyType": type})
 
+    def add_global_index(self, name, keys, projection="ALL", attributes=None):
+        """
+        Add a global secondary index.  `keys` is a list of (attribute name, key type) tuples, `projection` is one of
+        ALL, KEYS_ONLY or INCLUDE (with the projected non-key `attributes`).  Key attributes must also be added with
+        `add_attribute`.
+        """
+        self.global_indexes.append(self._index(name, keys, projection, attributes))
+
+    def add_local_index(self, name, keys, projection="ALL", attributes=None):
+        """Add a local secondary index (same hash key as the table, different range key).  See `add_global_index`"""
+        self.local_indexes.append(self._index(name, keys, projection, attributes))
+
+    def set_billing_mode(self, mode, read_capacity=1, write_capacity=1):
+        """Use PROVISIONED throughput (applied to the table and its global indexes) or on-demand PAY_PER_REQUEST"""
+        if mode == "PAY_PER_REQUEST":
+            self["Properties"].pop("ProvisionedThroughput", None)
+        elif mode == "PROVISIONED":
+            self["Properties"]["ProvisionedThroughput"] = {
+                "ReadCapacityUnits": read_capacity,
+                "WriteCapacityUnits": write_capacity,
+            }
+        else:
+            raise ValueError(f"Unknown billing mode: {mode}")
+        self["Properties"]["BillingMode"] = mode
+
+    def build_resource(self):
+        """Convert resource to dictionary structure compatible with SLS framework, including secondary indexes"""
+        resource = dict(self)
+        properties = dict(self["Properties"])
+        if self.global_indexes:
+            indexes = [dict(x) for x in self.global_indexes]
+            if "ProvisionedThroughput" in properties:
+                for index in indexes:
+                    index["ProvisionedThroughput"] = dict(
+                        properties["ProvisionedThroughput"]
+                    )
+            properties["GlobalSecondaryIndexes"] = indexes
+        if self.local_indexes:
+            properties["LocalSecondaryIndexes"] = self.local_indexes
+        resource["Properties"] = properties
+        return {self.name: resource}
+
+    @staticmethod
+    def _index(name, keys, projection, attributes):
+        index = {
+            "IndexName": name,
+            "KeySchema": [
+                {"AttributeName": key, "KeyType": type} for (key, type) in keys
+            ],
+            "Projection": {"ProjectionType": projection},
+        }
+        if attributes:
+            index["Projection"]["NonKeyAttributes"] = list(attributes)
+        return index
+
     @property
     def primary_key(self):
         return self["Properties"]["KeySchema"][0]["AttributeName"]
@@ -204,27 +607,256 @@ class DynamoDB(ServerlessResource):
     def arn(self):
         return f"arn:aws:dynamodb:{execution.region}:{execution.accountid}:table/{self.name}"
 
+    @metrics.timed
     def put(self, item):
-        table = dynamodb.Table(self.name)
+        table = registry.resource("dynamodb").Table(self.name)
         table.put_item(Item=item)
 
+    async def put_async(self, item):
+        return await _threaded(self.put, item)
+
+    @metrics.timed
+    def put_many(self, items, retries=8):
+        """Write many items with BatchWriteItem (25 items per request), retrying unprocessed items"""
+        requests = ({"PutRequest": {"Item": item}} for item in items)
+        self._batch_write(requests, retries)
+
+    @metrics.timed
     def delete(self, item, key=None):
         if not key:
             key = self.primary_key
-        table = dynamodb.Table(self.name)
+        table = registry.resource("dynamodb").Table(self.name)
         table.delete_item(Key={key: item})
 
+    @metrics.timed
+    def delete_many(self, items, key=None, retries=8):
+        """Delete many items with BatchWriteItem (25 items per request), retrying unprocessed items"""
+        requests = ({"DeleteRequest": {"Key": self._key(item, key)}} for item in items)
+        self._batch_write(requests, retries)
+
+    @metrics.timed
     def get(self, item, key=None):
         if not key:
             key = self.primary_key
-        table = dynamodb.Table(self.name)
+        table = registry.resource("dynamodb").Table(self.name)
         result = table.get_item(Key={key: item})
         return result["Item"]
 
-    def list(self):
-        table = dynamodb.Table(self.name)
-        result = table.scan()
-        return result["Items"]
+    async def get_async(self, item, key=None):
+        return await _threaded(self.get, item, key)
+
+    @metrics.timed
+    def get_many(self, items, key=None, attributes=None, retries=8):
+        """
+        Read many items with BatchGetItem (100 keys per request), retrying unprocessed keys.  Items may be key values of
+        `key` (defaults to the primary key) or full key dictionaries.  Returns a list in input order containing `None`
+        for keys which don't exist.  Duplicate keys are only requested once (BatchGetItem rejects them).
+        """
+        dynamodb = registry.resource("dynamodb")
+        keys = [self._key(item, key) for item in items]
+        unique = list({self._key_id(k, k): k for k in keys}.values())
+        found = {}
+        for batch in chunk(unique, DYNAMODB_MAX_READ):
+            request = {"Keys": batch}
+            request.update(self._projection(attributes, keys=batch[0]))
+            unprocessed = {self.name: request}
+            attempt = 0
+            while unprocessed:
+                response = dynamodb.batch_get_item(RequestItems=unprocessed)
+                for result in response["Responses"].get(self.name, []):
+                    found[self._key_id(result, batch[0])] = result
+                unprocessed = response.get("UnprocessedKeys")
+                attempt = self._backoff(unprocessed, attempt, retries)
+        return [found.get(self._key_id(k, k)) for k in keys]
+
+    def list(self, attributes=None, page_size=None):
+        """
+        Lazily scan the whole table, requesting the next page only once the previous one has been consumed.  Optionally
+        project a list of `attributes` and limit the number of items read per request with `page_size`.
+        """
+        table = registry.resource("dynamodb").Table(self.name)
+        kwargs = self._projection(attributes)
+        if page_size:
+            kwargs["Limit"] = page_size
+        return self._paginate(table.scan, **kwargs)
+
+    def query(
+        self,
+        key_condition,
+        index=None,
+        filter=None,
+        attributes=None,
+        page_size=None,
+        ascending=True,
+    ):
+        """
+        Lazily query the table, or one of its secondary indexes, yielding every matching item across pages.
+        `key_condition` is either a boto3 condition (`boto3.dynamodb.conditions.Key`) or a dictionary of key attribute
+        names and values which must all be equal.  `filter` is an optional boto3 condition (`Attr`) applied server side.
+        """
+        if isinstance(key_condition, dict):
+            from boto3.dynamodb.conditions import Key
+
+            conditions = [Key(k).eq(v) for (k, v) in key_condition.items()]
+            key_condition = conditions[0]
+            for condition in conditions[1:]:
+                key_condition = key_condition & condition
+        table = registry.resource("dynamodb").Table(self.name)
+        kwargs = self._projection(attributes)
+        kwargs.update({"KeyConditionExpression": key_condition})
+        if not ascending:
+            kwargs["ScanIndexForward"] = False
+        if index:
+            kwargs["IndexName"] = index
+        if filter is not None:
+            kwargs["FilterExpression"] = filter
+        if page_size:
+            kwargs["Limit"] = page_size
+        return self._paginate(table.query, **kwargs)
+
+    def parallel_scan(
+        self, segments=4, workers=None, attributes=None, cursors=None, queue_size=None
+    ):
+        """
+        Scan the table as `segments` parallel segments on a pool of `workers` threads (defaults to one per segment).
+        Items are yielded as they arrive.  Pass the `cursors` of an interrupted scan to resume it.
+        """
+        return ParallelScan(
+            self.name,
+            segments,
+            workers or segments,
+            cursors=cursors,
+            queue_size=queue_size,
+            **self._projection(attributes),
+        )
+
+    @staticmethod
+    def _paginate(method, **kwargs):
+        """Yield items from every page of a scan/query"""
+        while True:
+            result = method(**kwargs)
+            yield from result["Items"]
+            if "LastEvaluatedKey" not in result:
+                return
+            kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+    @staticmethod
+    def _projection(attributes, keys=None):
+        """Build ProjectionExpression arguments, using placeholder names so reserved words can be projected"""
+        if not attributes:
+            return {}
+        attributes = list(attributes)
+        if keys:
+            # Key attributes are needed to match batch results back to their request
+            attributes += [x for x in keys if x not in attributes]
+        names = {f"#p{idx}": name for (idx, name) in enumerate(attributes)}
+        return {
+            "ProjectionExpression": ", ".join(names),
+            "ExpressionAttributeNames": names,
+        }
+
+    def _key(self, item, key=None):
+        """Build a key dictionary from a key value or return an existing key dictionary"""
+        if isinstance(item, dict):
+            return item
+        return {key or self.primary_key: item}
+
+    @staticmethod
+    def _key_id(item, key):
+        """Hashable identity of an item's key"""
+        return tuple(item[k] for k in sorted(key))
+
+    def _batch_write(self, requests, retries):
+        dynamodb = registry.resource("dynamodb")
+        for batch in chunk(requests, DYNAMODB_MAX_WRITE):
+            unprocessed = {self.name: batch}
+            attempt = 0
+            while unprocessed:
+                response = dynamodb.batch_write_item(RequestItems=unprocessed)
+                unprocessed = response.get("UnprocessedItems")
+                attempt = self._backoff(unprocessed, attempt, retries)
+
+    def _backoff(self, unprocessed, attempt, retries):
+        """Sleep before retrying unprocessed requests, raising once `retries` is exhausted"""
+        if not unprocessed:
+            return attempt
+        if attempt >= retries:
+            raise UnprocessedItemsError(self.name, unprocessed)
+        attempt += 1
+        time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        return attempt
+
+
+class ParallelScan(object):
+
+    """
+    Iterator over a segmented DynamoDB scan.  Each segment is scanned by a worker thread which puts pages on a bounded
+    queue, so workers block once the consumer falls behind.  `cursors` maps every unfinished segment to the key its scan
+    resumes from (`None` for the start of the segment) and only advances once a page has been fully consumed, so
+    restarting from saved cursors never skips items.  Iterating again resumes the unfinished segments from the cursors.
+    """
+
+    def __init__(
+        self, table, segments, workers, cursors=None, queue_size=None, **kwargs
+    ):
+        self.table = table
+        self.segments = segments
+        self.workers = workers
+        if cursors is None:
+            cursors = {segment: None for segment in range(segments)}
+        self.cursors = dict(cursors)
+        self.kwargs = kwargs
+        self.queue_size = queue_size or workers * 2
+
+    def __iter__(self):
+        # Each iteration has its own queue and workers, as those of a previous one have been stopped
+        pages = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        pending = len(self.cursors)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        for (segment, start) in self.cursors.items():
+            executor.submit(self._scan, segment, start, pages, stop)
+        try:
+            while pending:
+                (segment, items, next_key) = pages.get()
+                if isinstance(items, Exception):
+                    raise items
+                if items is None:
+                    pending -= 1
+                    continue
+                yield from items
+                if next_key:
+                    self.cursors[segment] = next_key
+                else:
+                    del self.cursors[segment]
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+
+    def _scan(self, segment, start, pages, stop):
+        """Scan one segment, placing each page on the queue followed by a `None` page once finished"""
+        try:
+            table = registry.resource("dynamodb").Table(self.table)
+            kwargs = dict(self.kwargs, Segment=segment, TotalSegments=self.segments)
+            while start is not False and not stop.is_set():
+                if start:
+                    kwargs["ExclusiveStartKey"] = start
+                result = table.scan(**kwargs)
+                start = result.get("LastEvaluatedKey", False)
+                self._put(pages, stop, (segment, result["Items"], start))
+            self._put(pages, stop, (segment, None, None))
+        except Exception as e:
+            self._put(pages, stop, (segment, e, None))
+
+    @staticmethod
+    def _put(pages, stop, page):
+        """Block until there is room on the queue, giving up if the consumer has stopped"""
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return
+            except queue.Full:
+                pass
 
 
 class ResourceGroup(object):
@@ -247,8 +879,8 @@ class ResourceGroup(object):
     def to_dict(self):
         """Dump all resources to dict"""
         resources = {"Resources": {}}
-        dicts = [self.all[k].build_resource() for k in self.all.keys()]
-        [resources["Resources"].update(_) for _ in dicts]
+        for resource in self.all.values():
+            resources["Resources"].update(resource.build_resource())
         return resources
 
     def update_resource(self, resource, new_resource):
@@ -0,0 +1,185 @@
+import json
+import zlib
+import base64
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+Message codecs.  A `Codec` serializes messages as JSON or msgpack, optionally compressed with zlib or zstd, and is
+identified by a content type such as `application/msgpack+zlib`.  Producers send the content type as the
+`pipeline.ContentType` message attribute (except for plain JSON on SQS, so those messages are unchanged) and consumers
+decode messages with the codec it names.  The attribute is namespaced so a `ContentType` set by other producers is
+ignored, as is a content type without a codec.  Transports which only carry text (SQS and SNS bodies) carry anything
+but plain JSON as base64.
+
+JSON uses orjson when it is installed (with numpy arrays serialized natively), falling back to the standard library for
+values orjson doesn't support.  msgpack and zstd require the `msgpack` and `zstandard` packages.
+"""
+
+CONTENT_TYPE_ATTRIBUTE = "pipeline.ContentType"
+
+FORMATS = {"json": "application/json", "msgpack": "application/msgpack"}
+COMPRESSIONS = ("zlib", "zstd")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj):
+    """Serialize to a JSON string"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            # ex. integers larger than 64 bits or subclasses of builtin types
+            pass
+    return json.dumps(obj)
+
+
+def loads(data):
+    """Deserialize a JSON string (or bytes)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects some documents the standard library accepts (ex. NaN or large integers)
+            pass
+    return json.loads(data)
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("The msgpack codec requires the msgpack package")
+    return msgpack
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("The zstd codec requires the zstandard package")
+    return zstandard
+
+
+class Codec(object):
+
+    """
+    Serialization `format` ("json" or "msgpack") with optional `compression` ("zlib" or "zstd") at `level` (the
+    library's default if `None`)
+    """
+
+    def __init__(self, format="json", compression=None, level=None):
+        if format not in FORMATS:
+            raise ValueError(f"Format must be one of {tuple(FORMATS)}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Compression must be one of {COMPRESSIONS}")
+        self.format = format
+        self.compression = compression
+        self.level = level
+        self.content_type = FORMATS[format] + (f"+{compression}" if compression else "")
+        # Plain JSON is sent as is, anything else is binary
+        self.text = format == "json" and compression is None
+        if format == "msgpack":
+            msgpack = _msgpack()
+            self._serialize = lambda obj: msgpack.packb(obj, use_bin_type=True)
+            self._deserialize = lambda data: msgpack.unpackb(data, raw=False)
+        else:
+            self._serialize = lambda obj: dumps(obj).encode("utf-8")
+            self._deserialize = loads
+        if compression == "zstd":
+            zstandard = _zstd()
+            level = 3 if level is None else level
+            self._compress = lambda data: zstandard.ZstdCompressor(level).compress(data)
+            self._decompress = lambda data: zstandard.ZstdDecompressor().decompress(
+                data
+            )
+        elif compression == "zlib":
+            level = -1 if level is None else level
+            self._compress = lambda data: zlib.compress(data, level)
+            self._decompress = zlib.decompress
+        else:
+            self._compress = self._decompress = None
+
+    def __repr__(self):
+        return f"Codec({self.content_type})"
+
+    def encode(self, obj):
+        """Encode to bytes"""
+        data = self._serialize(obj)
+        return self._compress(data) if self._compress else data
+
+    def decode(self, data):
+        """Decode from bytes"""
+        return self._deserialize(self._decompress(data) if self._decompress else data)
+
+    def encode_text(self, obj):
+        """Encode to a string, base64 unless the codec is plain JSON"""
+        if self.text:
+            return dumps(obj)
+        return base64.b64encode(self.encode(obj)).decode("ascii")
+
+    def decode_text(self, text):
+        if self.text:
+            return loads(text)
+        return self.decode(base64.b64decode(text))
+
+    def attributes(self):
+        """Message attributes (as given to `resources.message_attributes`) identifying the codec"""
+        return {} if self.text else {CONTENT_TYPE_ATTRIBUTE: self.content_type}
+
+
+JSON = Codec("json")
+
+_codecs = {JSON.content_type: JSON}
+
+
+def get(content_type):
+    """Codec of a content type (ex. `application/msgpack+zstd`), `JSON` if `None`.  Codecs are returned as is."""
+    if content_type is None:
+        return JSON
+    if isinstance(content_type, Codec):
+        return content_type
+    codec = _codecs.get(content_type)
+    if codec is None:
+        (mime, _, compression) = content_type.partition("+")
+        formats = {v: k for (k, v) in FORMATS.items()}
+        if mime not in formats:
+            raise ValueError(f"Unsupported content type: {content_type}")
+        codec = _codecs[content_type] = Codec(formats[mime], compression or None)
+    return codec
+
+
+def content_type(attributes):
+    """
+    Content type in message attributes, in any of the shapes of the SQS API (`StringValue`) and of SQS (`stringValue`)
+    and SNS (`Value`) lambda events, or `None`
+    """
+    attribute = (attributes or {}).get(CONTENT_TYPE_ATTRIBUTE)
+    if attribute is None:
+        return None
+    return (
+        attribute.get("stringValue")
+        or attribute.get("Value")
+        or attribute.get("StringValue")
+    )
+
+
+def from_attributes(attributes, default=JSON):
+    """Codec named by message attributes, or `default` if they name none or a content type which has no codec"""
+    name = content_type(attributes)
+    if name is None:
+        return default
+    try:
+        return get(name)
+    except ValueError:
+        return default
+
+
+def decode_message(body, attributes=None):
+    """Decode the text body of a SQS or SNS message with the codec named by its attributes (JSON by default)"""
+    return from_attributes(attributes).decode_text(body)
@@ -0,0 +1,233 @@
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .clients import registry
+
+"""
+File-like streaming access to S3 objects.  `S3Reader` serves reads from fixed size blocks fetched with HTTP range
+requests, keeping recently used blocks in a small LRU cache and prefetching the blocks after the current one in the
+background.  `S3Writer` buffers writes into parts of a multipart upload.  Both hold at most a few blocks/parts in memory
+regardless of the object's size.
+"""
+
+MB = 1024 * 1024
+MIN_PART_SIZE = 5 * MB
+
+
+class S3Reader(io.RawIOBase):
+
+    """Seekable, read-only stream over an S3 object backed by ranged GET requests"""
+
+    def __init__(self, bucket, key, block_size=8 * MB, cache_blocks=4, read_ahead=1):
+        super().__init__()
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        self.cache_blocks = max(cache_blocks, read_ahead + 1)
+        self.read_ahead = read_ahead
+        self._client = registry.client("s3")
+        head = self._client.head_object(Bucket=bucket, Key=key)
+        self.size = head["ContentLength"]
+        self.etag = head["ETag"]
+        self._position = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=read_ahead) if read_ahead else None
+        )
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._position
+        end = min(self._position + size, self.size)
+        chunks = []
+        while self._position < end:
+            index = self._position // self.block_size
+            block = self._block(index)
+            offset = self._position - index * self.block_size
+            chunk = block[offset : offset + end - self._position]
+            chunks.append(chunk)
+            self._position += len(chunk)
+        return b"".join(chunks)
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        self._blocks.clear()
+        super().close()
+
+    def _block(self, index):
+        """Return block `index` from the cache (fetching it if needed) and schedule read-ahead of the next blocks"""
+        with self._lock:
+            future = self._blocks.get(index)
+            if future is None:
+                future = self._schedule(index, background=False)
+            self._blocks.move_to_end(index)
+            last = (self.size - 1) // self.block_size
+            for ahead in range(index + 1, min(index + self.read_ahead, last) + 1):
+                if ahead not in self._blocks:
+                    self._schedule(ahead, background=True)
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+        return future.result()
+
+    def _schedule(self, index, background):
+        if background:
+            future = self._executor.submit(self._fetch, index)
+        else:
+            future = _Resolved(self._fetch(index))
+        self._blocks[index] = future
+        return future
+
+    def _fetch(self, index):
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self._client.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes={start}-{end}",
+            IfMatch=self.etag,
+        )
+        return response["Body"].read()
+
+
+class _Resolved(object):
+
+    """Already completed stand-in for a future"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+class S3Writer(io.RawIOBase):
+
+    """
+    Write-only stream which uploads an S3 object as a multipart upload, sending a part each time `part_size` bytes have
+    been buffered.  Objects smaller than one part are uploaded with a single PUT on close.  The upload is aborted if the
+    stream is used as a context manager and an exception is raised.
+    """
+
+    def __init__(self, bucket, key, part_size=8 * MB):
+        super().__init__()
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self._client = registry.client("s3")
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            self._upload_part(part)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        if self._upload_id is None:
+            self._client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer)
+            )
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self._client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buffer = bytearray()
+        super().close()
+
+    def abort(self):
+        """Discard everything written so far"""
+        if self._upload_id is not None:
+            self._client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+        self._buffer = bytearray()
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def _upload_part(self, data):
+        if self._upload_id is None:
+            response = self._client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )
+            self._upload_id = response["UploadId"]
+        number = len(self._parts) + 1
+        response = self._client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=number,
+            Body=data,
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+
+class S3TextWriter(io.TextIOWrapper):
+
+    """Text stream over a `S3Writer` which, like it, aborts the upload if an exception is raised in its context"""
+
+    def __init__(self, writer, encoding="utf-8"):
+        super().__init__(io.BufferedWriter(writer), encoding=encoding)
+        self.writer = writer
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # Aborting closes the writer and with it this stream, dropping any text still buffered
+            self.writer.abort()
+        else:
+            self.close()
@@ -20,8 +20,9 @@ class Role(object):
         self.resource.append(value)
 
     def to_dict(self):
-        resources = [x for x in self.resource if x]
-        actions = list(set(self.action))
+        # Deduplicated in order of addition, so the template is the same in every process
+        resources = list(dict.fromkeys(x for x in self.resource if x))
+        actions = list(dict.fromkeys(self.action))
 
         if len(actions) == 0 and len(resources) == 0:
             return
@@ -0,0 +1,289 @@
+import json
+import threading
+import unittest
+
+from pipeline import resources
+from pipeline.batching import chunk
+from pipeline.clients import registry
+from pipeline.execution import execution
+
+
+class StubSQS(object):
+
+    """Stub SQS client which records batch calls and fails each entry id listed in `flaky` once"""
+
+    def __init__(self, flaky=()):
+        self.calls = []
+        self.flaky = set(flaky)
+        self.lock = threading.Lock()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            self.calls.append(Entries)
+            failed = [x for x in Entries if x["Id"] in self.flaky]
+            self.flaky -= {x["Id"] for x in failed}
+        return {
+            "Successful": [
+                {"Id": x["Id"], "MessageId": "msg-" + x["Id"]}
+                for x in Entries
+                if x not in failed
+            ],
+            "Failed": [
+                {"Id": x["Id"], "SenderFault": False, "Code": "InternalError"}
+                for x in failed
+            ],
+        }
+
+
+class StubSNS(object):
+    def __init__(self):
+        self.calls = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.calls.append(PublishBatchRequestEntries)
+        return {
+            "Successful": [
+                {"Id": x["Id"], "MessageId": "msg-" + x["Id"]}
+                for x in PublishBatchRequestEntries
+            ],
+            "Failed": [],
+        }
+
+
+class BatchTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class BatchQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class BatchingTestCases(unittest.TestCase):
+    def setUp(self):
+        execution.accountid = "123456789012"
+        self.queue = BatchQueue()
+        self.topic = BatchTopic()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_chunk(self):
+        batches = list(chunk(range(25), 10))
+        self.assertEqual([len(x) for x in batches], [10, 10, 5])
+        batches = list(chunk(["a" * 40] * 5, 10, max_bytes=100, size=len))
+        self.assertEqual([len(x) for x in batches], [2, 2, 1])
+
+    def test_send_messages(self):
+        client = StubSQS()
+        registry.register_client("sqs", client)
+        messages = [{"value": x} for x in range(25)]
+        results = self.queue.send_messages(messages, ids=[str(x) for x in range(25)])
+        self.assertEqual(len(client.calls), 3)
+        self.assertTrue(all(len(x) <= 10 for x in client.calls))
+        self.assertEqual(
+            [x["MessageId"] for x in results], [f"msg-{x}" for x in range(25)]
+        )
+        entry = client.calls[0][0]
+        self.assertEqual(json.loads(entry["MessageBody"]), {"value": 0})
+        self.assertEqual(entry["MessageAttributes"]["id"]["StringValue"], "0")
+
+    def test_send_messages_size_limit(self):
+        client = StubSQS()
+        registry.register_client("sqs", client)
+        messages = ["x" * 100000] * 5
+        self.queue.send_messages(messages)
+        self.assertEqual([len(x) for x in client.calls], [2, 2, 1])
+
+    def test_send_messages_too_large(self):
+        client = StubSQS()
+        registry.register_client("sqs", client)
+        with self.assertRaises(ValueError):
+            self.queue.send_messages(["x", "x" * 300000])
+        self.assertEqual(client.calls, [])
+
+    def test_send_messages_ids(self):
+        registry.register_client("sqs", StubSQS())
+        with self.assertRaises(ValueError):
+            self.queue.send_messages(range(3), ids=["0", "1"])
+        with self.assertRaises(ValueError):
+            self.queue.send_messages(range(2), ids=["0", "1", "2"])
+        results = self.queue.send_messages(range(2), ids=["0", None])
+        self.assertEqual(len(results), 2)
+
+    def test_send_messages_retry(self):
+        client = StubSQS(flaky=["3", "7"])
+        registry.register_client("sqs", client)
+        results = self.queue.send_messages(range(10))
+        self.assertEqual(len(client.calls), 2)
+        self.assertEqual(sorted(x["Id"] for x in client.calls[1]), ["3", "7"])
+        self.assertTrue(all("MessageId" in x for x in results))
+
+    def test_publish_many(self):
+        client = StubSNS()
+        registry.register_client("sns", client)
+        messages = [f"message-{x}" for x in range(15)]
+        results = self.topic.publish_many(messages, attributes={"stage": "ingest"})
+        self.assertEqual([len(x) for x in client.calls], [10, 5])
+        self.assertEqual(len(results), 15)
+        attribute = client.calls[0][0]["MessageAttributes"]["stage"]
+        self.assertEqual(attribute, {"DataType": "String", "StringValue": "ingest"})
+
+    def test_publish_many_attributes(self):
+        client = StubSNS()
+        registry.register_client("sns", client)
+        self.topic.publish_many(["a", "b"], attributes=[{"size": 1}, None])
+        entries = client.calls[0]
+        self.assertEqual(entries[0]["MessageAttributes"]["size"]["DataType"], "Number")
+        self.assertNotIn("MessageAttributes", entries[1])
+
+    def test_publish_many_invalid(self):
+        client = StubSNS()
+        registry.register_client("sns", client)
+        with self.assertRaises(ValueError):
+            self.topic.publish_many(["a", "b", "c"], attributes=[{"size": 1}])
+        with self.assertRaises(ValueError):
+            self.topic.publish_many(["a"], attributes=[{"size": 1}, None])
+        with self.assertRaises(ValueError):
+            self.topic.publish_many(["a", "x" * 300000])
+        self.assertEqual(client.calls, [])
+
+
+class StubTable(object):
+    def __init__(self, items, page_size=2):
+        self.items = items
+        self.page_size = page_size
+        self.scans = []
+
+    def scan(self, **kwargs):
+        self.scans.append(kwargs)
+        start = kwargs.get("ExclusiveStartKey", 0)
+        result = {"Items": self.items[start : start + self.page_size]}
+        if start + self.page_size < len(self.items):
+            result["LastEvaluatedKey"] = start + self.page_size
+        return result
+
+
+class StubDynamoDB(object):
+
+    """Stub DynamoDB service resource which leaves the last request of each first batch call unprocessed"""
+
+    def __init__(self, table=None):
+        self.table = table
+        self.items = {}
+        self.writes = []
+        self.reads = []
+
+    def Table(self, name):
+        return self.table
+
+    def batch_write_item(self, RequestItems):
+        ((name, requests),) = RequestItems.items()
+        self.writes.append(requests)
+        processed = requests if len(self.writes) > 1 else requests[:-1]
+        for request in processed:
+            if "PutRequest" in request:
+                item = request["PutRequest"]["Item"]
+                self.items[item["id"]] = item
+            else:
+                del self.items[request["DeleteRequest"]["Key"]["id"]]
+        unprocessed = requests[len(processed) :]
+        return {"UnprocessedItems": {name: unprocessed} if unprocessed else {}}
+
+    def batch_get_item(self, RequestItems):
+        ((name, request),) = RequestItems.items()
+        self.reads.append(request)
+        ids = [k["id"] for k in request["Keys"]]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Provided list of item keys contains duplicates")
+        found = [self.items[k["id"]] for k in request["Keys"] if k["id"] in self.items]
+        return {"Responses": {name: found}, "UnprocessedKeys": {}}
+
+
+class BatchTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_key("id", "HASH")
+
+
+class DynamoDBBatchTestCases(unittest.TestCase):
+    def setUp(self):
+        self.table = BatchTable()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_put_get_delete_many(self):
+        dynamodb = StubDynamoDB()
+        registry.register_resource("dynamodb", dynamodb)
+        self.table.put_many({"id": str(x), "value": x} for x in range(30))
+        self.assertEqual([len(x) for x in dynamodb.writes], [25, 1, 5])
+        self.assertEqual(len(dynamodb.items), 30)
+
+        results = self.table.get_many([str(x) for x in range(150)] + ["missing"])
+        self.assertEqual([len(x["Keys"]) for x in dynamodb.reads], [100, 51])
+        self.assertEqual([x["value"] for x in results[:30]], list(range(30)))
+        self.assertIsNone(results[-1])
+
+        results = self.table.get_many(["1", "missing", "1", {"id": "2"}, "missing"])
+        self.assertEqual(len(dynamodb.reads[-1]["Keys"]), 3)
+        self.assertEqual([x and x["value"] for x in results], [1, None, 1, 2, None])
+
+        self.table.delete_many(str(x) for x in range(10))
+        self.assertEqual(len(dynamodb.items), 20)
+
+    def test_list(self):
+        table = StubTable([{"id": str(x)} for x in range(5)])
+        registry.register_resource("dynamodb", StubDynamoDB(table))
+        items = self.table.list(attributes=["id"])
+        self.assertEqual(table.scans, [])
+        self.assertEqual(next(items), {"id": "0"})
+        self.assertEqual(len(table.scans), 1)
+        self.assertEqual(len(list(items)), 4)
+        self.assertEqual(len(table.scans), 3)
+        self.assertEqual(table.scans[0]["ProjectionExpression"], "#p0")
+
+    def test_parallel_scan(self):
+        table = SegmentedTable([{"id": str(x)} for x in range(100)])
+        registry.register_resource("dynamodb", StubDynamoDB(table))
+        items = list(self.table.parallel_scan(segments=4, workers=2))
+        self.assertEqual(sorted(int(x["id"]) for x in items), list(range(100)))
+        self.assertEqual({x["Segment"] for x in table.scans}, {0, 1, 2, 3})
+
+    def test_parallel_scan_resume(self):
+        table = SegmentedTable([{"id": str(x)} for x in range(100)])
+        registry.register_resource("dynamodb", StubDynamoDB(table))
+        scan = self.table.parallel_scan(segments=4, queue_size=1)
+        items = iter(scan)
+        seen = [next(items) for _ in range(30)]
+        items.close()
+        self.assertTrue(scan.cursors)
+        resumed = list(self.table.parallel_scan(segments=4, cursors=scan.cursors))
+        ids = {x["id"] for x in seen} | {x["id"] for x in resumed}
+        self.assertEqual(len(ids), 100)
+
+    def test_parallel_scan_reuse(self):
+        table = SegmentedTable([{"id": str(x)} for x in range(100)])
+        registry.register_resource("dynamodb", StubDynamoDB(table))
+        scan = self.table.parallel_scan(segments=4, queue_size=1)
+        items = iter(scan)
+        seen = [next(items) for _ in range(30)]
+        items.close()
+        # Iterating again resumes the scan instead of waiting on the stopped workers
+        seen.extend(scan)
+        self.assertEqual({x["id"] for x in seen}, {str(x) for x in range(100)})
+        self.assertEqual(scan.cursors, {})
+        self.assertEqual(list(scan), [])
+
+
+class SegmentedTable(StubTable):
+    def scan(self, Segment, TotalSegments, **kwargs):
+        self.scans.append(dict(kwargs, Segment=Segment))
+        segment = self.items[Segment::TotalSegments]
+        start = kwargs.get("ExclusiveStartKey", 0)
+        result = {"Items": segment[start : start + self.page_size]}
+        if start + self.page_size < len(segment):
+            result["LastEvaluatedKey"] = start + self.page_size
+        return result
@@ -0,0 +1,269 @@
+import io
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from pipeline import Pipeline, events, functions, metrics, resources
+from pipeline.caching import Cache, sizeof
+from pipeline.clients import registry
+
+calls = []
+
+
+@functions.cached(ttl=60, maxsize=2)
+def lookup(key, suffix=""):
+    calls.append(key)
+    return key + suffix
+
+
+@functions.cached()
+async def lookup_async(key):
+    calls.append(key)
+    return key
+
+
+@functions.cached()
+def arguments(*args, **kwargs):
+    calls.append(args)
+    return (args, kwargs)
+
+
+class CachingPipeline(Pipeline):
+    def __init__(self):
+        super().__init__()
+
+    @events.invoke
+    def handler(self, event, context):
+        return [lookup(x) for x in event]
+
+
+class CacheTestCases(unittest.TestCase):
+    def test_lru(self):
+        cache = Cache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl(self):
+        cache = Cache(ttl=0.05)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_max_bytes(self):
+        cache = Cache(max_bytes=100)
+        cache.set("a", b"x" * 60)
+        cache.set("b", b"x" * 30)
+        cache.set("c", b"x" * 30)
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.bytes, 60)
+        # Larger than the whole cache
+        cache.set("d", b"x" * 101)
+        self.assertNotIn("d", cache)
+        self.assertEqual(cache.bytes, 60)
+
+    def test_replace(self):
+        cache = Cache(max_bytes=100)
+        cache.set("a", b"x" * 60)
+        cache.set("a", b"x" * 10)
+        self.assertEqual((len(cache), cache.bytes), (1, 10))
+        cache.invalidate("a")
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+
+    def test_sizeof(self):
+        self.assertEqual(sizeof(b"x" * 10), 10)
+        self.assertGreater(sizeof({"a": ["x" * 100]}), 100)
+
+
+class CachedTestCases(unittest.TestCase):
+    def setUp(self):
+        calls.clear()
+        lookup.cache.clear()
+        lookup_async.cache.clear()
+        arguments.cache.clear()
+
+    def test_cached(self):
+        (hits, misses) = (lookup.cache.hits, lookup.cache.misses)
+        self.assertEqual(
+            [lookup("a"), lookup("a"), lookup("a", suffix="!")], ["a", "a", "a!"]
+        )
+        self.assertEqual(calls, ["a", "a"])
+        self.assertEqual(
+            (lookup.cache.hits - hits, lookup.cache.misses - misses), (1, 2)
+        )
+        lookup.cache.invalidate(("a",))
+        lookup("a")
+        self.assertEqual(calls, ["a", "a", "a"])
+
+    def test_cached_keywords(self):
+        # Keyword arguments never share a key with positional arguments
+        self.assertEqual(arguments(1, a=1), ((1,), {"a": 1}))
+        self.assertEqual(arguments((1,), (("a", 1),)), (((1,), (("a", 1),)), {}))
+        self.assertEqual(len(calls), 2)
+
+    def test_cached_async(self):
+        loop = asyncio.new_event_loop()
+        for _ in range(3):
+            self.assertEqual(loop.run_until_complete(lookup_async("a")), "a")
+        loop.close()
+        self.assertEqual(calls, ["a"])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            functions.cached(maxsize=0)
+
+    def test_metrics(self):
+        invocations = []
+        metrics.add_hook(invocations.append)
+        try:
+            pipeline = CachingPipeline()
+            pipeline.handler(["a", "b", "a"], None)
+            pipeline.handler(["a"], None)
+        finally:
+            metrics.remove_hook(invocations.append)
+        self.assertEqual(
+            [dict(x.counts) for x in invocations],
+            [{"lookup.CacheHits": 1, "lookup.CacheMisses": 2}, {"lookup.CacheHits": 1}],
+        )
+        self.assertEqual(calls, ["a", "b"])
+
+
+class CachedBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class OtherBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class StubS3(object):
+    def __init__(self):
+        self.objects = {}
+        self.downloads = 0
+
+    def put(self, key, data):
+        self.objects[key] = (data, '"' + hashlib.md5(data).hexdigest() + '"')
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        (data, etag) = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise ClientError(
+                {"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject"
+            )
+        self.downloads += 1
+        return {"Body": io.BytesIO(data), "ETag": etag}
+
+
+class DiskCacheTestCases(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.s3 = StubS3()
+        registry.register_client("s3", self.s3)
+        self.bucket = CachedBucket().enable_cache(self.directory.name, max_bytes=100)
+
+    def tearDown(self):
+        registry.reset()
+        self.directory.cleanup()
+
+    def test_read_file(self):
+        self.s3.put("a.json", b'{"a": 1}')
+        self.assertEqual(self.bucket.read_file("a.json"), '{"a": 1}')
+        self.assertEqual(self.bucket.read_file("a.json"), '{"a": 1}')
+        self.assertEqual(self.s3.downloads, 1)
+        self.assertEqual(self.bucket.read_bytes("a.json", 1, 4), b'"a":')
+        self.assertEqual(self.s3.downloads, 1)
+        self.assertEqual(self.bucket.disk_cache.stats()["hits"], 2)
+
+    def test_changed(self):
+        self.s3.put("a.json", b"1")
+        self.bucket.read_file("a.json")
+        self.s3.put("a.json", b"2")
+        self.assertEqual(self.bucket.read_file("a.json"), "2")
+        self.assertEqual(self.s3.downloads, 2)
+        # The previous version was replaced
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    def test_download_image(self):
+        self.s3.put("image.png", b"x" * 50)
+        target = os.path.join(self.directory.name, "image.png")
+        for _ in range(2):
+            self.bucket.download_image("image.png", target)
+            with open(target, "rb") as f:
+                self.assertEqual(f.read(), b"x" * 50)
+        self.assertEqual(self.s3.downloads, 1)
+
+    def test_eviction(self):
+        for key in "abc":
+            self.s3.put(key, key.encode() * 40)
+            self.bucket.read_bytes(key)
+        cache = self.bucket.disk_cache
+        self.assertEqual((cache.bytes, cache.evictions), (80, 1))
+        self.bucket.read_bytes("a")
+        self.assertEqual(self.s3.downloads, 4)
+        # Larger than the budget, read but not kept
+        self.s3.put("d", b"d" * 101)
+        self.assertEqual(self.bucket.read_bytes("d"), b"d" * 101)
+        self.assertIsNone(cache.version("cachedbucket/d"))
+
+    def test_scan(self):
+        self.s3.put("a", b"a")
+        self.bucket.read_bytes("a")
+        # A new process finds the files of the previous one
+        bucket = CachedBucket().enable_cache(self.directory.name)
+        self.assertEqual(bucket.read_bytes("a"), b"a")
+        self.assertEqual(self.s3.downloads, 1)
+
+    def test_foreign_files(self):
+        # Files the cache didn't write are never indexed, evicted or cleared
+        for name in ["model.tif", "notes.txt", "README"]:
+            with open(os.path.join(self.directory.name, name), "wb") as f:
+                f.write(b"x" * 200)
+        bucket = CachedBucket().enable_cache(self.directory.name, max_bytes=100)
+        self.s3.put("a", b"a" * 60)
+        self.s3.put("b", b"b" * 60)
+        bucket.read_bytes("a")
+        bucket.read_bytes("b")
+        bucket.disk_cache.clear()
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            ["README", "model.tif", "notes.txt"],
+        )
+
+    def test_default_directory(self):
+        # Buckets don't share a directory, so neither indexes nor evicts the other's files
+        tempfile.tempdir = self.directory.name
+        try:
+            first = CachedBucket().enable_cache(max_bytes=100)
+            second = OtherBucket().enable_cache(max_bytes=100)
+        finally:
+            tempfile.tempdir = None
+        self.s3.put("a", b"a" * 80)
+        first.read_bytes("a")
+        second.read_bytes("a")
+        self.assertNotEqual(first.disk_cache.directory, second.disk_cache.directory)
+        self.assertEqual(first.disk_cache.bytes, 80)
+        self.assertEqual(len(os.listdir(first.disk_cache.directory)), 1)
+
+    def test_concurrent(self):
+        self.s3.put("a", b"a" * 10)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.bucket.read_bytes, ["a"] * 50))
+        self.assertEqual(results, [b"a" * 10] * 50)
+        self.assertEqual(self.bucket.disk_cache.bytes, 10)
+        self.assertFalse(
+            [x for x in os.listdir(self.directory.name) if x.startswith(".tmp")]
+        )
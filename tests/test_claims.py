@@ -0,0 +1,118 @@
+import json
+import threading
+import unittest
+
+from pipeline import Pipeline, claims, events, resources
+from pipeline.execution import execution
+from pipeline.local import LocalRuntime
+
+
+class ClaimBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class ClaimQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class ClaimTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+bucket = ClaimBucket()
+queue = ClaimQueue().enable_offload(bucket, threshold=1024)
+topic = ClaimTopic().enable_offload(bucket, threshold=1024, prefix="topic/")
+
+
+class ClaimPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[bucket, queue, topic])
+        self.received = []
+        self.lock = threading.Lock()
+
+    @events.sqs(resource=queue, concurrency=4, delete_payloads=True)
+    def consume(self, event, context):
+        if event["id"] == "fail":
+            raise ValueError(event)
+        with self.lock:
+            self.received.append(event)
+
+    @events.sns(resource=topic)
+    def notify(self, event, context):
+        with self.lock:
+            self.received.append(json.loads(event))
+
+
+class ClaimCheckTestCases(unittest.TestCase):
+    def setUp(self):
+        execution.accountid = None
+        self.pipeline = ClaimPipeline()
+
+    def tearDown(self):
+        execution.accountid = None
+
+    def objects(self, runtime):
+        return sorted(runtime.buckets[bucket.name.lower()])
+
+    def test_sqs(self):
+        large = {"id": "large", "values": list(range(1000))}
+        with LocalRuntime(self.pipeline, max_receives=1) as runtime:
+            queue.send_messages([{"id": "small"}, large, dict(large, id="fail")])
+            queue.send_message(dict(large, id="single"))
+            runtime.drain(timeout=10)
+            objects = self.objects(runtime)
+        self.assertEqual(
+            sorted(x["id"] for x in self.pipeline.received),
+            ["large", "single", "small"],
+        )
+        self.assertIn(large, self.pipeline.received)
+        # Only the payload of the failed message remains
+        self.assertEqual(len(objects), 1)
+        self.assertTrue(objects[0].startswith("claim-checks/"))
+
+    def test_sns(self):
+        large = {"id": "large", "values": list(range(1000))}
+        with LocalRuntime(self.pipeline) as runtime:
+            topic.send_message(json.dumps(large))
+            topic.publish_many([json.dumps({"id": "small"}), json.dumps(large)])
+            runtime.drain(timeout=10)
+            objects = self.objects(runtime)
+        self.assertEqual(len(self.pipeline.received), 3)
+        self.assertEqual(self.pipeline.received.count(large), 2)
+        # Payloads are kept for the other subscribers of the topic
+        self.assertEqual(len(objects), 2)
+        self.assertTrue(all(x.startswith("topic/") for x in objects))
+
+    def test_sns_delete_payloads(self):
+        with self.assertRaises(TypeError):
+            events.sns(resource=topic, delete_payloads=True)
+
+    def test_small(self):
+        entry = {"MessageBody": json.dumps({"id": "small"})}
+        self.assertIs(queue.claim_check.check(entry, resources.message_size), entry)
+        records = [{"messageId": "1", "body": entry["MessageBody"]}]
+        self.assertEqual(claims.retrieve(records), (records, {}))
+        entries = [entry, entry]
+        self.assertIs(
+            queue.claim_check.check_many(entries, resources.message_size), entries
+        )
+
+    def test_role(self):
+        execution.accountid = "123456789012"
+        # The bucket holding the payloads isn't one of the pipeline's resources
+        (statement,) = Pipeline(resources=[queue]).define_role()
+        self.assertIn(bucket.arn + "/*", statement["Resource"])
+        self.assertIn("s3:*", statement["Action"])
+
+    def test_pointer(self):
+        body = json.dumps([claims.POINTER, {"s3BucketName": "b", "s3Key": "k"}])
+        record = {"messageId": "1", "body": body}
+        self.assertIsNone(claims.pointer(record))
+        record["messageAttributes"] = {
+            claims.SIZE_ATTRIBUTE: {"dataType": "Number", "stringValue": "10"}
+        }
+        self.assertEqual(claims.pointer(record), ("b", "k"))
+        self.assertIsNone(claims.pointer(dict(record, body="[1, 2]")))
@@ -0,0 +1,176 @@
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from click.testing import CliRunner
+
+from pipeline import _cli
+
+HANDLER = """from pipeline import Pipeline, events
+
+
+class CliPipeline(Pipeline):
+    @events.invoke
+    def first(self, event, context):
+        return {first}
+
+    @events.{trigger}
+    def second(self, event, context):
+        return 2
+
+
+pipeline = CliPipeline()
+
+
+def deploy():
+    pipeline.deploy()
+"""
+
+RESOURCES_HANDLER = """from pipeline import Pipeline, events, resources
+
+
+class CliQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class CliBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class CliTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_key("id", "HASH")
+
+
+class CliPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[CliQueue(), CliBucket(), CliTable()])
+
+    @events.invoke
+    def first(self, event, context):
+        return {first}
+
+
+pipeline = CliPipeline()
+
+
+def deploy():
+    pipeline.deploy()
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Logs its arguments instead of calling Serverless Framework
+SLS = """#!/bin/sh
+echo "$@" >> "{log}"
+"""
+
+
+class DeployTestCases(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        self.project = os.path.join(self.directory, "project")
+        os.makedirs(self.project)
+        self.log = os.path.join(self.directory, "sls.log")
+        stub = os.path.join(self.directory, "sls")
+        with open(stub, "w") as f:
+            f.write(SLS.format(log=self.log))
+        os.chmod(stub, os.stat(stub).st_mode | stat.S_IEXEC)
+        self.env = {"PIPELINE_SLS": stub, "AWS_ACCOUNT_ID": "123456789012"}
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        sys.modules.pop("handler", None)
+        if self.project in sys.path:
+            sys.path.remove(self.project)
+        shutil.rmtree(self.directory)
+
+    def deploy(self, first=1, trigger="invoke", *args):
+        with open(os.path.join(self.project, "handler.py"), "w") as f:
+            f.write(HANDLER.format(first=first, trigger=trigger))
+        # Import the rewritten handler on every deployment
+        sys.modules.pop("handler", None)
+        if os.path.exists(self.log):
+            os.remove(self.log)
+        result = CliRunner().invoke(
+            _cli.deploy_pipeline, [self.project, *args], env=self.env
+        )
+        os.chdir(self.cwd)
+        self.assertEqual(result.exit_code, 0, result.output)
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log, "r") as f:
+            return [line.strip() for line in f]
+
+    def deploy_process(self, seed, first=1):
+        """Deploy a pipeline with resources in a new process with its own hash seed"""
+        with open(os.path.join(self.project, "handler.py"), "w") as f:
+            f.write(RESOURCES_HANDLER.format(first=first))
+        if os.path.exists(self.log):
+            os.remove(self.log)
+        env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=ROOT, **self.env)
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "from pipeline._cli import deploy_pipeline; deploy_pipeline()",
+                self.project,
+            ],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log, "r") as f:
+            return [line.strip() for line in f]
+
+    def test_first_deploy(self):
+        calls = self.deploy()
+        self.assertIn("deploy -v", calls)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.project, ".pipeline-deploy.json"))
+        )
+
+    def test_unchanged(self):
+        self.deploy()
+        self.assertEqual(self.deploy(), [])
+
+    def test_code_change(self):
+        self.deploy()
+        self.assertEqual(self.deploy(first=10), ["deploy function -f first"])
+
+    def test_infrastructure_change(self):
+        self.deploy()
+        self.assertIn(
+            "deploy -v",
+            self.deploy(trigger="http(path='second', method='post', cors='true')"),
+        )
+
+    def test_full(self):
+        self.deploy()
+        self.assertIn("deploy -v", self.deploy(1, "invoke", "--full"))
+
+    def test_dry_run(self):
+        self.assertEqual(self.deploy(1, "invoke", "--dry-run"), [])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.project, ".pipeline-deploy.json"))
+        )
+
+    def test_unchanged_resources(self):
+        # Every process must fingerprint the same infrastructure, whatever its hash seed
+        self.assertIn("deploy -v", self.deploy_process("0"))
+        self.assertEqual(self.deploy_process("1"), [])
+        self.assertEqual(self.deploy_process("2"), [])
+        self.assertEqual(
+            self.deploy_process("3", first=10), ["deploy function -f first"]
+        )
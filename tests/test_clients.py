@@ -0,0 +1,52 @@
+import os
+import unittest
+
+from pipeline.clients import ClientRegistry
+from pipeline.execution import Execution, ACCOUNT_ID_ENV
+
+
+class Context(object):
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:my-func"
+
+
+class ClientRegistryTestCases(unittest.TestCase):
+    def test_lazy(self):
+        registry = ClientRegistry()
+        self.assertEqual(registry.loaded(), [])
+        self.assertIsNone(registry._session)
+
+    def test_register_client(self):
+        registry = ClientRegistry()
+        client = object()
+        registry.register_client("sqs", client)
+        self.assertIs(registry.client("sqs"), client)
+        self.assertEqual(registry.loaded(), ["sqs"])
+        registry.reset()
+        self.assertEqual(registry.loaded(), [])
+
+
+class ExecutionTestCases(unittest.TestCase):
+    def setUp(self):
+        self.environ = os.environ.pop(ACCOUNT_ID_ENV, None)
+
+    def tearDown(self):
+        if self.environ is not None:
+            os.environ[ACCOUNT_ID_ENV] = self.environ
+
+    def test_accountid_from_env(self):
+        os.environ[ACCOUNT_ID_ENV] = "111111111111"
+        try:
+            self.assertEqual(Execution().accountid, "111111111111")
+        finally:
+            del os.environ[ACCOUNT_ID_ENV]
+
+    def test_accountid_from_context(self):
+        execution = Execution()
+        execution.bind_context(Context())
+        self.assertEqual(execution.accountid, "123456789012")
+
+    def test_accountid_cached(self):
+        execution = Execution()
+        execution.accountid = "222222222222"
+        execution.bind_context(Context())
+        self.assertEqual(execution.accountid, "222222222222")
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+import unittest
+
+from pipeline import resources
+from pipeline.clients import registry
+from pipeline.execution import execution
+
+
+class StubSQS(object):
+
+    """In-memory SQS client.  Received messages stay on the queue until deleted, but aren't received again"""
+
+    def __init__(self, bodies):
+        self.messages = [
+            {
+                "MessageId": str(idx),
+                "ReceiptHandle": f"handle-{idx}",
+                "Body": json.dumps(body),
+            }
+            for (idx, body) in enumerate(bodies)
+        ]
+        self.queue = list(self.messages)
+        self.deleted = []
+        self.extended = []
+        self.receives = []
+        self.lock = threading.Lock()
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, **kwargs):
+        with self.lock:
+            self.receives.append(MaxNumberOfMessages)
+            messages = self.queue[:MaxNumberOfMessages]
+            del self.queue[:MaxNumberOfMessages]
+        if not messages:
+            time.sleep(WaitTimeSeconds)
+        return {"Messages": messages}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deleted_at = time.perf_counter()
+        self.deleted.extend(x["ReceiptHandle"] for x in Entries)
+        return {"Successful": [{"Id": x["Id"]} for x in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self.extended.extend(x["ReceiptHandle"] for x in Entries)
+        return {"Successful": [{"Id": x["Id"]} for x in Entries], "Failed": []}
+
+
+class ConsumerQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class ConsumerTestCases(unittest.TestCase):
+    def setUp(self):
+        execution.accountid = "123456789012"
+        self.queue = ConsumerQueue()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_consume(self):
+        client = StubSQS([{"value": x} for x in range(50)])
+        registry.register_client("sqs", client)
+        seen = []
+
+        def handler(data):
+            time.sleep(0.01)
+            if data["value"] == 7:
+                raise ValueError(data)
+            seen.append(data["value"])
+
+        stats = self.queue.consume(
+            handler, workers=8, wait_time=0, stop_when_empty=True
+        )
+        self.assertEqual(sorted(seen), [x for x in range(50) if x != 7])
+        self.assertEqual(stats["processed"], 49)
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(len(client.deleted), 49)
+        self.assertNotIn("handle-7", client.deleted)
+        self.assertTrue(all(x <= 10 for x in client.receives))
+        self.assertGreater(stats["messages_per_sec"], 0)
+
+    def test_consume_max_messages(self):
+        client = StubSQS([{"value": x} for x in range(50)])
+        registry.register_client("sqs", client)
+        stats = self.queue.consume(lambda data: None, workers=2, max_messages=15)
+        self.assertEqual(stats["received"], 15)
+
+    def test_consume_extends_visibility(self):
+        client = StubSQS([{"value": 1}])
+        registry.register_client("sqs", client)
+        stats = self.queue.consume(
+            lambda data: time.sleep(1),
+            visibility_timeout=1,
+            wait_time=0,
+            stop_when_empty=True,
+        )
+        self.assertEqual(stats["processed"], 1)
+        self.assertIn("handle-0", client.extended)
+
+    def test_consume_deletes_on_completion(self):
+        client = StubSQS([{"value": 1}])
+        registry.register_client("sqs", client)
+        handled = []
+
+        def handler(data):
+            time.sleep(0.1)
+            handled.append(time.perf_counter())
+
+        # The message completes during the next long poll, and is deleted before it returns
+        self.queue.consume(handler, wait_time=1, timeout=0.5)
+        self.assertEqual(client.deleted, ["handle-0"])
+        self.assertLess(client.deleted_at - handled[0], 0.5)
+
+    def test_consume_duplicate_delivery(self):
+        client = StubSQS([{"value": 1}])
+        # SQS may deliver a message again, with the same id and a new receipt handle
+        client.queue.append(dict(client.messages[0], ReceiptHandle="handle-0-again"))
+        registry.register_client("sqs", client)
+        stats = self.queue.consume(
+            lambda data: time.sleep(0.1), workers=2, wait_time=0, stop_when_empty=True
+        )
+        self.assertEqual(stats["processed"], 2)
+        self.assertEqual(sorted(client.deleted), ["handle-0", "handle-0-again"])
+
+    def test_consume_invalid(self):
+        for kwargs in [
+            {"wait_time": 0.5},
+            {"wait_time": 21},
+            {"visibility_timeout": 0.3},
+        ]:
+            with self.assertRaises(ValueError):
+                self.queue.consume(lambda data: None, **kwargs)
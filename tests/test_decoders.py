@@ -0,0 +1,308 @@
+import asyncio
+import json
+import time
+import unittest
+
+from pipeline import Pipeline, events, resources
+from pipeline.clients import registry
+from pipeline.execution import execution
+
+
+class DecoderQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class DecoderTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class DecoderBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+queue = DecoderQueue()
+topic = DecoderTopic()
+bucket = DecoderBucket()
+
+
+class DecoderPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[queue, topic, bucket])
+        self.batches = []
+        self.done = []
+
+    @events.sqs(resource=queue, concurrency=10)
+    def sqs_concurrent(self, event, context):
+        time.sleep(0.1)
+        if event["fail"]:
+            raise ValueError(event)
+
+    @events.sqs(resource=queue)
+    async def sqs_async(self, event, context):
+        await asyncio.sleep(0.1)
+        return event["value"]
+
+    @events.sqs(resource=queue, concurrency=5)
+    async def sqs_async_concurrent(self, event, context):
+        await asyncio.sleep(0.1)
+        if event["value"] == 2:
+            raise ValueError(event)
+
+    @events.sqs(resource=queue)
+    async def sqs_async_fail(self, event, context):
+        if event["value"] == 0:
+            raise ValueError(event)
+        await asyncio.sleep(0.05)
+        self.done.append(event["value"])
+
+    @events.sns(resource=topic)
+    async def sns_async_fail(self, event, context):
+        if event == "fail":
+            raise ValueError(event)
+        await asyncio.sleep(0.05)
+        self.done.append(event)
+
+    @events.sqs(resource=queue, batch=True)
+    def sqs_batch(self, batch, context):
+        self.batches.append(batch)
+        values = batch.column("value")
+        return [idx for (idx, value) in enumerate(values) if value < 0]
+
+    @events.sns(resource=topic)
+    def sns_records(self, event, context):
+        return event
+
+    @events.sns(resource=topic)
+    def sns_fail(self, event, context):
+        if event == "fail":
+            raise ValueError(event)
+        self.done.append(event)
+
+    @events.sns(resource=topic, concurrency=4)
+    def sns_concurrent(self, event, context):
+        if event == "fail":
+            raise ValueError(event)
+        return event
+
+    @events.bucket_notification(
+        bucket=bucket, event_type="s3:ObjectCreated:*", destination=topic
+    )
+    def sns_objects(self, event, context):
+        return event["key"]
+
+    @events.sqs(resource=queue, batch=True)
+    def sqs_batch_indices(self, batch, context):
+        return self.indices
+
+    @events.bucket_notification(
+        bucket=bucket, event_type="s3:ObjectCreated:*", destination=queue, batch=True
+    )
+    def sqs_objects(self, batch, context):
+        self.batches.append(batch)
+        return [idx for (idx, key) in enumerate(batch.column("key")) if key == "bad"]
+
+    @events.invoke
+    async def invoke_async(self, event, context):
+        await asyncio.sleep(0)
+        return event
+
+
+class StubSQS(object):
+    def send_message(self, **kwargs):
+        time.sleep(0.1)
+        return kwargs
+
+
+def sqs_event(bodies):
+    return {
+        "Records": [
+            {"messageId": str(idx), "body": json.dumps(body), "eventSource": "aws:sqs"}
+            for (idx, body) in enumerate(bodies)
+        ]
+    }
+
+
+def sns_event(messages):
+    return {
+        "Records": [
+            {
+                "EventSource": "aws:sns",
+                "Sns": {"MessageId": str(idx), "Message": message},
+            }
+            for (idx, message) in enumerate(messages)
+        ]
+    }
+
+
+def s3_notification(*keys):
+    return json.dumps(
+        {
+            "Records": [
+                {"s3": {"bucket": {"name": "bucket"}, "object": {"key": key}}}
+                for key in keys
+            ]
+        }
+    )
+
+
+class DecoderTestCases(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = DecoderPipeline()
+
+    def test_sqs_concurrent(self):
+        event = sqs_event([{"fail": x in (3, 7)} for x in range(10)])
+        start = time.perf_counter()
+        response = self.pipeline.sqs_concurrent(event, None)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(
+            response,
+            {"batchItemFailures": [{"itemIdentifier": "3"}, {"itemIdentifier": "7"}]},
+        )
+
+    def test_sqs_concurrent_template(self):
+        template = self.pipeline.functions["sqs_concurrent"].template()
+        event = template["events"][0]["sqs"]
+        self.assertEqual(event["functionResponseType"], "ReportBatchItemFailures")
+
+    def test_sqs_batch(self):
+        event = sqs_event([{"value": x} for x in [1, -1, 2, 3, -4]])
+        event["Records"].insert(2, {"messageId": "bad", "body": "{"})
+        response = self.pipeline.sqs_batch(event, None)
+        self.assertEqual(
+            response,
+            {
+                "batchItemFailures": [
+                    {"itemIdentifier": "bad"},
+                    {"itemIdentifier": "1"},
+                    {"itemIdentifier": "4"},
+                ]
+            },
+        )
+        # Called once with every record which could be decoded
+        (batch,) = self.pipeline.batches
+        self.assertEqual(batch.column("value"), [1, -1, 2, 3, -4])
+        self.assertEqual(batch.ids, ["0", "1", "2", "3", "4"])
+        template = self.pipeline.functions["sqs_batch"].template()
+        event = template["events"][0]["sqs"]
+        self.assertEqual(event["functionResponseType"], "ReportBatchItemFailures")
+
+    def test_sqs_batch_out_of_range(self):
+        event = sqs_event([{"value": x} for x in range(3)])
+        for indices in [[-1], [1, 3]]:
+            # The handler's failures can't be told apart, so every record fails
+            self.pipeline.indices = indices
+            response = self.pipeline.sqs_batch_indices(event, None)
+            self.assertEqual(
+                [x["itemIdentifier"] for x in response["batchItemFailures"]],
+                ["0", "1", "2"],
+            )
+
+    def test_sqs_batch_invalid(self):
+        with self.assertRaises(ValueError):
+            events.sqs(resource=queue, batch=True, concurrency=4)
+
+    def test_sns_records(self):
+        event = sns_event(["a", "b", "c"])
+        self.assertEqual(self.pipeline.sns_records(event, None), ["a", "b", "c"])
+
+    def test_sns_concurrent(self):
+        event = sns_event(["a", "fail", "c"])
+        with self.assertRaises(events.BatchError) as error:
+            self.pipeline.sns_concurrent(event, None)
+        self.assertEqual(error.exception.ids, ["1"])
+        event = sns_event(["a", "b"])
+        self.assertEqual(self.pipeline.sns_concurrent(event, None), ["a", "b"])
+
+    def test_sns_failure(self):
+        # One at a time the first failure fails the event, with concurrency every record is handled
+        with self.assertRaises(ValueError):
+            self.pipeline.sns_fail(sns_event(["fail", "a", "b"]), None)
+        self.assertEqual(self.pipeline.done, [])
+        with self.assertRaises(events.BatchError) as raised:
+            self.pipeline.sns_concurrent(sns_event(["fail", "a", "b"]), None)
+        self.assertEqual(raised.exception.ids, ["0"])
+
+    def test_sns_bucket_notification(self):
+        event = sns_event(
+            [
+                s3_notification("a", "b"),
+                json.dumps({"Event": "s3:TestEvent"}),
+                s3_notification("c"),
+            ]
+        )
+        self.assertEqual(self.pipeline.sns_objects(event, None), ["a", "b", "c"])
+
+    def test_sns_s3_notification(self):
+        # Only bucket_notification expands S3 notifications, SNS triggers get the message
+        message = s3_notification("a")
+        self.assertEqual(
+            self.pipeline.sns_records(sns_event([message]), None), [message]
+        )
+
+    def test_sqs_bucket_notification(self):
+        event = sqs_event([])
+        event["Records"] = [
+            {"messageId": "0", "body": s3_notification("a", "bad")},
+            {"messageId": "1", "body": s3_notification("b", "c")},
+            {"messageId": "2", "body": "{"},
+        ]
+        response = self.pipeline.sqs_objects(event, None)
+        self.assertEqual(
+            response,
+            {"batchItemFailures": [{"itemIdentifier": "2"}, {"itemIdentifier": "0"}]},
+        )
+        (batch,) = self.pipeline.batches
+        self.assertEqual(batch.column("key"), ["a", "bad", "b", "c"])
+        self.assertEqual(batch.ids, ["0", "0", "1", "1"])
+
+    def test_async_invoke(self):
+        self.assertEqual(
+            self.pipeline.invoke_async({"hello": "world"}, None), {"hello": "world"}
+        )
+        # The event loop is reused across invocations
+        loop = events._loop()
+        self.pipeline.invoke_async({}, None)
+        self.assertIs(events._loop(), loop)
+
+    def test_async_sqs(self):
+        event = sqs_event([{"value": x} for x in range(20)])
+        start = time.perf_counter()
+        self.assertEqual(self.pipeline.sqs_async(event, None), list(range(20)))
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_async_sqs_concurrent(self):
+        event = sqs_event([{"value": x} for x in range(10)])
+        start = time.perf_counter()
+        response = self.pipeline.sqs_async_concurrent(event, None)
+        # 10 records with at most 5 in flight
+        self.assertGreater(time.perf_counter() - start, 0.2)
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "2"}]})
+
+    def test_async_failure(self):
+        with self.assertRaises(ValueError):
+            self.pipeline.sqs_async_fail(
+                sqs_event([{"value": x} for x in range(3)]), None
+            )
+        with self.assertRaises(ValueError):
+            self.pipeline.sns_async_fail(sns_event(["fail", "a", "b"]), None)
+        # The other records were cancelled rather than left pending on the shared loop
+        events._loop().run_until_complete(asyncio.sleep(0.1))
+        self.assertEqual(self.pipeline.done, [])
+
+    def test_async_resource(self):
+        registry.register_client("sqs", StubSQS())
+        execution.accountid = "123456789012"
+
+        async def send():
+            return await asyncio.gather(
+                *[queue.send_message_async(x) for x in range(20)]
+            )
+
+        start = time.perf_counter()
+        responses = asyncio.new_event_loop().run_until_complete(send())
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(len(responses), 20)
+        registry.reset()
@@ -0,0 +1,98 @@
+import unittest
+
+import yaml
+from boto3.dynamodb.conditions import Attr, Key
+
+from pipeline import Pipeline, resources
+from pipeline.clients import registry
+from pipeline.execution import execution
+
+
+class StubTable(object):
+    def __init__(self):
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        if "ExclusiveStartKey" in kwargs:
+            return {"Items": [{"id": "2"}]}
+        return {"Items": [{"id": "1"}], "LastEvaluatedKey": {"id": "1"}}
+
+
+class StubDynamoDB(object):
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+class IndexedTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_attribute("owner", "S")
+        self.add_attribute("created", "N")
+        self.add_key("id", "HASH")
+        self.add_key("created", "RANGE")
+        self.add_global_index("by-owner", [("owner", "HASH"), ("created", "RANGE")])
+        self.add_local_index(
+            "by-id-owner", [("id", "HASH"), ("owner", "RANGE")], "INCLUDE", ["size"]
+        )
+
+
+class DynamoDBTestCases(unittest.TestCase):
+    def setUp(self):
+        self.table = IndexedTable()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_build_resource(self):
+        properties = self.table.build_resource()["IndexedTable"]["Properties"]
+        (gsi,) = properties["GlobalSecondaryIndexes"]
+        self.assertEqual(gsi["IndexName"], "by-owner")
+        self.assertEqual(gsi["ProvisionedThroughput"]["ReadCapacityUnits"], 1)
+        (lsi,) = properties["LocalSecondaryIndexes"]
+        self.assertEqual(lsi["Projection"]["NonKeyAttributes"], ["size"])
+        self.assertNotIn("GlobalSecondaryIndexes", self.table["Properties"])
+        self.assertNotIn("&id", yaml.dump(self.table.build_resource()))
+
+    def test_pay_per_request(self):
+        self.table.set_billing_mode("PAY_PER_REQUEST")
+        properties = self.table.build_resource()["IndexedTable"]["Properties"]
+        self.assertEqual(properties["BillingMode"], "PAY_PER_REQUEST")
+        self.assertNotIn("ProvisionedThroughput", properties)
+        self.assertNotIn(
+            "ProvisionedThroughput", properties["GlobalSecondaryIndexes"][0]
+        )
+
+    def test_query(self):
+        table = StubTable()
+        registry.register_resource("dynamodb", StubDynamoDB(table))
+        items = self.table.query(
+            Key("owner").eq("jeff"), index="by-owner", filter=Attr("size").gt(10)
+        )
+        self.assertEqual(table.queries, [])
+        self.assertEqual([x["id"] for x in items], ["1", "2"])
+        self.assertEqual(len(table.queries), 2)
+        self.assertEqual(table.queries[0]["IndexName"], "by-owner")
+        self.assertIn("FilterExpression", table.queries[0])
+
+    def test_query_dict(self):
+        table = StubTable()
+        registry.register_resource("dynamodb", StubDynamoDB(table))
+        list(self.table.query({"id": "1"}, ascending=False))
+        self.assertEqual(table.queries[0]["KeyConditionExpression"], Key("id").eq("1"))
+        self.assertFalse(table.queries[0]["ScanIndexForward"])
+
+    def test_role(self):
+        execution.accountid = "123456789012"
+        self.addCleanup(setattr, execution, "accountid", None)
+        table = self.table
+        pipeline = Pipeline(resources=[table])
+        (statement,) = pipeline.define_role()
+        self.assertEqual(statement["Resource"], [table.arn, table.arn + "/index/*"])
+        pipeline = Pipeline(resources=[resources.DynamoDB()])
+        (statement,) = pipeline.define_role()
+        self.assertEqual(len(statement["Resource"]), 1)
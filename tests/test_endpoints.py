@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipeline.endpoints import HttpClient, Route
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one packet, avoiding delayed-ACK stalls on keep-alive connections
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.reply(self.path.encode())
+
+    def do_POST(self):
+        self.reply(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def reply(self, body):
+        self.send_response(404 if self.path.startswith("/missing") else 200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.connections.add(self.client_address)
+
+    def log_message(self, *args):
+        pass
+
+
+class EndpointTestCases(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+        cls.server.connections = set()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.outputs = os.path.join(self.directory.name, "outputs.yml")
+        self.write_outputs(self.server.server_address[1])
+        self.server.connections.clear()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_outputs(self, port):
+        with open(self.outputs, "w") as f:
+            f.write(f"ServiceEndpoint: http://127.0.0.1:{port}/dev\n")
+
+    def test_route(self):
+        route = Route("items/{id}/versions/{version}")
+        self.assertEqual(route.format({"id": 1, "version": "a"}), "items/1/versions/a")
+        self.assertEqual(Route("get/{id}").format("x"), "get/x")
+        self.assertEqual(Route("files/{proxy+}").format("a/b"), "files/a/b")
+        self.assertEqual(Route("post").format({"hello": "world"}), "post")
+
+    def test_request(self):
+        client = HttpClient(self.outputs)
+        for idx in range(5):
+            r = client.request("get", "get/{id}", str(idx))
+            self.assertEqual(r.text, f"/dev/get/{idx}")
+        r = client.request("post", "post", "payload")
+        self.assertEqual(r.text, "payload")
+        # Connections are kept alive and reused between requests
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_endpoint_cache(self):
+        client = HttpClient(self.outputs)
+        self.assertTrue(client.endpoint().endswith("/dev"))
+        time.sleep(0.01)
+        with open(self.outputs, "w") as f:
+            f.write("ServiceEndpoint: http://localhost:1/prod\n")
+        self.assertEqual(client.endpoint(), "http://localhost:1/prod")
+
+    def test_request_many(self):
+        client = HttpClient(self.outputs)
+        responses = client.request_many("get", "get/{id}", range(20), concurrency=4)
+        # Requests are sent before returning rather than when iterating the responses
+        self.assertIsInstance(responses, list)
+        self.assertEqual(
+            [r.text for r in responses], [f"/dev/get/{x}" for x in range(20)]
+        )
+        self.assertLessEqual(len(self.server.connections), 4)
@@ -0,0 +1,146 @@
+import io
+import json
+import random
+import threading
+import time
+import unittest
+
+from botocore.exceptions import ClientError
+
+from pipeline import Pipeline, events, functions, resources
+from pipeline.clients import registry
+from pipeline.execution import execution
+
+
+class StubLambda(object):
+
+    """Stub lambda client which echoes payloads, throttling the first invocation of each payload in `throttled`"""
+
+    def __init__(self, throttled=()):
+        self.throttled = set(throttled)
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        data = json.loads(Payload)
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            throttle = data in self.throttled
+            self.throttled.discard(data)
+        try:
+            if throttle:
+                raise ClientError(
+                    {"Error": {"Code": "TooManyRequestsException"}}, "Invoke"
+                )
+            time.sleep(random.uniform(0, 0.02))
+            return {"Payload": io.BytesIO(json.dumps({"echo": data}).encode())}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class FanoutPipeline(Pipeline):
+    def __init__(self):
+        super().__init__()
+
+    @events.invoke
+    def echo(self, event, context):
+        return {"echo": event}
+
+
+class TunedQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+tuned_queue = TunedQueue()
+
+
+class TunedPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[tuned_queue])
+
+    @events.sqs(tuned_queue, batch_size=100, batching_window=5, max_concurrency=20)
+    @functions.concurrency(reserved=50, provisioned=5)
+    @functions.architecture("arm64")
+    @functions.ephemeral_storage(2048)
+    @functions.timeout(60)
+    def tuned(self, event, context):
+        return event
+
+    @functions.memory(512)
+    @events.sqs(tuned_queue, concurrency=4)
+    def defaults(self, event, context):
+        return event
+
+
+class FunctionTestCases(unittest.TestCase):
+    def setUp(self):
+        self.function = FanoutPipeline().functions["echo"]
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_invoke_many_ordered(self):
+        client = StubLambda(throttled=[3, 11])
+        registry.register_client("lambda", client)
+        results = list(self.function.invoke_many(iter(range(40)), concurrency=4))
+        self.assertEqual(results, [{"echo": x} for x in range(40)])
+        self.assertEqual(client.calls, 42)
+        self.assertLessEqual(client.peak, 4)
+
+    def test_invoke_many_completion_order(self):
+        registry.register_client("lambda", StubLambda())
+        results = dict(
+            self.function.invoke_many(range(40), concurrency=4, ordered=False)
+        )
+        self.assertEqual(results, {x: {"echo": x} for x in range(40)})
+
+    def test_invoke_many_event(self):
+        # Fire-and-forget invocations happen without consuming the result
+        client = StubLambda()
+        registry.register_client("lambda", client)
+        self.function.invoke_many(range(5), invocation="Event")
+        self.assertEqual(client.calls, 5)
+
+    def test_tuned_template(self):
+        execution.accountid = "123456789012"
+        template = TunedPipeline().functions.to_dict()
+        tuned = template["tuned"]
+        self.assertEqual(
+            tuned["events"][0]["sqs"],
+            {
+                "arn": tuned_queue.arn,
+                "batchSize": 100,
+                "maximumBatchingWindow": 5,
+                "maximumConcurrency": 20,
+            },
+        )
+        self.assertEqual(tuned["reservedConcurrency"], 50)
+        self.assertEqual(tuned["provisionedConcurrency"], 5)
+        self.assertEqual(tuned["architecture"], "arm64")
+        self.assertEqual(tuned["ephemeralStorageSize"], 2048)
+        self.assertEqual(tuned["timeout"], 60)
+        defaults = template["defaults"]
+        self.assertEqual(
+            defaults["events"][0]["sqs"],
+            {"arn": tuned_queue.arn, "functionResponseType": "ReportBatchItemFailures"},
+        )
+        self.assertEqual(defaults["memorySize"], 512)
+        self.assertNotIn("architecture", defaults)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            events.sqs(tuned_queue, batch_size=100)
+        with self.assertRaises(ValueError):
+            events.sqs(tuned_queue, max_concurrency=1)
+        with self.assertRaises(ValueError):
+            functions.concurrency(reserved=5, provisioned=10)
+        with self.assertRaises(ValueError):
+            functions.architecture("sparc")
+        with self.assertRaises(ValueError):
+            functions.ephemeral_storage(100)
@@ -0,0 +1,120 @@
+import json
+import threading
+import unittest
+
+from boto3.dynamodb.conditions import Key
+
+from pipeline import Pipeline, events, functions, resources
+from pipeline.execution import execution
+from pipeline.local import LocalRuntime
+
+
+class LocalQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class LocalTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class LocalBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class LocalTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_attribute("group", "S")
+        self.add_key("id", "HASH")
+        self.add_global_index("by_group", [("group", "HASH"), ("id", "RANGE")])
+
+
+class LocalRetryQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+queue = LocalQueue()
+retry_queue = LocalRetryQueue()
+topic = LocalTopic()
+bucket = LocalBucket()
+table = LocalTable()
+
+
+class LocalPipeline(Pipeline):
+    """Queue -> object in bucket -> notification through SNS -> item in table"""
+
+    def __init__(self):
+        super().__init__(resources=[queue, retry_queue, topic, bucket, table])
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    @events.sqs(resource=queue, batch_size=5)
+    @functions.concurrency(reserved=2)
+    def ingest(self, event, context):
+        bucket.upload_file(f"objects/{event['id']}.json", json.dumps(event))
+
+    @events.bucket_notification(
+        bucket=bucket,
+        event_type="s3:ObjectCreated:*",
+        destination=topic,
+        prefix="objects/",
+    )
+    def index(self, event, context):
+        document = json.loads(bucket.read_file(event["key"]))
+        table.put({"id": document["id"], "group": document["group"]})
+
+    @events.sqs(resource=retry_queue, concurrency=4)
+    def flaky(self, event, context):
+        with self.lock:
+            self.attempts[event] = self.attempts.get(event, 0) + 1
+            attempt = self.attempts[event]
+        if event == "poison" or (event == "retry" and attempt == 1):
+            raise ValueError(event)
+
+    @events.invoke
+    def echo(self, event, context):
+        return {"echo": event, "account": context.invoked_function_arn.split(":")[4]}
+
+
+class LocalRuntimeTestCases(unittest.TestCase):
+    def setUp(self):
+        execution.accountid = None
+        self.pipeline = LocalPipeline()
+
+    def tearDown(self):
+        execution.accountid = None
+
+    def test_pipeline(self):
+        with LocalRuntime(self.pipeline, workers=4) as runtime:
+            queue.send_messages({"id": str(x), "group": str(x % 3)} for x in range(50))
+            runtime.drain(timeout=10)
+            items = list(table.list())
+            self.assertEqual(sorted(int(x["id"]) for x in items), list(range(50)))
+            grouped = list(table.query(Key("group").eq("1"), index="by_group"))
+            self.assertEqual(len(grouped), 17)
+            stats = runtime.stats()
+        self.assertEqual(stats["ingest"]["records"], 50)
+        self.assertGreaterEqual(stats["ingest"]["invocations"], 10)
+        self.assertEqual(stats["index"]["invocations"], 50)
+        self.assertEqual(stats["index"]["errors"], 0)
+
+    def test_redelivery(self):
+        with LocalRuntime(self.pipeline, max_receives=3) as runtime:
+            retry_queue.send_messages(["ok", "retry", "poison"])
+            runtime.drain(timeout=10)
+            dead_letters = runtime.queues[retry_queue.name].dead_letters
+        self.assertEqual(self.pipeline.attempts, {"ok": 1, "retry": 2, "poison": 3})
+        self.assertEqual([json.loads(x["Body"]) for x in dead_letters], ["poison"])
+
+    def test_invoke(self):
+        with LocalRuntime(self.pipeline):
+            echo = self.pipeline.functions["echo"]
+            self.assertEqual(
+                list(echo.invoke_many(range(5))),
+                [{"echo": x, "account": execution.accountid} for x in range(5)],
+            )
@@ -0,0 +1,167 @@
+import io
+import json
+import unittest
+from contextlib import redirect_stdout
+
+from pipeline import Pipeline, events, metrics, resources
+from pipeline.clients import registry
+from pipeline.execution import execution
+
+
+class MetricsQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+queue = MetricsQueue()
+
+
+class StubSQS(object):
+    def send_message(self, **kwargs):
+        return {"MessageId": "1"}
+
+
+class MetricsPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[queue])
+
+    @events.invoke
+    def forward(self, event, context):
+        queue.send_message(event)
+        return event
+
+    @events.sqs(resource=queue)
+    def sqs(self, event, context):
+        return event
+
+    @events.sqs(resource=queue, concurrency=4)
+    def sqs_concurrent(self, event, context):
+        queue.send_message(event)
+        if event < 0:
+            raise ValueError(event)
+
+    @events.sqs(resource=queue)
+    async def sqs_async(self, event, context):
+        await queue.send_message_async(event)
+        return event
+
+    @events.invoke
+    def fail(self, event, context):
+        raise ValueError(event)
+
+
+class Context(object):
+    aws_request_id = "request-1"
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:forward"
+
+
+def sqs_event(bodies):
+    return {
+        "Records": [
+            {"messageId": str(idx), "body": json.dumps(body)}
+            for (idx, body) in enumerate(bodies)
+        ]
+    }
+
+
+class MetricsTestCases(unittest.TestCase):
+    def setUp(self):
+        registry.register_client("sqs", StubSQS())
+        execution.accountid = "123456789012"
+        self.pipeline = MetricsPipeline()
+        self.invocations = []
+        metrics.add_hook(self.invocations.append)
+
+    def tearDown(self):
+        metrics.remove_hook(self.invocations.append)
+        registry.reset()
+
+    def test_invoke(self):
+        self.assertEqual(self.pipeline.forward(1, Context()), 1)
+        (invocation,) = self.invocations
+        self.assertEqual(invocation.pipeline, "MetricsPipeline")
+        self.assertEqual(invocation.function, "forward")
+        self.assertEqual(invocation.request_id, "request-1")
+        self.assertEqual(invocation.records, 1)
+        self.assertFalse(invocation.error)
+        self.assertGreater(invocation.duration, 0)
+        self.assertEqual(len(invocation.timings["Handler"]), 1)
+        self.assertEqual(len(invocation.timings["SQSQueue.send_message"]), 1)
+        self.assertIsNone(metrics.current())
+
+    def test_cold_start(self):
+        self.pipeline.sqs(sqs_event([1]), None)
+        self.pipeline.sqs(sqs_event([1]), None)
+        self.assertFalse(self.invocations[-1].cold_start)
+        self.assertIsNone(self.invocations[-1].init_duration)
+
+    def test_sqs(self):
+        self.assertEqual(self.pipeline.sqs(sqs_event([1, 2, 3]), None), [1, 2, 3])
+        (invocation,) = self.invocations
+        self.assertEqual(invocation.records, 3)
+        self.assertEqual(len(invocation.timings["Decode"]), 3)
+        self.assertEqual(len(invocation.timings["Handler"]), 3)
+
+    def test_sqs_concurrent(self):
+        response = self.pipeline.sqs_concurrent(sqs_event([1, 2, -3, 4]), None)
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "2"}]})
+        (invocation,) = self.invocations
+        self.assertEqual(invocation.records, 4)
+        # Recorded from the pool's threads
+        self.assertEqual(len(invocation.timings["SQSQueue.send_message"]), 4)
+
+    def test_sqs_async(self):
+        self.assertEqual(self.pipeline.sqs_async(sqs_event([1, 2]), None), [1, 2])
+        (invocation,) = self.invocations
+        self.assertEqual(len(invocation.timings["Handler"]), 2)
+        # Recorded from the thread pool of `_threaded`
+        self.assertEqual(len(invocation.timings["SQSQueue.send_message"]), 2)
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            self.pipeline.fail(1, None)
+        (invocation,) = self.invocations
+        self.assertTrue(invocation.error)
+        self.assertIsNone(metrics.current())
+
+    def test_failing_hook(self):
+        def hook(invocation):
+            raise RuntimeError()
+
+        metrics.add_hook(hook)
+        try:
+            self.assertEqual(self.pipeline.forward(1, None), 1)
+        finally:
+            metrics.remove_hook(hook)
+        self.assertEqual(len(self.invocations), 1)
+
+    def test_emf(self):
+        metrics.add_hook(metrics.emf)
+        stdout = io.StringIO()
+        try:
+            with redirect_stdout(stdout):
+                self.pipeline.forward(1, Context())
+        finally:
+            metrics.remove_hook(metrics.emf)
+        document = json.loads(stdout.getvalue())
+        (directive,) = document["_aws"]["CloudWatchMetrics"]
+        self.assertEqual(directive["Namespace"], metrics.NAMESPACE)
+        self.assertEqual(directive["Dimensions"], [["Pipeline", "Function"]])
+        names = {x["Name"] for x in directive["Metrics"]}
+        self.assertTrue(
+            {"Duration", "Records", "Handler", "SQSQueue.send_message"} <= names
+        )
+        for name in names:
+            self.assertIn(name, document)
+        self.assertEqual(document["Pipeline"], "MetricsPipeline")
+        self.assertEqual(document["Function"], "forward")
+        self.assertEqual(document["RequestId"], "request-1")
+
+    def test_disabled(self):
+        metrics.remove_hook(self.invocations.append)
+        try:
+            self.assertEqual(self.pipeline.forward(1, None), 1)
+            self.assertEqual(self.pipeline.sqs(sqs_event([1]), None), [1])
+        finally:
+            metrics.add_hook(self.invocations.append)
+        self.assertEqual(self.invocations, [])
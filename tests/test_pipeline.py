@@ -0,0 +1,244 @@
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+
+from pipeline import Pipeline, events, resources
+from pipeline.execution import execution
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Deploys a pipeline with one resource of each type in the working directory
+DEPLOY = """from pipeline import Pipeline, events, resources
+
+
+class SeedTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class SeedQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class SeedBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class SeedTable(resources.DynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.add_attribute("id", "S")
+        self.add_key("id", "HASH")
+
+
+class SeedPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[SeedTopic(), SeedQueue(), SeedBucket(), SeedTable()])
+
+    @events.invoke
+    def first(self, event, context):
+        return event
+
+
+SeedPipeline().deploy()
+"""
+
+
+class BasePipeline(Pipeline):
+    def __init__(self):
+        super().__init__()
+
+    @events.invoke
+    def first(self, event, context):
+        return event
+
+    @events.invoke
+    def second(self, event, context):
+        return event
+
+    def helper(self):
+        pass
+
+
+class ChildPipeline(BasePipeline):
+    @events.http(path="third", method="post", cors="true")
+    def third(self, event, context):
+        return event
+
+    def second(self):
+        pass
+
+
+class HandlerMixin(object):
+    @events.invoke
+    def mixed(self, event, context):
+        return event
+
+
+class MixinPipeline(HandlerMixin, Pipeline):
+    def __init__(self):
+        super().__init__()
+
+
+class OtherPipeline(Pipeline):
+    @events.invoke
+    def other(self, event, context):
+        return event
+
+    @events.invoke
+    def first(self, event, context):
+        return event
+
+
+class MultiplePipeline(ChildPipeline, OtherPipeline):
+    pass
+
+
+class LatePipeline(Pipeline):
+    def late(self, event, context):
+        return event
+
+
+LatePipeline.late = events.invoke(LatePipeline.late)
+
+
+class PipelineTestCases(unittest.TestCase):
+    def test_lambdas(self):
+        self.assertEqual(sorted(BasePipeline().lambdas()), ["first", "second"])
+        self.assertEqual(sorted(ChildPipeline().lambdas()), ["first", "third"])
+
+    def test_lambdas_mixin(self):
+        self.assertEqual(MixinPipeline().lambdas(), ["mixed"])
+        self.assertEqual(MixinPipeline().functions["mixed"].trigger, "lambda")
+
+    def test_lambdas_multiple_inheritance(self):
+        # `second` is overridden by ChildPipeline, which precedes OtherPipeline in the MRO
+        self.assertEqual(
+            sorted(MultiplePipeline().lambdas()), ["first", "other", "third"]
+        )
+
+    def test_lambdas_late_trigger(self):
+        self.assertEqual(LatePipeline().lambdas(), ["late"])
+
+    def test_lazy_functions(self):
+        pipeline = ChildPipeline()
+        self.assertEqual(pipeline.functions._functions, {})
+        self.assertEqual(pipeline.functions["third"].trigger, "http")
+        self.assertEqual(list(pipeline.functions._functions), ["third"])
+        self.assertEqual(sorted(pipeline.functions.all), ["first", "third"])
+
+    def test_import_asyncio(self):
+        # Only async handlers pay for importing asyncio
+        script = "import sys, pipeline; from pipeline import events, resources; print('asyncio' in sys.modules)"
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        output = subprocess.check_output([sys.executable, "-c", script], env=env)
+        self.assertEqual(output.strip(), b"False")
+
+    def test_manifest(self):
+        manifest = ChildPipeline().manifest()
+        self.assertEqual(manifest["service"], "ChildPipeline")
+        self.assertEqual(manifest["functions"]["third"]["trigger"], "http")
+        self.assertEqual(manifest["functions"]["first"]["handler"], "handler.first")
+
+
+class NotificationTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class NotificationQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class NotificationBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+topic = NotificationTopic()
+queue = NotificationQueue()
+bucket = NotificationBucket()
+
+
+class NotificationPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[topic, queue, bucket])
+
+    @events.bucket_notification(
+        bucket=bucket, event_type="s3:ObjectCreated:*", destination=topic, prefix="a"
+    )
+    def on_topic(self, event, context):
+        return event
+
+    @events.bucket_notification(
+        bucket=bucket, event_type="s3:ObjectCreated:*", destination=queue
+    )
+    def on_queue(self, event, context):
+        return event
+
+
+class TemplateTestCases(unittest.TestCase):
+    def setUp(self):
+        execution.accountid = "123456789012"
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_template_idempotent(self):
+        pipeline = NotificationPipeline()
+        template = pipeline.template()
+        self.assertEqual(pipeline.template(), template)
+        self.assertNotIn("NotificationConfiguration", bucket["Properties"])
+        notification_bucket = template["resources"]["Resources"]["NotificationBucket"]
+        configuration = notification_bucket["Properties"]["NotificationConfiguration"]
+        self.assertEqual(len(configuration["TopicConfigurations"]), 1)
+        self.assertEqual(len(configuration["QueueConfigurations"]), 1)
+        self.assertEqual(notification_bucket["DependsOn"], ["SNSPolicy", "SQSPolicy"])
+
+    def test_deploy_unchanged(self):
+        pipeline = NotificationPipeline()
+        changed = pipeline.deploy()
+        self.assertIn("functions.on_topic", changed)
+        self.assertIn("resources.NotificationBucket", changed)
+        mtime = os.stat("serverless.yml").st_mtime_ns
+        self.assertEqual(NotificationPipeline().deploy(), [])
+        self.assertEqual(os.stat("serverless.yml").st_mtime_ns, mtime)
+
+    def test_deploy_changed_function(self):
+        NotificationPipeline().deploy()
+        pipeline = NotificationPipeline()
+        pipeline.on_queue.__func__.memory = 1024
+        try:
+            self.assertEqual(pipeline.deploy(), ["functions.on_queue"])
+        finally:
+            del pipeline.on_queue.__func__.memory
+        with open("serverless.yml") as f:
+            self.assertIn("memorySize: 1024", f.read())
+
+    def test_deploy_hash_seeds(self):
+        # Sets must not leak into the template, whose sections would then change between processes
+        templates = []
+        for seed in ["0", "1", "2", "3"]:
+            directory = os.path.join(self.directory.name, seed)
+            os.makedirs(directory)
+            env = dict(
+                os.environ,
+                PYTHONHASHSEED=seed,
+                PYTHONPATH=ROOT,
+                AWS_ACCOUNT_ID="123456789012",
+            )
+            subprocess.run(
+                [sys.executable, "-c", DEPLOY], cwd=directory, env=env, check=True
+            )
+            with open(os.path.join(directory, "serverless.yml"), "rb") as f:
+                templates.append(f.read())
+        self.assertEqual(len(set(templates)), 1)
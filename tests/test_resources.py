@@ -47,7 +47,7 @@ class ResourceTestCases(unittest.TestCase):
 
     def test_dynamodb_table_delete(self):
         self.dynamodb_table.delete("testid")
-        response = self.dynamodb_table.list()
+        response = list(self.dynamodb_table.list())
         self.assertEqual(len(response), 0)
         self.dynamodb_table.put({"id": "testid", "data": "testing"})
 
@@ -61,6 +61,6 @@ class ResourceTestCases(unittest.TestCase):
         self.dynamodb_table.put(data)
 
     def test_dynamodb_table_list(self):
-        response = self.dynamodb_table.list()
+        response = list(self.dynamodb_table.list())
         self.assertEqual(response[0]["id"], "testid")
         self.assertEqual(response[0]["data"], "testing")
@@ -0,0 +1,194 @@
+import base64
+import json
+import threading
+import unittest
+import zlib
+
+from pipeline import Pipeline, events, resources, serialization
+from pipeline.execution import execution
+from pipeline.local import LocalRuntime
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CodecQueue(resources.SQSQueue):
+    def __init__(self):
+        super().__init__()
+
+
+class CodecTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+class JsonTopic(resources.SNSTopic):
+    def __init__(self):
+        super().__init__()
+
+
+queue = CodecQueue().set_codec("application/json+zlib")
+topic = CodecTopic().set_codec(serialization.Codec("json", "zlib", level=9))
+json_topic = JsonTopic().set_codec("application/json")
+
+DOCUMENT = {"id": "1", "values": list(range(100)), "nested": {"x": [1.5, None, True]}}
+
+
+class CodecPipeline(Pipeline):
+    def __init__(self):
+        super().__init__(resources=[queue, topic, json_topic])
+        self.received = []
+        self.lock = threading.Lock()
+
+    @events.sqs(resource=queue)
+    def consume(self, event, context):
+        with self.lock:
+            self.received.append(event)
+
+    @events.sns(resource=topic)
+    def notify(self, event, context):
+        with self.lock:
+            self.received.append(event)
+
+    @events.sns(resource=json_topic)
+    def notify_json(self, event, context):
+        with self.lock:
+            self.received.append(event)
+
+    @events.http(path="items", method="post", cors="true")
+    def post(self, event, context):
+        return event
+
+
+class CodecTestCases(unittest.TestCase):
+    def assertRoundTrip(self, codec):
+        self.assertEqual(codec.decode(codec.encode(DOCUMENT)), DOCUMENT)
+        self.assertEqual(codec.decode_text(codec.encode_text(DOCUMENT)), DOCUMENT)
+        self.assertEqual(serialization.get(codec.content_type).format, codec.format)
+
+    def test_json(self):
+        self.assertRoundTrip(serialization.JSON)
+        self.assertEqual(json.loads(serialization.JSON.encode_text(DOCUMENT)), DOCUMENT)
+        self.assertEqual(serialization.JSON.attributes(), {})
+
+    def test_zlib(self):
+        codec = serialization.get("application/json+zlib")
+        self.assertRoundTrip(codec)
+        self.assertEqual(codec.compression, "zlib")
+        self.assertEqual(
+            json.loads(zlib.decompress(base64.b64decode(codec.encode_text(DOCUMENT)))),
+            DOCUMENT,
+        )
+        self.assertEqual(
+            codec.attributes(), {"pipeline.ContentType": "application/json+zlib"}
+        )
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack(self):
+        self.assertRoundTrip(serialization.Codec("msgpack"))
+        self.assertRoundTrip(serialization.get("application/msgpack+zlib"))
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd(self):
+        self.assertRoundTrip(serialization.Codec("json", "zstd"))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            serialization.Codec("xml")
+        with self.assertRaises(ValueError):
+            serialization.Codec("json", "lzma")
+        with self.assertRaises(ValueError):
+            serialization.get("text/plain")
+
+    def test_fallback(self):
+        # Larger than 64 bits, which orjson doesn't support
+        document = {"big": 2 ** 70}
+        self.assertEqual(serialization.loads(serialization.dumps(document)), document)
+
+    def test_content_type(self):
+        name = serialization.CONTENT_TYPE_ATTRIBUTE
+        for attributes in [
+            {name: {"DataType": "String", "StringValue": "a"}},
+            {name: {"dataType": "String", "stringValue": "a"}},
+            {name: {"Type": "String", "Value": "a"}},
+        ]:
+            self.assertEqual(serialization.content_type(attributes), "a")
+        self.assertIsNone(serialization.content_type(None))
+
+    def test_foreign_content_type(self):
+        # Other producers' attributes don't select a codec, nor do content types without one
+        body = json.dumps(DOCUMENT)
+        for attributes in [
+            {"ContentType": {"dataType": "String", "stringValue": "text/plain"}},
+            {
+                serialization.CONTENT_TYPE_ATTRIBUTE: {
+                    "dataType": "String",
+                    "stringValue": "text/plain",
+                }
+            },
+        ]:
+            self.assertEqual(serialization.decode_message(body, attributes), DOCUMENT)
+            self.assertIsNone(serialization.from_attributes(attributes, default=None))
+
+
+class CodecPipelineTestCases(unittest.TestCase):
+    def setUp(self):
+        execution.accountid = None
+        self.pipeline = CodecPipeline()
+
+    def tearDown(self):
+        execution.accountid = None
+
+    def test_sqs(self):
+        with LocalRuntime(self.pipeline) as runtime:
+            queue.send_message(DOCUMENT, id="1")
+            queue.send_messages([DOCUMENT, DOCUMENT], ids=["2", None])
+            runtime.drain(timeout=10)
+        self.assertEqual(self.pipeline.received, [DOCUMENT] * 3)
+
+    def test_sns(self):
+        with LocalRuntime(self.pipeline) as runtime:
+            topic.send_message(DOCUMENT)
+            topic.publish_many([DOCUMENT], attributes={"source": "test"})
+            runtime.drain(timeout=10)
+        self.assertEqual(self.pipeline.received, [DOCUMENT] * 2)
+
+    def test_sns_json(self):
+        with LocalRuntime(self.pipeline) as runtime:
+            json_topic.send_message(DOCUMENT)
+            runtime.drain(timeout=10)
+        self.assertEqual(self.pipeline.received, [DOCUMENT])
+
+    def test_sns_foreign_content_type(self):
+        record = {
+            "EventSource": "aws:sns",
+            "Sns": {
+                "Message": "plain text",
+                "MessageAttributes": {
+                    "ContentType": {"Type": "String", "Value": "text/plain"}
+                },
+            },
+        }
+        self.pipeline.notify({"Records": [record]}, None)
+        self.assertEqual(self.pipeline.received, ["plain text"])
+
+    def test_http(self):
+        codec = serialization.get("application/json+zlib")
+        event = {
+            "headers": {"Content-Type": codec.content_type},
+            "body": base64.b64encode(codec.encode(DOCUMENT)).decode("ascii"),
+            "isBase64Encoded": True,
+        }
+        self.assertEqual(self.pipeline.post(event, None), DOCUMENT)
+        event = {
+            "headers": {"content-type": "application/json; charset=utf-8"},
+            "body": json.dumps(DOCUMENT),
+        }
+        self.assertEqual(self.pipeline.post(event, None), DOCUMENT)
@@ -0,0 +1,124 @@
+import io
+import os
+import unittest
+
+from pipeline import resources
+from pipeline.clients import registry
+
+
+class StubS3(object):
+
+    """In-memory S3 client supporting the calls used by the streaming reader and writer"""
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = []
+        self.uploads = {}
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key]), "ETag": '"etag"'}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        self.gets.append(Range)
+        data = self.objects[Key]
+        if Range:
+            (start, end) = Range[len("bytes=") :].split("-")
+            data = data[int(start) : int(end) + 1 if end else None]
+        return {"Body": StubBody(data)}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.uploads["upload"] = []
+        return {"UploadId": "upload"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId].append(Body)
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.objects[Key] = b"".join(self.uploads.pop(UploadId))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        del self.uploads[UploadId]
+
+
+class StubBody(io.BytesIO):
+    def iter_chunks(self, chunk_size):
+        return iter(lambda: self.read(chunk_size), b"")
+
+
+class StreamBucket(resources.S3Bucket):
+    def __init__(self):
+        super().__init__()
+
+
+class StreamTestCases(unittest.TestCase):
+    def setUp(self):
+        self.client = StubS3()
+        self.client.objects["data.bin"] = os.urandom(1000)
+        registry.register_client("s3", self.client)
+        self.bucket = StreamBucket()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_read(self):
+        data = self.client.objects["data.bin"]
+        with self.bucket.open("data.bin", block_size=100, read_ahead=2) as f:
+            self.assertEqual(f.read(250), data[:250])
+            f.seek(-50, io.SEEK_END)
+            self.assertEqual(f.read(), data[-50:])
+            f.seek(120)
+            self.assertEqual(f.read(10), data[120:130])
+        self.assertTrue(all(x.startswith("bytes=") for x in self.client.gets))
+
+    def test_read_cache(self):
+        with self.bucket.open("data.bin", block_size=100, read_ahead=0) as f:
+            f.read(50)
+            f.seek(0)
+            f.read(50)
+        self.assertEqual(self.client.gets, ["bytes=0-99"])
+
+    def test_read_text(self):
+        self.client.objects["data.txt"] = b"line 1\nline 2\n"
+        with self.bucket.open("data.txt", "r", block_size=4) as f:
+            self.assertEqual(f.readlines(), ["line 1\n", "line 2\n"])
+
+    def test_read_bytes(self):
+        data = self.client.objects["data.bin"]
+        self.assertEqual(self.bucket.read_bytes("data.bin"), data)
+        self.assertEqual(self.bucket.read_bytes("data.bin", 10, 19), data[10:20])
+        chunks = list(self.bucket.iter_chunks("data.bin", chunk_size=300))
+        self.assertEqual([len(x) for x in chunks], [300, 300, 300, 100])
+
+    def test_write(self):
+        data = os.urandom(12 * 1024 * 1024)
+        with self.bucket.open("out.bin", "wb", part_size=5 * 1024 * 1024) as f:
+            for idx in range(0, len(data), 1024 * 1024):
+                f.write(data[idx : idx + 1024 * 1024])
+        self.assertEqual(self.client.objects["out.bin"], data)
+
+    def test_write_small(self):
+        with self.bucket.open("out.txt", "w") as f:
+            f.write("hello")
+        self.assertEqual(self.client.objects["out.txt"], b"hello")
+
+    def test_write_abort(self):
+        with self.assertRaises(RuntimeError):
+            with self.bucket.open("out.bin", "wb") as f:
+                f.write(os.urandom(9 * 1024 * 1024))
+                raise RuntimeError
+        self.assertNotIn("out.bin", self.client.objects)
+        self.assertEqual(self.client.uploads, {})
+
+    def test_write_text_abort(self):
+        for text in ["hello", "x" * 9 * 1024 * 1024]:
+            with self.assertRaises(RuntimeError):
+                with self.bucket.open("out.txt", "w") as f:
+                    f.write(text)
+                    raise RuntimeError
+            self.assertTrue(f.closed)
+            self.assertNotIn("out.txt", self.client.objects)
+            self.assertEqual(self.client.uploads, {})